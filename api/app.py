@@ -1,30 +1,40 @@
 import os
 import sys
 import subprocess
-import uuid
 import tempfile
-import numpy as np
-import pandas as pd
-from flask import Flask, request, render_template, jsonify, abort, send_from_directory
-from scipy import stats
+from flask import Flask, Response, g, request, render_template, jsonify, abort, send_from_directory, stream_with_context
 import math
+import atexit
+import json
+import threading
+import time
 
-# --- Lifelines Import (NEW) ---
-try:
-    from lifelines import KaplanMeierFitter
-    from lifelines.statistics import logrank_test
+from r_pool import RWorkerPool, RWorkerStartError
+from plot_cache import PlotCache, plot_cache_key
+from plot_storage import EXPIRED, PlotStorage, SharedPlotStorage
+from plot_jobs import JobStore, PlotJobQueue, QueueFullError
+from survival_engine import survival_summary
+from packed_columns import pack_columns
+from batch_stats import CORRECTION_METHODS, batch_correlation, batch_two_group, to_records
+from normality import NORMALITY_TESTS, NORMALITY_TEST_LABELS, normality_test, resolve_normality_test
+from table_upload import UploadError, read_upload
+from multi_group import METHOD_LABELS, MULTI_GROUP_METHODS, POSTHOC_LABELS, multi_group_analysis
+from preview import correlation_preview, group_preview, survival_preview
+from resampling import (DEFAULT_RESAMPLES, DEFAULT_TIME_LIMIT, MAX_RESAMPLES, MAX_TIME_LIMIT, correlation_resampling,
+                        two_group_resampling)
+from lazy_imports import import_seconds, lazy_import, pending_modules, warm_up_modules
+from shared_state import SlotLimiter, StateDatabase
+from metrics import MetricsRegistry, StageTimer, Trace, current_trace, parse_r_timings, set_current_trace, trace_scope
 
-    LIFELINES_AVAILABLE = True
-except ImportError:
-    LIFELINES_AVAILABLE = False
-    print("Warning: 'lifelines' library not found. Survival statistics endpoint will not work.")
-    print("Install using: pip install lifelines")
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+stats = lazy_import('scipy.stats')
 
 # --- Configuration & Setup ---
 app = Flask(__name__)
 if not os.path.exists('static'): os.makedirs('static')
 app.static_folder = 'static'
-PDF_DIR = os.path.join(app.static_folder, 'temp_plots')
+PDF_DIR = os.environ.get('PLOT_DIR', os.path.join(app.static_folder, 'temp_plots'))  # Rendered plot PDFs
 os.makedirs(PDF_DIR, exist_ok=True)
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -33,6 +43,59 @@ TWO_GROUP_R_SCRIPT_PATH = os.path.join(SCRIPT_DIR, 'two_group_plot.R')
 SURVIVAL_R_SCRIPT_PATH = os.path.join(SCRIPT_DIR, 'survival_plot.R')  # New R script path
 RSCRIPT_EXECUTABLE = 'Rscript'  # Adjust if needed
 
+# --- Shared State (multi-process deployments, see gunicorn.conf.py) ---
+APP_SHARED_STATE = os.environ.get('APP_SHARED_STATE', 'memory')  # 'memory' (one process) or 'sqlite' (all workers)
+APP_STATE_DIR = os.environ.get('APP_STATE_DIR', os.path.join(SCRIPT_DIR, 'state'))  # Local disk, not under static/
+state_db = None
+if APP_SHARED_STATE == 'sqlite':
+    os.makedirs(APP_STATE_DIR, exist_ok=True)
+    state_db = StateDatabase(os.path.join(APP_STATE_DIR, 'plot_api.sqlite3'))
+
+# --- R Worker Pool ---
+R_WORKER_SCRIPT_PATH = os.path.join(SCRIPT_DIR, 'r_worker.R')
+R_POOL_SIZE = int(os.environ.get('R_POOL_SIZE', '2'))  # 0 disables the pool (one Rscript process per plot)
+R_JOB_TIMEOUT = float(os.environ.get('R_JOB_TIMEOUT', '120'))  # Seconds per plot job
+R_INPUT_TRANSPORT = os.environ.get('R_INPUT_TRANSPORT', 'packed')  # 'packed' (binary on stdin) or 'csv' (temp file)
+R_MAX_CONCURRENT = int(os.environ.get('R_MAX_CONCURRENT', '0'))  # R jobs at once across all processes; 0: no limit
+r_slots = SlotLimiter(os.path.join(APP_STATE_DIR, 'r_slots'), R_MAX_CONCURRENT) if R_MAX_CONCURRENT > 0 else None
+
+# --- Plot Storage & Cache ---
+PLOT_STORAGE_TTL = float(os.environ.get('PLOT_STORAGE_TTL', str(24 * 3600)))  # Seconds since last access
+PLOT_STORAGE_MAX_BYTES = int(os.environ.get('PLOT_STORAGE_MAX_BYTES', str(512 * 1024 * 1024)))
+PLOT_STORAGE_SWEEP_INTERVAL = float(os.environ.get('PLOT_STORAGE_SWEEP_INTERVAL', '60'))  # Seconds
+if state_db is not None:
+    plot_storage = SharedPlotStorage(PDF_DIR, PLOT_STORAGE_TTL, PLOT_STORAGE_MAX_BYTES, state_db,
+                                     PLOT_STORAGE_SWEEP_INTERVAL)
+    render_lock_dir = os.path.join(APP_STATE_DIR, 'render_locks')
+    os.makedirs(render_lock_dir, exist_ok=True)
+    plot_cache = PlotCache(plot_storage, lock_dir=render_lock_dir)
+else:
+    plot_storage = PlotStorage(PDF_DIR, PLOT_STORAGE_TTL, PLOT_STORAGE_MAX_BYTES, PLOT_STORAGE_SWEEP_INTERVAL)
+    plot_cache = PlotCache(plot_storage)
+
+# --- Async Plot Jobs ---
+PLOT_JOB_WORKERS = int(os.environ.get('PLOT_JOB_WORKERS', str(max(R_POOL_SIZE, 1))))  # Concurrent renders
+PLOT_JOB_QUEUE_SIZE = int(os.environ.get('PLOT_JOB_QUEUE_SIZE', '20'))  # Waiting jobs before 429
+plot_jobs = PlotJobQueue(PLOT_JOB_WORKERS, PLOT_JOB_QUEUE_SIZE, store=JobStore(state_db) if state_db else None)
+
+# --- Metrics & Tracing ---
+TRACE_HEADER = 'X-Trace'  # Requests carrying this header get their stage timings back as Server-Timing
+metrics_registry = MetricsRegistry()
+stage_timer = StageTimer(metrics_registry)
+http_requests = metrics_registry.counter('plot_api_requests_total', "HTTP requests by route, method and status.",
+                                         ('route', 'method', 'status'))
+http_request_seconds = metrics_registry.histogram('plot_api_request_seconds', "HTTP request latency by route.",
+                                                  ('route',))
+r_script_runs = metrics_registry.counter('plot_api_r_script_runs_total', "R script runs by script and exit code.",
+                                         ('script', 'exit_code'))
+plot_cache_lookups = metrics_registry.counter('plot_api_plot_cache_lookups_total', "Plot cache lookups by result.",
+                                              ('result',))
+plot_storage_gauge = metrics_registry.gauge('plot_api_plot_storage', "Plot directory usage.", ('measure',))
+plot_jobs_gauge = metrics_registry.gauge('plot_api_plot_jobs', "Plot jobs by status.", ('status',))
+r_slots_gauge = metrics_registry.gauge('plot_api_r_slots', "Global R job slots (all processes).", ('measure',))
+import_seconds_gauge = metrics_registry.gauge('plot_api_import_seconds', "Import time of the heavy modules.",
+                                              ('module',))
+
 # Check R scripts exist (Optional checks for startup)
 # ... (checks for correlation and two-group) ...
 if not os.path.exists(SURVIVAL_R_SCRIPT_PATH):
@@ -40,13 +103,13 @@ if not os.path.exists(SURVIVAL_R_SCRIPT_PATH):
 
 
 # --- Helper Functions (Keep existing: calculate_correlation_stats, calculate_two_group_stats, run_r_script) ---
-def calculate_correlation_stats(x_data, y_data):
+def calculate_correlation_stats(x_data, y_data, normality_method='auto'):
     # ... (same as before) ...
     n = len(x_data)
     if n < 3: return "错误：相关性分析需要至少 3 对有效数据。"
     try:
-        shapiro_x_stat, shapiro_x_p = stats.shapiro(x_data)
-        shapiro_y_stat, shapiro_y_p = stats.shapiro(y_data)
+        normality_x_test, _, shapiro_x_p = normality_test(x_data, normality_method)
+        normality_y_test, _, shapiro_y_p = normality_test(y_data, normality_method)
         corr_r, corr_p = stats.pearsonr(x_data, y_data)
         if abs(corr_r) < 1.0:
             denominator = 1 - corr_r ** 2
@@ -73,8 +136,8 @@ def calculate_correlation_stats(x_data, y_data):
 
         stats_text = f"""统计描述 (相关性分析)
 样本量 n = {n}
-第一列(X)正态性检验 P = {shapiro_x_p:.4f} ({normality_x_result})
-第二列(Y)正态性检验 P = {shapiro_y_p:.4f} ({normality_y_result})
+第一列(X)正态性检验 ({NORMALITY_TEST_LABELS[normality_x_test]}) P = {shapiro_x_p:.4f} ({normality_x_result})
+第二列(Y)正态性检验 ({NORMALITY_TEST_LABELS[normality_y_test]}) P = {shapiro_y_p:.4f} ({normality_y_result})
 相关系数 r = {corr_r:.4f}，统计量 t = {corr_t:.4f}，P = {corr_p:.4f} ({corr_sig_text})
 说明：相关系数{corr_meaningful}统计学意义{corr_direction}"""
         return stats_text
@@ -83,14 +146,15 @@ def calculate_correlation_stats(x_data, y_data):
         return f"相关性统计计算时发生错误: {e}"
 
 
-def calculate_two_group_stats(group1_data, group2_data, group1_name="Group1", group2_name="Group2"):
+def calculate_two_group_stats(group1_data, group2_data, group1_name="Group1", group2_name="Group2",
+                              normality_method='auto'):
     # ... (same as before) ...
     n1 = len(group1_data)
     n2 = len(group2_data)
     if n1 < 2 or n2 < 2: return f"错误：每组至少需要 2 个有效数据点进行比较 (组1: {n1}, 组2: {n2})。"
     try:
-        shapiro1_stat, shapiro1_p = stats.shapiro(group1_data)
-        shapiro2_stat, shapiro2_p = stats.shapiro(group2_data)
+        normality1_test, _, shapiro1_p = normality_test(group1_data, normality_method)
+        normality2_test, _, shapiro2_p = normality_test(group2_data, normality_method)
         normality1_result = "正态" if shapiro1_p > 0.05 else "非正态"
         normality2_result = "正态" if shapiro2_p > 0.05 else "非正态"
         levene_stat, levene_p = stats.levene(group1_data, group2_data)
@@ -111,8 +175,8 @@ def calculate_two_group_stats(group1_data, group2_data, group1_name="Group1", gr
 组1样本量 N1 = {n1}，均值 M1 = {mean1:.3f}，标准差 SD1 = {sd1:.3f}
 组2样本量 N2 = {n2}，均值 M2 = {mean2:.3f}，标准差 SD2 = {sd2:.3f}
 ---
-组1正态性检验 P1 = {shapiro1_p:.4f} ({normality1_result})
-组2正态性检验 P2 = {shapiro2_p:.4f} ({normality2_result})
+组1正态性检验 ({NORMALITY_TEST_LABELS[normality1_test]}) P1 = {shapiro1_p:.4f} ({normality1_result})
+组2正态性检验 ({NORMALITY_TEST_LABELS[normality2_test]}) P2 = {shapiro2_p:.4f} ({normality2_result})
 方差齐性检验 (Levene) F = {levene_stat:.4f}，P = {levene_p:.4f} ({variance_result})
 ---
 独立样本 T 检验 ({'Student' if variance_equal else 'Welch'}):
@@ -124,13 +188,56 @@ def calculate_two_group_stats(group1_data, group2_data, group1_name="Group1", gr
         return f"两组比较统计计算时发生错误: {e}"
 
 
-def run_r_script(r_script_path, args_list):
-    # ... (same as before) ...
+_r_worker_pool = None
+_r_worker_pool_lock = threading.Lock()
+
+
+def get_r_worker_pool():
+    """Returns the shared warm R worker pool, creating it on first use (None if disabled)."""
+    global _r_worker_pool
+    if R_POOL_SIZE <= 0: return None
+    with _r_worker_pool_lock:
+        if _r_worker_pool is None:
+            _r_worker_pool = RWorkerPool(R_POOL_SIZE, RSCRIPT_EXECUTABLE, R_WORKER_SCRIPT_PATH,
+                                         [CORRELATION_R_SCRIPT_PATH, TWO_GROUP_R_SCRIPT_PATH, SURVIVAL_R_SCRIPT_PATH],
+                                         job_timeout=R_JOB_TIMEOUT)
+            atexit.register(_r_worker_pool.close)
+        return _r_worker_pool
+
+
+def run_r_script(r_script_path, args_list, input_data=b''):
+    # Holds one of the R_MAX_CONCURRENT slots shared by all worker processes while R runs
+    if r_slots is None: return dispatch_r_script(r_script_path, args_list, input_data)
+    try:
+        with stage_timer.stage('r_slot_wait'): slot = r_slots.acquire(R_JOB_TIMEOUT)
+    except TimeoutError:
+        return subprocess.CompletedProcess([RSCRIPT_EXECUTABLE, r_script_path] + args_list, -1, stdout='',
+                                           stderr=f"R 作业排队超时 (>{R_JOB_TIMEOUT:g}s)，所有 R 进程繁忙。")
+    try:
+        return dispatch_r_script(r_script_path, args_list, input_data)
+    finally:
+        r_slots.release(slot)
+
+
+def dispatch_r_script(r_script_path, args_list, input_data=b''):
+    # Dispatch to a warm R worker; fall back to a one-shot Rscript process if no worker can start.
+    # input_data is handed to the script on stdin (packed columns, see packed_columns.py).
+    pool = get_r_worker_pool()
+    if pool is not None and os.path.exists(R_WORKER_SCRIPT_PATH):
+        try:
+            return pool.run(r_script_path, args_list, input_data=input_data)
+        except RWorkerStartError as e:
+            print(f"Warning: R worker pool unavailable, falling back to one-shot Rscript: {e}")
+
     cmd = [RSCRIPT_EXECUTABLE, r_script_path] + args_list
     print(f"Running R command: {' '.join(cmd)}")
     try:
-        process = subprocess.run(cmd, capture_output=True, text=True, check=False, encoding='utf-8')
-        return process
+        process = subprocess.run(cmd, input=input_data, capture_output=True, check=False, timeout=R_JOB_TIMEOUT)
+        return subprocess.CompletedProcess(cmd, process.returncode,
+                                           stdout=process.stdout.decode('utf-8', errors='replace'),
+                                           stderr=process.stderr.decode('utf-8', errors='replace'))
+    except subprocess.TimeoutExpired:
+        return subprocess.CompletedProcess(cmd, -1, stdout='', stderr=f"R 脚本执行超时 (>{R_JOB_TIMEOUT:g}s)。")
     except FileNotFoundError:
         print(f"Error: '{RSCRIPT_EXECUTABLE}' not found. Is R installed and in PATH?")
         raise  # Re-raise the exception to be caught by the route
@@ -139,301 +246,790 @@ def run_r_script(r_script_path, args_list):
         raise  # Re-raise
 
 
-# --- NEW Helper: Survival Stats using Lifelines ---
-def calculate_survival_stats(df):
-    """Calculates median survival and log-rank test using lifelines."""
-    if not LIFELINES_AVAILABLE:
-        return "错误：'lifelines' 库未安装在服务器上，无法计算生存统计。"
+class PlotRenderError(Exception):
+    """R ran but did not produce a plot; the message is safe to show to the user."""
+
+
+def render_plot_pdf(r_script_path, df, script_args, output_pdf_path, error_label):
+    """Sends df to the R script (packed on stdin, or via a temporary CSV) to produce output_pdf_path."""
+    tmp_csv_file = None
+    try:
+        if R_INPUT_TRANSPORT == 'csv':
+            with stage_timer.stage('csv_write'), \
+                    tempfile.NamedTemporaryFile(mode='w', suffix=".csv", delete=False, encoding='utf-8') as tmp_csv_file:
+                df.to_csv(tmp_csv_file.name, index=False)
+                input_csv_path = tmp_csv_file.name
+            args = ['--input', input_csv_path, '--output', output_pdf_path] + script_args
+            input_data = b''
+        else:
+            with stage_timer.stage('pack_input'): input_data = pack_columns(df)
+            args = ['--input_format', 'packed', '--output', output_pdf_path] + script_args
+        with stage_timer.stage('r_run') as r_run:
+            process = run_r_script(r_script_path, args, input_data=input_data)
+        r_script_runs.inc(script=os.path.basename(r_script_path), exit_code=process.returncode)
+
+        # The scripts report their own stages on stderr; whatever they do not account for is
+        # R start-up (package loading in one-shot mode) and the transfer to and from R
+        r_timings, stderr = parse_r_timings(process.stderr)
+        stdout_timings, stdout = parse_r_timings(process.stdout)  # the worker pool merges stderr into stdout
+        for stage, seconds in r_timings + stdout_timings: stage_timer.record(f"r_{stage}", seconds)
+        if r_timings or stdout_timings:
+            stage_timer.record('r_overhead', max(r_run.seconds - sum(sec for _, sec in r_timings + stdout_timings), 0.0))
+
+        if process.returncode != 0:
+            error_msg = f"{error_label} R 脚本执行失败: {stderr.strip() or stdout.strip() or 'Unknown R error'}"
+            print(error_msg)
+            raise PlotRenderError(error_msg.splitlines()[0])
+        if not os.path.exists(output_pdf_path): raise PlotRenderError("R 脚本成功，但未找到输出 PDF。")
+    finally:
+        if tmp_csv_file and os.path.exists(tmp_csv_file.name): os.remove(tmp_csv_file.name)
+
+
+def generate_plot_pdf(filename_prefix, r_script_path, df, script_args, error_label):
+    """Returns (pdf_filename, cache_hit), rendering with R only if no identical plot is cached."""
+    with stage_timer.stage('cache_key'): key = plot_cache_key(filename_prefix, df, script_args, r_script_path)
+    pdf_filename, cache_hit = plot_cache.get_or_render(
+        f"{filename_prefix}_{key}.pdf",
+        lambda output_pdf_path: render_plot_pdf(r_script_path, df, script_args, output_pdf_path, error_label))
+    plot_cache_lookups.inc(result='hit' if cache_hit else 'miss')
+    return pdf_filename, cache_hit
 
+
+def plot_result(filename_prefix, r_script_path, df, script_args, error_label):
+    """Renders (or reuses) the plot and returns the JSON-ready result; errors carry a user-facing message."""
+    try:
+        pdf_filename, cache_hit = generate_plot_pdf(filename_prefix, r_script_path, df, script_args, error_label)
+    except PlotRenderError:
+        raise
+    except Exception as e:
+        raise PlotRenderError(f"生成{error_label}图表时出错: {e}")
+    return {"pdf_url": f"/plots/{pdf_filename}", "cached": cache_hit}
+
+
+def plot_response(req_data, filename_prefix, r_script_path, df, script_args, error_label, preview=None):
+    """Renders synchronously, or queues an async job when the request has "async": true.
+
+    preview (the preview_part() fields, if one was requested) is included in either response."""
+    preview = preview or {}
+    if req_data.get('async'):
+        try:
+            job_id = plot_jobs.submit(filename_prefix, lambda: plot_result(filename_prefix, r_script_path, df,
+                                                                          script_args, error_label))
+        except QueueFullError:
+            abort(429, description="绘图任务队列已满，请稍后重试。")
+        return jsonify({**preview, "job_id": job_id, "status": "queued", "status_url": f"/plot_jobs/{job_id}"}), 202
+    try:
+        return jsonify({**preview, **plot_result(filename_prefix, r_script_path, df, script_args, error_label)})
+    except PlotRenderError as e:
+        abort(500, description=str(e))
+
+
+# --- Survival Stats (native Kaplan-Meier / log-rank engine) ---
+def format_median_survival(median, lower, upper):
+    if np.isnan(median): return "未达到 (Not Reached)"
+    lower_text = f"{lower:.3f}" if not np.isnan(lower) else "NA"
+    upper_text = f"{upper:.3f}" if not np.isnan(upper) else "NA"
+    return f"{median:.3f} (95% CI: {lower_text} - {upper_text})"
+
+
+def calculate_survival_stats(df):
+    """Calculates median survival and the k-group log-rank test for all groups in one pass."""
     results = []
-    kmf = KaplanMeierFitter()
 
-    # Check for groups
-    groups = df['Group'].unique()
+    # Check for groups (codes follow order of first appearance, like df['Group'].unique())
+    codes, groups = pd.factorize(df['Group'])
     # Treat empty string group names as a single group if they are the only 'group'
-    meaningful_groups = [g for g in groups if g and pd.notna(g)]  # Filter out empty/NaN groups
+    meaningful = np.array([bool(g) and pd.notna(g) for g in groups], dtype=bool)  # Filter out empty/NaN groups
 
-    if len(meaningful_groups) <= 1:
+    if meaningful.sum() <= 1:
         # Single group analysis (or all groups were empty/NaN)
-        group_name = meaningful_groups[0] if meaningful_groups else "Overall"
-        T = df['Time']
-        E = df['Status']
-        kmf.fit(T, event_observed=E, label=group_name)
-        median_survival = kmf.median_survival_time_
+        group_name = groups[meaningful][0] if meaningful.any() else "Overall"
+        summary = survival_summary(df['Time'].values, df['Status'].values, np.zeros(len(df), dtype=np.intp), 1)
         results.append(f"分组: {group_name}")
-        results.append(f"  样本量 N = {len(T)}")
-        results.append(f"  事件数 Events = {int(E.sum())}")
-        results.append(f"  生存时间中位数 Median Survival Time = {median_survival:.3f}" if pd.notna(
-            median_survival) else "  生存时间中位数 Median Survival Time = 未达到 (Not Reached)")
+        results.append(f"  样本量 N = {summary['n'][0]}")
+        results.append(f"  事件数 Events = {summary['events'][0]}")
+        results.append(f"  生存时间中位数 Median Survival Time = "
+                       f"{format_median_survival(summary['median'][0], summary['median_lower'][0], summary['median_upper'][0])}")
         results.append("  (无 Log-rank 检验，仅单个分组)")
     else:
-        # Multiple group analysis
-        group_results = {}
-        logrank_data = []  # Prepare data for logrank test: list of tuples (durations, events, label)
+        # Multiple group analysis: rows without a group are left out, as before
+        remap = np.full(len(groups), -1, dtype=np.intp)
+        remap[meaningful] = np.arange(meaningful.sum())
+        group_codes = remap[codes]
+        keep = group_codes >= 0
+        group_names = groups[meaningful]
 
         results.append(f"分组比较 (Log-Rank Test):")
-        for group_name in meaningful_groups:
-            group_df = df[df['Group'] == group_name]
-            T = group_df['Time']
-            E = group_df['Status']
-            kmf.fit(T, event_observed=E, label=group_name)
-            median_survival = kmf.median_survival_time_
-
-            group_results[group_name] = {
-                "N": len(T),
-                "Events": int(E.sum()),
-                "Median": f"{median_survival:.3f}" if pd.notna(median_survival) else "未达到"
-            }
-            logrank_data.append((T, E))  # Add data for test
-
-        # Perform log-rank test
-        # lifelines logrank_test takes durations and event_observed for each group as separate arguments
-        durations = [data[0] for data in logrank_data]
-        event_observed = [data[1] for data in logrank_data]
+        time_values, status_values, group_codes = df['Time'].values[keep], df['Status'].values[keep], group_codes[keep]
+        summary = None
         try:
-            logrank_result = logrank_test(*durations, *event_observed, t_0=- 1)  # t_0=-1 uses all data
-            p_value = logrank_result.p_value
-            test_statistic = logrank_result.test_statistic
-            results.append(f"  Log-rank 检验统计量 = {test_statistic:.4f}，P = {p_value:.4f}")
-            if p_value < 0.05:
-                results.append("  结论：不同分组间的生存曲线差异具有统计学意义 (P < 0.05)。")
+            summary = survival_summary(time_values, status_values, group_codes, len(group_names))
+            if summary['logrank'] is None:
+                results.append("  所有数据均为删失 (无事件)，无法进行 Log-rank 检验。")
             else:
-                results.append("  结论：不同分组间的生存曲线差异无统计学意义 (P >= 0.05)。")
+                test_statistic, dof, p_value = summary['logrank']
+                results.append(f"  Log-rank 检验统计量 = {test_statistic:.4f}，自由度 df = {dof}，P = {p_value:.4f}")
+                if p_value < 0.05:
+                    results.append("  结论：不同分组间的生存曲线差异具有统计学意义 (P < 0.05)。")
+                else:
+                    results.append("  结论：不同分组间的生存曲线差异无统计学意义 (P >= 0.05)。")
         except Exception as lr_err:
             results.append(f"  Log-rank 检验失败: {lr_err}")
 
+        # N and events do not depend on the engine, so they are reported even if it failed
+        n = np.bincount(group_codes, minlength=len(group_names))
+        events = np.bincount(group_codes, weights=status_values, minlength=len(group_names)).astype(int)
         results.append("\n各组描述:")
-        for group_name, stats in group_results.items():
+        for i, group_name in enumerate(group_names):
             results.append(f"  分组: {group_name}")
-            results.append(f"    样本量 N = {stats['N']}")
-            results.append(f"    事件数 Events = {stats['Events']}")
-            results.append(f"    生存时间中位数 = {stats['Median']}")
+            results.append(f"    样本量 N = {n[i]}")
+            results.append(f"    事件数 Events = {events[i]}")
+            median_text = (format_median_survival(summary['median'][i], summary['median_lower'][i],
+                                                  summary['median_upper'][i]) if summary is not None else "无法计算")
+            results.append(f"    生存时间中位数 = {median_text}")
 
     return "\n".join(results)
 
 
+# --- Startup Warm-up ---
+# NumPy, pandas and SciPy are bound lazily (lazy_imports.py), so importing the app
+# only costs Flask. warm_up() then loads them and starts the R workers so the
+# first request does not pay for it: 'background' (default) does this in a thread
+# while the app already accepts requests and /ready answers 503 until it is done,
+# 'eager' does it before the import returns, 'off' leaves everything to first use.
+# 'preload' is for gunicorn's preload_app (see gunicorn.conf.py): the master
+# imports the modules once before forking, and each worker process then calls
+# start_worker() to start its own threads and R workers.
+APP_WARM_UP = os.environ.get('APP_WARM_UP', 'background')
+_warm_up_done = threading.Event()
+
+
+def warm_up(r_workers=True):
+    """Imports the heavy modules and, if r_workers, starts the R worker pool. Safe to call more than once.
+
+    Only the full warm-up marks the process ready: after the preload (r_workers=False) in
+    gunicorn's master, each worker stays unready until its own R workers have started."""
+    with stage_timer.stage('warm_up'):
+        for module, seconds in warm_up_modules().items(): import_seconds_gauge.set(seconds, module=module)
+        pool = get_r_worker_pool() if r_workers else None
+        if pool is not None and os.path.exists(R_WORKER_SCRIPT_PATH):
+            try:
+                pool.warm_up()
+            except RWorkerStartError as e:
+                print(f"Warning: could not start the R workers during warm-up: {e}")
+    if r_workers: _warm_up_done.set()
+
+
+def _background_warm_up():
+    try:
+        warm_up()
+    except Exception as e:
+        print(f"Error during warm-up: {e}")  # /ready keeps answering 503
+
+
+def start_worker():
+    """Starts this process's background work: the plot storage sweeper and the warm-up."""
+    plot_storage.start()
+    if APP_WARM_UP == 'eager':
+        warm_up()
+    elif APP_WARM_UP in ('background', 'preload'):
+        threading.Thread(target=_background_warm_up, name='warm-up', daemon=True).start()
+    else:
+        _warm_up_done.set()  # Nothing to wait for: modules load on first use
+
+
+if APP_WARM_UP == 'preload':
+    warm_up(r_workers=False)  # No threads or R processes before the fork
+else:
+    start_worker()
+
+
+# --- Request Metrics ---
+@app.before_request
+def start_request_trace():
+    g.request_started = time.perf_counter()
+    set_current_trace(Trace())
+
+
+@app.after_request
+def record_request_metrics(response):
+    elapsed = time.perf_counter() - g.request_started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    http_requests.inc(route=route, method=request.method, status=response.status_code)
+    http_request_seconds.observe(elapsed, route=route)
+    trace = current_trace()
+    if TRACE_HEADER in request.headers and trace is not None:
+        # Streamed responses only include the stages finished before the first chunk
+        stages = trace.server_timing()
+        response.headers['Server-Timing'] = f"{stages + ', ' if stages else ''}total;dur={elapsed * 1000:.2f}"
+    return response
+
+
+@app.teardown_request
+def clear_request_trace(exc):
+    set_current_trace(None)
+
+
 # --- Flask Routes ---
 @app.route('/')
 def index(): return render_template('index.html')
 
 
+@app.route('/metrics')
+def prometheus_metrics():
+    usage = plot_storage.usage()
+    for measure in ('files', 'bytes', 'max_bytes', 'evicted_files', 'evicted_bytes'):
+        plot_storage_gauge.set(usage[measure], measure=measure)
+    jobs = plot_jobs.stats()
+    for status in ('queued', 'running', 'done', 'failed'): plot_jobs_gauge.set(jobs[status], status=status)
+    if r_slots is not None:
+        r_slots_gauge.set(r_slots.slots, measure='total')
+        r_slots_gauge.set(r_slots.in_use(), measure='in_use')
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/ready')
+def readiness():
+    # Readiness probe: 503 until the warm-up has loaded the heavy modules and started the R workers
+    ready = _warm_up_done.is_set()
+    return jsonify({"ready": ready, "warm_up": APP_WARM_UP, "import_seconds": import_seconds(),
+                    "pending_modules": pending_modules()}), 200 if ready else 503
+
+
 @app.route('/plots/<filename>')
-def serve_plot(filename): return send_from_directory(PDF_DIR, filename, mimetype='application/pdf')
+def serve_plot(filename):
+    # One lookup decides: it records the access (frequently viewed plots stay resident) and
+    # removes a plot whose TTL has passed but that the sweeper has not reached yet
+    if plot_storage.lookup(filename) == EXPIRED: abort(410, description="该图表已过期并被清理，请重新生成。")
+    return send_from_directory(PDF_DIR, filename, mimetype='application/pdf')
 
 
-# --- Correlation Endpoints ---
-@app.route('/generate_stats', methods=['POST'])
-def generate_correlation_stats():
-    # ... (same as before) ...
-    if not request.is_json: abort(400, description="请求必须是 JSON 格式")
-    req_data = request.get_json()
-    table_data = req_data.get('table_data')
-    if not table_data: abort(400, description="未找到 'table_data'")
-    try:
-        df = pd.DataFrame(table_data, columns=['X', 'Y']).astype(float)
-        stats_text = calculate_correlation_stats(df['X'].values, df['Y'].values)
-        return jsonify({"stats_text": stats_text})
-    except (ValueError, KeyError, TypeError) as e:
-        abort(400, description=f"数据格式错误或不足: {e}")
-    except Exception as e:
-        abort(500, description=f"生成相关性统计时发生内部错误: {e}")
+@app.route('/plot_jobs/<job_id>')
+def plot_job_status(job_id):
+    job = plot_jobs.get(job_id)
+    if job is None: abort(404, description="未找到该绘图任务（可能已过期）。")
+    return jsonify(job)
 
 
-@app.route('/generate_plot', methods=['POST'])
-def generate_correlation_plot():
-    # ... (same as before) ...
+@app.route('/plot_storage')
+def plot_storage_usage():
+    return jsonify({**plot_storage.usage(), "cache": plot_cache.stats(), "jobs": plot_jobs.stats()})
+
+
+# --- Request Parsing & Validation (shared by the stats, plot and combined endpoints) ---
+def get_table_data():
     if not request.is_json: abort(400, description="请求必须是 JSON 格式")
-    req_data = request.get_json()
+    with stage_timer.stage('json_parse'): req_data = request.get_json()
     table_data = req_data.get('table_data')
-    plot_method = req_data.get('plot_method', 'lm')
     if not table_data: abort(400, description="未找到 'table_data'")
+    return req_data, table_data
+
+
+def parse_correlation_table(table_data):
+    """[[x, y], ...] -> float DataFrame with columns X, Y."""
     try:
         df = pd.DataFrame(table_data, columns=['X', 'Y']).astype(float)
-        if len(df) < 3: abort(400, description="数据不足 (<3 行)")
-    except Exception as e:
+    except (ValueError, KeyError, TypeError) as e:
         abort(400, description=f"数据格式错误: {e}")
+    return check_correlation_frame(df)
 
-    tmp_csv_file = None
-    try:
-        with tempfile.NamedTemporaryFile(mode='w', suffix=".csv", delete=False, encoding='utf-8') as tmp_csv_file:
-            df.to_csv(tmp_csv_file.name, index=False)
-            input_csv_path = tmp_csv_file.name
-        pdf_filename = f"Correlation_plot_{uuid.uuid4().hex}.pdf"
-        output_pdf_path = os.path.join(PDF_DIR, pdf_filename)
-        args = ['--input', input_csv_path, '--output', output_pdf_path, '--method', plot_method]
-        process = run_r_script(CORRELATION_R_SCRIPT_PATH, args)
-        if process.returncode != 0:
-            error_msg = f"相关性 R 脚本执行失败: {process.stderr or process.stdout or 'Unknown R error'}"
-            print(error_msg)
-            abort(500, description=error_msg.splitlines()[0])
-        if not os.path.exists(output_pdf_path): abort(500, description="R 脚本成功，但未找到输出 PDF。")
-        return jsonify({"pdf_url": f"/plots/{pdf_filename}"})
-    except Exception as e:
-        abort(500, description=f"生成相关性图表时出错: {e}")
-    finally:
-        if tmp_csv_file and os.path.exists(tmp_csv_file.name): os.remove(tmp_csv_file.name)
 
+def check_correlation_frame(df):
+    if len(df) < 3: abort(400, description="数据不足 (<3 行)")
+    return df
 
-# --- Two-Group Endpoints ---
-@app.route('/generate_two_group_stats', methods=['POST'])
-def generate_two_group_stats():
-    # ... (same as before) ...
-    if not request.is_json: abort(400, description="请求必须是 JSON 格式")
-    req_data = request.get_json()
-    table_data = req_data.get('table_data')  # Expecting [[group_name, value], ...]
-    if not table_data: abort(400, description="未找到 'table_data'")
+
+def parse_two_group_table(table_data):
+    """[[group_name, value], ...] -> DataFrame with columns Group, Value (exactly two groups, >= 2 points each)."""
     try:
         df = pd.DataFrame(table_data, columns=['Group', 'Value'])
         df['Value'] = df['Value'].astype(float)  # Ensure Value is numeric
-        groups = df['Group'].unique()
-        if len(groups) != 2: abort(400,
-                                   description=f"需要恰好两个分组，但找到了 {len(groups)} 个: {', '.join(map(str, groups))}")
-        group1_name, group2_name = groups[0], groups[1]
-        group1_data = df[df['Group'] == group1_name]['Value'].values
-        group2_data = df[df['Group'] == group2_name]['Value'].values
-        if len(group1_data) < 2 or len(group2_data) < 2: abort(400,
-                                                               description=f"每组至少需要 2 个数据点 (组 '{group1_name}': {len(group1_data)}, 组 '{group2_name}': {len(group2_data)})")
-        stats_text = calculate_two_group_stats(group1_data, group2_data, str(group1_name), str(group2_name))
-        return jsonify({"stats_text": stats_text})
     except (ValueError, KeyError, TypeError) as e:
-        abort(400, description=f"数据格式错误或不足: {e}")
-    except Exception as e:
-        abort(500, description=f"生成两组比较统计时发生内部错误: {e}")
+        abort(400, description=f"数据格式错误: {e}")
+    return check_two_group_frame(df)
 
 
-@app.route('/generate_two_group_plot', methods=['POST'])
-def generate_two_group_plot():
-    # ... (same as before) ...
-    if not request.is_json: abort(400, description="请求必须是 JSON 格式")
-    req_data = request.get_json()
-    table_data = req_data.get('table_data')  # Expecting [[group_name, value], ...]
-    plot_method = req_data.get('plot_method', 'boxplot')  # Default plot type
-    if not table_data: abort(400, description="未找到 'table_data'")
+def check_group_labels(df):
+    """400 on the first row whose Group is missing (None/NaN or blank); value_counts would silently drop it."""
+    groups = df['Group']
+    missing = np.flatnonzero((groups.isna() | groups.astype(str).str.strip().eq('')).to_numpy())
+    if len(missing): abort(400, description=f"第 {missing[0] + 1} 行: Group 缺少分组名称")
+
+
+def check_two_group_frame(df):
+    invalid = np.flatnonzero(~np.isfinite(df['Value'].to_numpy(dtype=float)))
+    if len(invalid): abort(400, description=f"第 {invalid[0] + 1} 行: 数值 (Value) 缺失或不是有效数字")
+    check_group_labels(df)
+    counts = df['Group'].value_counts(sort=False)  # one pass instead of a boolean mask per group
+    if len(counts) != 2:
+        abort(400, description=f"需要恰好两个分组，但找到了 {len(counts)} 个: {', '.join(map(str, counts.index))}")
+    if counts.min() < 2:
+        abort(400, description=f"每组至少需要 2 个数据点 ({', '.join(f'组 {g!r}: {n}' for g, n in counts.items())})")
+    return df
+
+
+def parse_multi_group_table(table_data):
+    """[[group_name, value], ...] -> DataFrame with columns Group, Value (>= 2 groups, >= 2 points each)."""
     try:
         df = pd.DataFrame(table_data, columns=['Group', 'Value'])
         df['Value'] = df['Value'].astype(float)
-        groups = df['Group'].unique()
-        if len(groups) != 2: abort(400, description=f"需要恰好两个分组，但找到了 {len(groups)} 个")
-        if len(df[df['Group'] == groups[0]]) < 2 or len(df[df['Group'] == groups[1]]) < 2: abort(400,
-                                                                                                 description="每组至少需要2个数据点")
-    except Exception as e:
+    except (ValueError, KeyError, TypeError) as e:
         abort(400, description=f"数据格式错误: {e}")
+    return check_multi_group_frame(df)
 
-    tmp_csv_file = None
-    try:
-        with tempfile.NamedTemporaryFile(mode='w', suffix=".csv", delete=False, encoding='utf-8') as tmp_csv_file:
-            df.to_csv(tmp_csv_file.name, index=False)
-            input_csv_path = tmp_csv_file.name
-        pdf_filename = f"TwoGroup_plot_{uuid.uuid4().hex}.pdf"
-        output_pdf_path = os.path.join(PDF_DIR, pdf_filename)
-        if not os.path.exists(TWO_GROUP_R_SCRIPT_PATH): abort(500,
-                                                              description="Two-group R script not found on server.")
-        args = ['--input', input_csv_path, '--output', output_pdf_path, '--plottype', plot_method]
-        process = run_r_script(TWO_GROUP_R_SCRIPT_PATH, args)
-        if process.returncode != 0:
-            error_msg = f"两组比较 R 脚本执行失败: {process.stderr or process.stdout or 'Unknown R error'}"
-            print(error_msg)
-            abort(500, description=error_msg.splitlines()[0])
-        if not os.path.exists(output_pdf_path): abort(500, description="R 脚本成功，但未找到输出 PDF。")
-        return jsonify({"pdf_url": f"/plots/{pdf_filename}"})
-    except Exception as e:
-        abort(500, description=f"生成两组比较图表时出错: {e}")
-    finally:
-        if tmp_csv_file and os.path.exists(tmp_csv_file.name): os.remove(tmp_csv_file.name)
 
+def check_multi_group_frame(df):
+    invalid = np.flatnonzero(~np.isfinite(df['Value'].to_numpy(dtype=float)))
+    if len(invalid): abort(400, description=f"第 {invalid[0] + 1} 行: 数值 (Value) 缺失或不是有效数字")
+    check_group_labels(df)
+    counts = df['Group'].value_counts(sort=False)
+    if len(counts) < 2: abort(400, description=f"需要至少两个分组，但找到了 {len(counts)} 个")
+    small = counts[counts < 2]
+    if len(small):
+        abort(400, description=f"每组至少需要 2 个数据点 ({', '.join(f'组 {g!r}: {n}' for g, n in small.items())})")
+    return df
 
-# --- NEW Survival Analysis Endpoints ---
-@app.route('/generate_survival_stats', methods=['POST'])
-def generate_survival_stats():
-    if not LIFELINES_AVAILABLE: abort(501,
-                                      description="Survival analysis feature not available: 'lifelines' library missing.")
-    if not request.is_json: abort(400, description="请求必须是 JSON 格式")
-    req_data = request.get_json()
-    table_data = req_data.get('table_data')  # Expecting [[time, status, group], ...]
-    if not table_data: abort(400, description="未找到 'table_data'")
 
+def parse_survival_table(table_data):
+    """[[time, status, group], ...] -> DataFrame with numeric Time, integer Status (0/1) and string Group."""
     try:
         df = pd.DataFrame(table_data, columns=['Time', 'Status', 'Group'])
         # Validate data types
         df['Time'] = pd.to_numeric(df['Time'])
         df['Status'] = pd.to_numeric(df['Status']).astype(int)  # Ensure integer 0 or 1
         df['Group'] = df['Group'].astype(str).fillna('')  # Treat NaN/None groups as empty string
+    except (ValueError, KeyError, TypeError) as e:
+        abort(400, description=f"数据格式错误: {e}")
+    return check_survival_frame(df)
+
+
+def check_survival_frame(df):
+    # Basic validation
+    if df['Time'].min() < 0: abort(400, description="时间 (Time) 不能为负数。")
+    if not df['Status'].isin([0, 1]).all(): abort(400, description="状态 (Status) 必须为 0 或 1。")
+    if len(df) < 3: abort(400, description="生存分析至少需要 3 条有效数据。")
+    return df
+
+
+def get_json_form_field(name):
+    # Multipart uploads carry the JSON options as form fields
+    try:
+        value = json.loads(request.form.get(name) or '{}')
+    except ValueError as e:
+        abort(400, description=f"'{name}' 不是有效的 JSON: {e}")
+    if not isinstance(value, dict): abort(400, description=f"'{name}' 必须是 JSON 对象")
+    return value
+
+
+def get_request_frame(analysis_type):
+    """(request options, validated DataFrame) from a JSON body with 'table_data' or a multipart file upload.
+
+    Uploads: a 'file' part (CSV, NDJSON or Parquet), optional 'format', 'column_map' (JSON object,
+    e.g. {"Time": "os_months"}) and 'options' (JSON object with the same keys as a JSON request).
+    """
+    parse_table, check_frame = ANALYSES[analysis_type][:2]
+    if request.mimetype != 'multipart/form-data':
+        req_data, table_data = get_table_data()
+        with stage_timer.stage('validate'): df = parse_table(table_data)
+        return req_data, df
+
+    with stage_timer.stage('upload_receive'): upload = request.files.get('file')
+    if upload is None: abort(400, description="未找到上传文件 'file'")
+    req_data = get_json_form_field('options')
+    column_map = get_json_form_field('column_map')
+    try:
+        with stage_timer.stage('upload_parse'):
+            df = read_upload(upload, analysis_type, request.form.get('format'), column_map)
+    except UploadError as e:
+        abort(400, description=str(e))
+    with stage_timer.stage('validate'): check_frame(df)
+    return req_data, df
+
+
+def get_normality_method(req_data):
+    normality_method = req_data.get('normality_test', 'auto')
+    if normality_method not in NORMALITY_TESTS:
+        abort(400, description=f"未知的正态性检验 '{normality_method}'，可选: {', '.join(NORMALITY_TESTS)}")
+    return normality_method
+
+
+def get_resampling_options(req_data):
+    """Keyword arguments for resampling.py, or None if the request does not ask for it.
+
+    "resampling": true uses the defaults; an object may set n_resamples, seed,
+    time_limit (seconds, capped at MAX_TIME_LIMIT) and confidence_level."""
+    options = req_data.get('resampling')
+    if not options: return None
+    if options is True: options = {}
+    if not isinstance(options, dict): abort(400, description="'resampling' 必须是 true 或 JSON 对象")
+    unknown = set(options) - {'n_resamples', 'seed', 'time_limit', 'confidence_level'}
+    if unknown: abort(400, description=f"'resampling' 包含未知选项: {', '.join(sorted(unknown))}")
+    try:
+        n_resamples = int(options.get('n_resamples', DEFAULT_RESAMPLES))
+        seed = options.get('seed')
+        seed = None if seed is None else int(seed)
+        time_limit = min(float(options.get('time_limit', DEFAULT_TIME_LIMIT)), MAX_TIME_LIMIT)
+        confidence_level = float(options.get('confidence_level', 0.95))
+    except (ValueError, TypeError) as e:
+        abort(400, description=f"'resampling' 选项格式错误: {e}")
+    if not 1 <= n_resamples <= MAX_RESAMPLES:
+        abort(400, description=f"n_resamples 必须在 1 到 {MAX_RESAMPLES} 之间")
+    if seed is not None and seed < 0: abort(400, description="seed 必须是非负整数")
+    if not time_limit > 0: abort(400, description="time_limit 必须大于 0")
+    if not 0 < confidence_level < 1: abort(400, description="confidence_level 必须在 0 和 1 之间")
+    return {"n_resamples": n_resamples, "seed": seed, "time_limit": time_limit,
+            "confidence_level": confidence_level}
+
+
+def get_stats_options(analysis_type, req_data):
+    """Keyword arguments for the analysis' stats function (aborts with 400 on invalid options)."""
+    options = {"normality_method": get_normality_method(req_data)}
+    if analysis_type != 'multi_group':
+        options["resampling"] = get_resampling_options(req_data)
+        return options
+    method = req_data.get('method', 'auto')
+    correction = req_data.get('correction', 'holm')
+    if method not in MULTI_GROUP_METHODS:
+        abort(400, description=f"未知的检验方法 '{method}'，可选: {', '.join(MULTI_GROUP_METHODS)}")
+    if correction not in CORRECTION_METHODS:
+        abort(400, description=f"未知的校正方法 '{correction}'，可选: {', '.join(CORRECTION_METHODS)}")
+    return {**options, "method": method, "correction": correction}
+
+
+def format_resampling(result, statistic_label):
+    """The resampling lines appended to stats_text."""
+    low, high = result["bootstrap_ci"]
+    ci_text = f"[{low:.4f}, {high:.4f}]" if low is not None else "无法计算"
+    lines = ["---",
+             f"置换检验 ({statistic_label}，{result['n_completed']} 次置换): P = {result['permutation_p']:.4f}",
+             f"Bootstrap {result['confidence_level'] * 100:g}% 置信区间 ({statistic_label}，百分位法): {ci_text}"]
+    if result["time_limited"]:
+        lines.append(f"注意：已达到 {result['time_limit']:g}s 时限，仅完成 {result['n_completed']}/"
+                     f"{result['n_resamples']} 次重抽样")
+    return "\n".join(lines)
+
+
+def add_resampling(result, resample, statistic_label):
+    """Runs resample() into result["resampling"] and appends its lines to stats_text. Data the
+    resampling cannot use (e.g. a constant X) marks only that part as unavailable."""
+    try:
+        with stage_timer.stage('resampling'): result["resampling"] = resample()
+    except ValueError as e:
+        result["resampling"] = {"error": str(e)}
+        result["stats_text"] += f"\n---\n重抽样分析不可用: {e}"
+    else:
+        result["stats_text"] += "\n" + format_resampling(result["resampling"], statistic_label)
+
+
+# --- Stats & Plot Specs per Analysis Type ---
+# Stats functions take df plus the options from get_stats_options() (normality method, and
+# resampling or the multi-group method and correction) and return the stats fields of the
+# response, including which normality test was actually used for each sample.
+MULTI_GROUP_TEXT_PAIRS = 20  # Significant post-hoc pairs listed in stats_text (all are in "posthoc")
+
+
+def correlation_stats(df, normality_method, resampling=None):
+    n = len(df)
+    x, y = df['X'].values, df['Y'].values
+    result = {"stats_text": calculate_correlation_stats(x, y, normality_method),
+              "normality_tests": {"X": resolve_normality_test(normality_method, n),
+                                  "Y": resolve_normality_test(normality_method, n)}}
+    if resampling and n >= 3:
+        add_resampling(result, lambda: correlation_resampling(x, y, **resampling), "Pearson r")
+    return result
+
+
+def two_group_stats(df, normality_method, resampling=None):
+    codes, groups = pd.factorize(df['Group'])  # groups in order of appearance
+    values = df['Value'].values
+    group1_data, group2_data = values[codes == 0], values[codes == 1]
+    result = {"stats_text": calculate_two_group_stats(group1_data, group2_data, str(groups[0]), str(groups[1]),
+                                                      normality_method),
+              "normality_tests": {str(groups[0]): resolve_normality_test(normality_method, len(group1_data)),
+                                  str(groups[1]): resolve_normality_test(normality_method, len(group2_data))}}
+    if resampling and len(group1_data) >= 2 and len(group2_data) >= 2:
+        add_resampling(result, lambda: two_group_resampling(group1_data, group2_data, **resampling),
+                       "均值差 M1 - M2")
+    return result
+
+
+def format_stat(value, spec):
+    """Formats a JSON-ready statistic; None (NaN/inf in the analysis, e.g. zero variance) shows as NA."""
+    return "NA" if value is None else format(value, spec)
+
+
+def format_multi_group_stats(result):
+    groups = result["groups"]
+    omnibus = result["omnibus"]
+    lines = [f"统计描述 (多组比较: {len(groups)} 组，N = {sum(g['n'] for g in groups)})"]
+    for g in groups:
+        normality_p = g['normality_p']
+        normality = (f"正态性检验 ({NORMALITY_TEST_LABELS[g['normality_test']]}) P = {format_stat(normality_p, '.4f')} "
+                     f"({'NA' if normality_p is None else '正态' if normality_p > 0.05 else '非正态'})"
+                     if g['normality_test'] else "正态性检验: 样本量不足")
+        lines.append(f"组 {g['group']}: n = {g['n']}，均值 = {format_stat(g['mean'], '.3f')}，"
+                     f"标准差 = {format_stat(g['sd'], '.3f')}，中位数 = {format_stat(g['median'], '.3f')}，{normality}")
+    levene = result["levene"]
+    statistic_name = 'H' if result["method"] == 'kruskal' else 'F'
+    df_text = format_stat(omnibus['df1'], 'g') + (f", {format_stat(omnibus['df2'], '.4g')}"
+                                                  if result["method"] != 'kruskal' else "")
+    p = omnibus['p_value']
+    levene_text = ('无法计算' if levene['p_value'] is None else '方差齐' if levene['equal_var'] else '方差不齐')
+    lines += ["---",
+              f"方差齐性检验 (Levene) F = {format_stat(levene['statistic'], '.4f')}，"
+              f"P = {format_stat(levene['p_value'], '.4f')} ({levene_text})",
+              f"{METHOD_LABELS[result['method']]}: {statistic_name} = {format_stat(omnibus['statistic'], '.4f')}，"
+              f"df = {df_text}，P = {format_stat(p, '.4f')} ({'NA' if p is None else '< 0.05' if p < 0.05 else '>= 0.05'})"]
+    significant = [pair for pair in result["posthoc"] if pair["significant"]]
+    lines += ["---", f"事后两两比较 ({POSTHOC_LABELS[result['method']]}，{result['correction']} 校正): "
+                     f"{len(significant)}/{len(result['posthoc'])} 对差异有统计学意义"]
+    difference_label = '平均秩差' if result["method"] == 'kruskal' else '均值差'
+    for pair in significant[:MULTI_GROUP_TEXT_PAIRS]:
+        lines.append(f"  {pair['group1']} vs {pair['group2']}: {difference_label} = "
+                     f"{format_stat(pair['difference'], '.3f')}，校正 P = {format_stat(pair['p_adjusted'], '.4f')}")
+    if len(significant) > MULTI_GROUP_TEXT_PAIRS:
+        lines.append(f"  …另有 {len(significant) - MULTI_GROUP_TEXT_PAIRS} 对（完整结果见 posthoc）")
+    if p is None:
+        lines.append("结论：检验统计量无法计算（例如组内方差为 0），无法判断组间差异")
+    else:
+        lines.append(f"结论：各组间{'存在' if p < 0.05 else '无'}统计学意义上的差异")
+    return "\n".join(lines)
+
+
+def multi_group_stats(df, normality_method, method='auto', correction='holm'):
+    codes, groups = pd.factorize(df['Group'])  # once; groups in order of appearance
+    result = multi_group_analysis(codes, df['Value'].to_numpy(dtype=float), [str(g) for g in groups], method,
+                                  correction, normality_method)
+    return {"stats_text": format_multi_group_stats(result),
+            "normality_tests": {g["group"]: g["normality_test"] for g in result["groups"]}, **result}
+
+
+def survival_stats(df, normality_method, resampling=None):
+    return {"stats_text": calculate_survival_stats(df)}  # no normality assumption
+
+
+def correlation_plot_spec(req_data):
+    """(filename prefix, R script, script args, error label) for a correlation plot request."""
+    return 'Correlation_plot', CORRELATION_R_SCRIPT_PATH, ['--method', req_data.get('plot_method', 'lm')], '相关性'
+
+
+def two_group_plot_spec(req_data):
+    plot_method = req_data.get('plot_method', 'boxplot')  # Default plot type
+    return 'TwoGroup_plot', TWO_GROUP_R_SCRIPT_PATH, ['--plottype', plot_method], '两组比较'
+
+
+def multi_group_plot_spec(req_data):
+    plot_method = req_data.get('plot_method', 'boxplot')
+    return 'MultiGroup_plot', TWO_GROUP_R_SCRIPT_PATH, ['--plottype', plot_method, '--multigroup', 'TRUE'], '多组比较'
+
+
+def survival_plot_spec(req_data):
+    plot_options = req_data.get('plot_options', {})  # Get options like {show_ci: true, show_risk_table: false}
+    # Explicitly pass FALSE if unchecked
+    args = ['--show_ci', 'TRUE' if plot_options.get('show_ci') else 'FALSE',
+            '--show_risk_table', 'TRUE' if plot_options.get('show_risk_table') else 'FALSE']
+    return 'Survival_plot', SURVIVAL_R_SCRIPT_PATH, args, '生存分析'
+
+
+# --- Plot Previews (in-process SVG, see preview.py) ---
+# With "preview": true a plot request also gets "preview_svg", drawn in this process
+# from the parsed frame, so the UI can show the plot at once while R renders the PDF
+# (async) or instead of it ("pdf": false; the same request without it fetches the PDF later).
+def correlation_plot_preview(df, req_data):
+    return correlation_preview(df['X'].to_numpy(dtype=float), df['Y'].to_numpy(dtype=float),
+                               req_data.get('plot_method', 'lm'))
+
+
+def two_group_plot_preview(df, req_data):
+    codes, groups = pd.factorize(df['Group'], sort=True)  # as.factor() in the R script sorts the levels
+    return group_preview(codes, df['Value'].to_numpy(dtype=float), [str(g) for g in groups],
+                         req_data.get('plot_method', 'boxplot'))
+
+
+def multi_group_plot_preview(df, req_data):
+    codes, groups = pd.factorize(df['Group'])  # order of appearance, as in the R script and the stats
+    return group_preview(codes, df['Value'].to_numpy(dtype=float), [str(g) for g in groups],
+                         req_data.get('plot_method', 'boxplot'), multi_group=True)
+
+
+def survival_plot_preview(df, req_data):
+    # Like survival_plot.R: rows without a group form an "Overall" group, levels sorted
+    codes, groups = pd.factorize(df['Group'].astype(str).replace('', 'Overall'), sort=True)
+    return survival_preview(df['Time'].to_numpy(dtype=float), df['Status'].to_numpy(dtype=float), codes,
+                            [str(g) for g in groups], bool(req_data.get('plot_options', {}).get('show_ci')))
+
 
-        # Basic validation
-        if df['Time'].min() < 0: abort(400, description="时间 (Time) 不能为负数。")
-        if not df['Status'].isin([0, 1]).all(): abort(400, description="状态 (Status) 必须为 0 或 1。")
-        if len(df) < 3: abort(400, description="生存分析至少需要 3 条有效数据。")
+def preview_part(preview_fn, df, req_data):
+    """{"preview_svg": ...}, or {"preview_error": ...}: a failed preview never fails the request."""
+    try:
+        with stage_timer.stage('preview'): return {"preview_svg": preview_fn(df, req_data)}
+    except Exception as e:
+        print(f"Error drawing plot preview: {e}")
+        return {"preview_error": f"生成预览图时出错: {e}"}
+
+
+# analysis type -> (parse table, check frame, stats, plot spec, stats error label, plot preview)
+ANALYSES = {
+    'correlation': (parse_correlation_table, check_correlation_frame, correlation_stats, correlation_plot_spec,
+                    '相关性统计', correlation_plot_preview),
+    'two_group': (parse_two_group_table, check_two_group_frame, two_group_stats, two_group_plot_spec, '两组比较统计',
+                  two_group_plot_preview),
+    'multi_group': (parse_multi_group_table, check_multi_group_frame, multi_group_stats, multi_group_plot_spec,
+                    '多组比较统计', multi_group_plot_preview),
+    'survival': (parse_survival_table, check_survival_frame, survival_stats, survival_plot_spec, '生存分析统计',
+                 survival_plot_preview),
+}
 
-        stats_text = calculate_survival_stats(df)
-        return jsonify({"stats_text": stats_text})
 
+def stats_response(analysis_type):
+    _, _, stats_fn, _, error_label, _ = ANALYSES[analysis_type]
+    req_data, df = get_request_frame(analysis_type)
+    options = get_stats_options(analysis_type, req_data)
+    try:
+        with stage_timer.stage('stats'): return jsonify(stats_fn(df, **options))
     except (ValueError, KeyError, TypeError) as e:
         abort(400, description=f"数据格式错误或不足: {e}")
     except Exception as e:
-        abort(500, description=f"生成生存分析统计时发生内部错误: {e}")
+        abort(500, description=f"生成{error_label}时发生内部错误: {e}")
+
+
+def plot_route_response(analysis_type):
+    _, _, _, plot_spec, _, preview_fn = ANALYSES[analysis_type]
+    req_data, df = get_request_frame(analysis_type)
+    preview = preview_part(preview_fn, df, req_data) if req_data.get('preview') else None
+    if preview is not None and req_data.get('pdf') is False: return jsonify(preview)  # preview only
+    filename_prefix, r_script_path, script_args, error_label = plot_spec(req_data)
+    # Ensure the specific R script exists before calling
+    if not os.path.exists(r_script_path): abort(500, description=f"{error_label} R script not found on server.")
+    return plot_response(req_data, filename_prefix, r_script_path, df, script_args, error_label, preview)
+
+
+# --- Correlation Endpoints ---
+@app.route('/generate_stats', methods=['POST'])
+def generate_correlation_stats(): return stats_response('correlation')
+
+
+@app.route('/generate_plot', methods=['POST'])
+def generate_correlation_plot(): return plot_route_response('correlation')
+
+
+# --- Two-Group Endpoints ---
+@app.route('/generate_two_group_stats', methods=['POST'])
+def generate_two_group_stats(): return stats_response('two_group')
+
+
+@app.route('/generate_two_group_plot', methods=['POST'])
+def generate_two_group_plot(): return plot_route_response('two_group')
+
+
+# --- Multi-Group Endpoints ---
+@app.route('/generate_multi_group_stats', methods=['POST'])
+def generate_multi_group_stats(): return stats_response('multi_group')
+
+
+@app.route('/generate_multi_group_plot', methods=['POST'])
+def generate_multi_group_plot(): return plot_route_response('multi_group')
+
+
+# --- Survival Analysis Endpoints ---
+@app.route('/generate_survival_stats', methods=['POST'])
+def generate_survival_stats(): return stats_response('survival')
 
 
 @app.route('/generate_survival_plot', methods=['POST'])
-def generate_survival_plot():
-    if not request.is_json: abort(400, description="请求必须是 JSON 格式")
-    req_data = request.get_json()
-    table_data = req_data.get('table_data')
-    plot_options = req_data.get('plot_options', {})  # Get options like {show_ci: true, show_risk_table: false}
-    if not table_data: abort(400, description="未找到 'table_data'")
+def generate_survival_plot(): return plot_route_response('survival')
 
-    try:
-        df = pd.DataFrame(table_data, columns=['Time', 'Status', 'Group'])
-        # Validate data types
-        df['Time'] = pd.to_numeric(df['Time'])
-        df['Status'] = pd.to_numeric(df['Status']).astype(int)
-        df['Group'] = df['Group'].astype(str).fillna('')  # Use empty string for no group
 
-        if df['Time'].min() < 0: abort(400, description="时间 (Time) 不能为负数。")
-        if not df['Status'].isin([0, 1]).all(): abort(400, description="状态 (Status) 必须为 0 或 1。")
-        if len(df) < 3: abort(400, description="生存分析至少需要 3 条有效数据。")
+# --- Combined Stats + Plot Endpoint ---
+@app.route('/analyze/<analysis_type>', methods=['POST'])
+def analyze(analysis_type):
+    """Parses and validates once, renders the plot in the job queue while computing the stats
+    in this thread, and returns both. With "stream": true the response is NDJSON: the stats
+    line is sent as soon as it is ready and the plot line follows when the PDF is done.
+    With "preview": true the first part also carries the in-process SVG preview."""
+    if analysis_type not in ANALYSES:
+        abort(404, description=f"未知的分析类型 '{analysis_type}'，可选: {', '.join(ANALYSES)}")
+    _, _, stats_fn, plot_spec, stats_error_label, preview_fn = ANALYSES[analysis_type]
+    req_data, df = get_request_frame(analysis_type)
+    options = get_stats_options(analysis_type, req_data)
+    filename_prefix, r_script_path, script_args, error_label = plot_spec(req_data)
+    if not os.path.exists(r_script_path): abort(500, description=f"{error_label} R script not found on server.")
 
-    except Exception as e:
-        abort(400, description=f"数据格式错误: {e}")
+    trace = current_trace()
+
+    def render():
+        with trace_scope(trace):  # the render stages belong to this request's trace
+            return plot_result(filename_prefix, r_script_path, df, script_args, error_label)
 
-    tmp_csv_file = None
     try:
-        with tempfile.NamedTemporaryFile(mode='w', suffix=".csv", delete=False, encoding='utf-8') as tmp_csv_file:
-            # R script expects 'Time', 'Status', 'Group' columns
-            df.to_csv(tmp_csv_file.name, index=False)
-            input_csv_path = tmp_csv_file.name
-
-        pdf_filename = f"Survival_plot_{uuid.uuid4().hex}.pdf"
-        output_pdf_path = os.path.join(PDF_DIR, pdf_filename)
-
-        # Prepare arguments for R script based on plot_options
-        args = ['--input', input_csv_path, '--output', output_pdf_path]
-        if plot_options.get('show_ci'):
-            args.extend(['--show_ci', 'TRUE'])
-        else:
-            args.extend(['--show_ci', 'FALSE'])  # Explicitly pass FALSE if unchecked
-        if plot_options.get('show_risk_table'):
-            args.extend(['--show_risk_table', 'TRUE'])
-        else:
-            args.extend(['--show_risk_table', 'FALSE'])
+        job_id = plot_jobs.submit(filename_prefix, render)
+    except QueueFullError:
+        abort(429, description="绘图任务队列已满，请稍后重试。")
 
-        # Ensure the specific R script exists before calling
-        if not os.path.exists(SURVIVAL_R_SCRIPT_PATH):
-            abort(500, description="Survival analysis R script not found on server.")
+    try:
+        with stage_timer.stage('stats'): stats_part = stats_fn(df, **options)
+    except Exception as e:
+        stats_part = {"stats_error": f"生成{stats_error_label}时发生内部错误: {e}"}
+    if req_data.get('preview'): stats_part.update(preview_part(preview_fn, df, req_data))
 
-        process = run_r_script(SURVIVAL_R_SCRIPT_PATH, args)
+    def plot_part():
+        job = plot_jobs.wait(job_id)
+        if job["status"] == "done": return {"pdf_url": job["pdf_url"], "cached": job["cached"]}
+        return {"plot_error": job["error"]}
 
-        if process.returncode != 0:
-            error_msg = f"生存分析 R 脚本执行失败: {process.stderr or process.stdout or 'Unknown R error'}"
-            print(error_msg)
-            abort(500, description=error_msg.splitlines()[0])
-        if not os.path.exists(output_pdf_path):
-            abort(500, description="R 脚本成功，但未找到输出 PDF。")
+    if not req_data.get('stream'):
+        return jsonify({**stats_part, **plot_part(), "job_id": job_id})
 
-        return jsonify({"pdf_url": f"/plots/{pdf_filename}"})
-    except Exception as e:
-        abort(500, description=f"生成生存分析图表时出错: {e}")
-    finally:
-        if tmp_csv_file and os.path.exists(tmp_csv_file.name): os.remove(tmp_csv_file.name)
+    def generate():
+        yield json.dumps({"type": "stats", **stats_part, "job_id": job_id}, ensure_ascii=False) + "\n"
+        yield json.dumps({"type": "plot", **plot_part()}, ensure_ascii=False) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+# --- Batch Statistics Endpoint ---
+@app.route('/generate_batch_stats', methods=['POST'])
+def generate_batch_stats():
+    # Many value columns against one grouping column (two_group) or one X column (correlation)
+    if not request.is_json: abort(400, description="请求必须是 JSON 格式")
+    with stage_timer.stage('json_parse'): req_data = request.get_json()
+    table_data = req_data.get('table_data')  # Expecting [[group_or_x, v1, v2, ...], ...]
+    mode = req_data.get('mode', 'two_group')
+    correction = req_data.get('correction', 'bh')
+    normality_method = get_normality_method(req_data)
+    if not table_data: abort(400, description="未找到 'table_data'")
+    if mode not in ('two_group', 'correlation'): abort(400, description=f"未知的 mode '{mode}'，可选: two_group, correlation")
+    if correction not in CORRECTION_METHODS:
+        abort(400, description=f"未知的校正方法 '{correction}'，可选: {', '.join(CORRECTION_METHODS)}")
+
+    try:
+        with stage_timer.stage('validate'):
+            df = pd.DataFrame(table_data)
+            values = df.iloc[:, 1:].to_numpy(dtype=float)  # null -> NaN, excluded per column
+    except (ValueError, TypeError) as e:
+        abort(400, description=f"数据格式错误: {e}")
+    if values.shape[1] == 0: abort(400, description="'table_data' 每行需要至少一个数值列")
+    columns = req_data.get('columns') or [f"V{i}" for i in range(1, values.shape[1] + 1)]
+    if len(columns) != values.shape[1]:
+        abort(400, description=f"'columns' 数量 ({len(columns)}) 与数值列数量 ({values.shape[1]}) 不一致")
+
+    try:
+        with stage_timer.stage('stats'):
+            if mode == 'two_group':
+                codes, groups = pd.factorize(df.iloc[:, 0])  # rows without a group get code -1
+                if len(groups) != 2:
+                    abort(400, description=f"需要恰好两个分组，但找到了 {len(groups)} 个: {', '.join(map(str, groups))}")
+                results = batch_two_group(values[codes == 0], values[codes == 1], normality_method)
+                summary = {"group1": str(groups[0]), "group2": str(groups[1])}
+            else:
+                x = pd.to_numeric(df.iloc[:, 0]).to_numpy(dtype=float)
+                results = batch_correlation(x, values, normality_method)
+                summary = {}
+        return jsonify({"mode": mode, "correction": correction, "normality_test": normality_method,
+                        "n_columns": len(columns), **summary,
+                        "results": to_records(columns, results, correction)})
+    except (ValueError, TypeError) as e:
+        abort(400, description=f"数据格式错误或不足: {e}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,135 @@
+from lazy_imports import lazy_import
+from normality import column_normality_p, normality_test
+
+np = lazy_import('numpy')
+stats = lazy_import('scipy.stats')
+
+# --- Batch Statistics ---
+# Runs the two-group and correlation analyses for many value columns at once.
+# Each test is evaluated column-wise on the whole (samples x columns) matrix,
+# with missing values (NaN) excluded per column, followed by a multiple-testing
+# correction across columns.
+
+CORRECTION_METHODS = ('bh', 'bonferroni', 'holm', 'none')
+
+
+def adjust_p_values(p_values, method):
+    """Multiple-testing correction over the finite p-values; NaN stays NaN."""
+    p_values = np.asarray(p_values, dtype=float)
+    adjusted = np.full_like(p_values, np.nan)
+    finite = np.isfinite(p_values)
+    p = p_values[finite]
+    m = len(p)
+    if m == 0 or method == 'none':
+        adjusted[finite] = p
+    elif method == 'bh':
+        adjusted[finite] = stats.false_discovery_control(p, method='bh')
+    elif method == 'bonferroni':
+        adjusted[finite] = np.minimum(p * m, 1.0)
+    elif method == 'holm':
+        order = np.argsort(p)
+        stepped = np.maximum.accumulate(p[order] * (m - np.arange(m)))
+        holm = np.empty(m)
+        holm[order] = np.minimum(stepped, 1.0)
+        adjusted[finite] = holm
+    else:
+        raise ValueError(f"Unknown correction method '{method}'. Valid: {', '.join(CORRECTION_METHODS)}")
+    return adjusted
+
+
+def column_moments(values):
+    """NaN-aware per-column (n, mean, sample SD) of a (samples x columns) matrix."""
+    present = ~np.isnan(values)
+    n = present.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(present, values, 0.0).sum(axis=0) / n
+        sq_dev = np.where(present, (values - mean) ** 2, 0.0).sum(axis=0)
+        sd = np.sqrt(sq_dev / (n - 1))
+    return n, mean, sd
+
+
+def batch_two_group(values1, values2, normality_method='auto'):
+    """Normality, Levene (median-centred, as scipy's default) and Student/Welch t-tests per column."""
+    n1, mean1, sd1 = column_moments(values1)
+    n2, mean2, sd2 = column_moments(values2)
+    var1, var2 = sd1 ** 2, sd2 ** 2
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Levene: one-way ANOVA on absolute deviations from each group's median
+        z1 = np.abs(values1 - np.nanmedian(values1, axis=0))
+        z2 = np.abs(values2 - np.nanmedian(values2, axis=0))
+        zn1, zmean1, zsd1 = column_moments(z1)
+        zn2, zmean2, zsd2 = column_moments(z2)
+        n_total = zn1 + zn2
+        zmean = (zn1 * zmean1 + zn2 * zmean2) / n_total
+        between = zn1 * (zmean1 - zmean) ** 2 + zn2 * (zmean2 - zmean) ** 2
+        within = (zn1 - 1) * zsd1 ** 2 + (zn2 - 1) * zsd2 ** 2
+        levene_stat = (n_total - 2) * between / within
+        levene_p = stats.f.sf(levene_stat, 1, n_total - 2)
+
+        # Student (pooled variance) and Welch t-tests
+        df_student = n1 + n2 - 2
+        pooled = ((n1 - 1) * var1 + (n2 - 1) * var2) / df_student
+        t_student = (mean1 - mean2) / np.sqrt(pooled * (1 / n1 + 1 / n2))
+        se1, se2 = var1 / n1, var2 / n2
+        t_welch = (mean1 - mean2) / np.sqrt(se1 + se2)
+        df_welch = (se1 + se2) ** 2 / (se1 ** 2 / (n1 - 1) + se2 ** 2 / (n2 - 1))
+
+    # Same rule as the single-column endpoint: Student if Levene does not reject equal variances
+    equal_var = levene_p > 0.05
+    t_stat = np.where(equal_var, t_student, t_welch)
+    t_df = np.where(equal_var, df_student, df_welch)
+    t_p = 2 * stats.t.sf(np.abs(t_stat), t_df)
+    normality_p1, normality_test1 = column_normality_p(values1, normality_method)
+    normality_p2, normality_test2 = column_normality_p(values2, normality_method)
+
+    return {
+        "n1": n1, "mean1": mean1, "sd1": sd1,
+        "n2": n2, "mean2": mean2, "sd2": sd2,
+        "normality_p1": normality_p1, "normality_test1": normality_test1,
+        "normality_p2": normality_p2, "normality_test2": normality_test2,
+        "levene_stat": levene_stat, "levene_p": levene_p,
+        "t_test": np.where(equal_var, 'Student', 'Welch'),
+        "t_stat": t_stat, "t_df": t_df, "p_value": t_p,
+    }
+
+
+def batch_correlation(x, values, normality_method='auto'):
+    """Pearson r of x against every column, using the pairwise-complete rows of each column."""
+    present = ~np.isnan(values) & ~np.isnan(x)[:, None]
+    n = present.sum(axis=0)
+    xs = np.where(present, x[:, None], 0.0)
+    ys = np.where(present, values, 0.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_dev = np.where(present, xs - xs.sum(axis=0) / n, 0.0)
+        y_dev = np.where(present, ys - ys.sum(axis=0) / n, 0.0)
+        r = (x_dev * y_dev).sum(axis=0) / np.sqrt((x_dev ** 2).sum(axis=0) * (y_dev ** 2).sum(axis=0))
+        r = np.clip(r, -1.0, 1.0)
+        t_stat = r * np.sqrt((n - 2) / (1 - r ** 2))
+    p = 2 * stats.t.sf(np.abs(t_stat), n - 2)
+    p = np.where(np.abs(r) == 1.0, 0.0, p)
+
+    x_present = x[~np.isnan(x)]
+    x_test, x_normality_p = None, np.nan
+    if len(x_present) >= 3: x_test, _, x_normality_p = normality_test(x_present, normality_method)
+    normality_p, normality_tests = column_normality_p(values, normality_method)
+    return {
+        "n": n, "r": r, "t_stat": t_stat, "p_value": p,
+        "normality_p_x": np.full(values.shape[1], x_normality_p), "normality_test_x": np.full(values.shape[1], x_test, dtype=object),
+        "normality_p": normality_p, "normality_test": normality_tests,
+    }
+
+
+def to_records(columns, results, correction):
+    """Adds adjusted p-values and turns the column arrays into one JSON-ready dict per column."""
+    results["p_adjusted"] = adjust_p_values(results["p_value"], correction)
+    results["significant"] = results["p_adjusted"] < 0.05
+    records = []
+    for i, column in enumerate(columns):
+        record = {"column": column}
+        for key, array in results.items():
+            value = array[i].item() if hasattr(array[i], 'item') else array[i]
+            if isinstance(value, float) and not np.isfinite(value): value = None  # JSON has no NaN/inf
+            record[key] = value
+        records.append(record)
+    return records
@@ -0,0 +1,34 @@
+import math
+import os
+
+# --- Production Serving (gunicorn) ---
+# Run from the api/ directory:  gunicorn -c gunicorn.conf.py app:app
+#
+# Concurrency model: GUNICORN_WORKERS processes (default: one per core), each
+# with GUNICORN_THREADS request threads. The master imports the app and the
+# NumPy/pandas/SciPy stack once (preload_app) and forks; every worker then starts
+# its own plot job threads and warm R workers. What must agree across processes
+# lives in APP_STATE_DIR: the plot index, the plot job records and the render
+# locks in SQLite / lock files, and R_MAX_CONCURRENT slot files that cap the
+# number of R jobs running on this host at once, however many workers there are.
+# Each worker keeps enough warm R processes for its share of those slots.
+
+cpu_count = os.cpu_count() or 1
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', str(cpu_count)))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '180'))  # Longer than R_JOB_TIMEOUT
+preload_app = True
+
+# Defaults for the app's own settings (read when the master imports app.py); the environment wins
+os.environ.setdefault('APP_SHARED_STATE', 'sqlite')
+os.environ.setdefault('APP_WARM_UP', 'preload')
+os.environ.setdefault('R_MAX_CONCURRENT', str(cpu_count))
+os.environ.setdefault('R_POOL_SIZE', str(max(1, math.ceil(int(os.environ['R_MAX_CONCURRENT']) / workers))))
+os.environ.setdefault('RESAMPLE_WORKERS', '1')  # the worker processes already use every core
+
+
+def post_fork(server, worker):
+    import app  # already imported by the master
+    app.start_worker()
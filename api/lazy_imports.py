@@ -0,0 +1,75 @@
+import importlib
+import importlib.util
+import sys
+import threading
+import time
+import types
+
+# --- Lazy Heavy Imports ---
+# NumPy, pandas, SciPy and pyarrow take most of the app's import time. Modules
+# bind them with lazy_import() instead of "import ...", so a worker process can
+# start and answer health checks before they are loaded; the real import happens
+# on first attribute access, or up front in warm_up(). The proxy also records
+# how long each real import took, for /ready.
+
+_registered = []  # module names, in the order they were first requested
+_import_seconds = {}  # module name -> seconds the real import took
+_lock = threading.Lock()
+
+
+class LazyModule(types.ModuleType):
+    """Stands in for a module until one of its attributes is first used.
+
+    Unlike importlib.util.LazyLoader, which can hand a half-initialised module to
+    a second thread touching it at the same time, the real import goes through
+    importlib.import_module, whose per-module lock makes concurrent first use
+    safe."""
+
+    def __getattr__(self, attr):
+        module = _load(self.__name__)
+        self.__dict__.update(module.__dict__)  # later lookups no longer reach __getattr__
+        return getattr(module, attr)
+
+    def __dir__(self):
+        return dir(_load(self.__name__))
+
+    def __repr__(self):
+        state = 'loaded' if self.__name__ in _import_seconds else 'not loaded'
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def _load(name):
+    if name in _import_seconds: return sys.modules[name]
+    start = time.perf_counter()
+    module = importlib.import_module(name)  # blocks while another thread is importing it
+    with _lock: _import_seconds.setdefault(name, time.perf_counter() - start)
+    return module
+
+
+def lazy_import(name):
+    """Returns a proxy for module name that imports it on first attribute access."""
+    with _lock:
+        if name not in _registered: _registered.append(name)
+    return LazyModule(name)
+
+
+def optional_lazy_import(name):
+    """lazy_import() for an optional dependency: None if its top-level package is not installed."""
+    if importlib.util.find_spec(name.split('.')[0]) is None: return None
+    return lazy_import(name)
+
+
+def warm_up_modules():
+    """Imports every lazily bound module now; returns {module name: import seconds}."""
+    for name in list(_registered): _load(name)
+    return import_seconds()
+
+
+def import_seconds():
+    """{module name: seconds its real import took} for the modules loaded so far."""
+    with _lock: return dict(_import_seconds)
+
+
+def pending_modules():
+    """Lazily bound modules that have not been imported yet."""
+    with _lock: return [name for name in _registered if name not in _import_seconds]
@@ -0,0 +1,204 @@
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# --- Metrics & Stage Timing ---
+# A small in-process metrics registry (counters, gauges, histograms) rendered in
+# the Prometheus text exposition format, plus per-stage timers. Every timed stage
+# is observed into a histogram and, when a request trace is active on the
+# current thread, appended to that trace (reported as a Server-Timing header).
+# The R scripts report their own stages as "@@TIMING <stage> <seconds>" lines on
+# stderr, which parse_r_timings() extracts from the script output.
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+R_TIMING_PATTERN = re.compile(r'^@@TIMING\s+(\S+)\s+([0-9.eE+-]+)\s*$', re.MULTILINE)
+R_TIMING_LINE = re.compile(r'^@@TIMING[^\n]*(\n|$)', re.MULTILINE)
+
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(label_names, label_values, extra=()):
+    pairs = list(zip(label_names, label_values)) + list(extra)
+    if not pairs: return ''
+    return '{' + ','.join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}  # label values tuple -> value
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock: self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock: self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, observations = self._values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound: counts[i] += 1
+            self._values[key] = (counts, total + value, observations + 1)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for label_values, (counts, total, observations) in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, counts):  # buckets are cumulative
+                    labels = _format_labels(self.label_names, label_values, [('le', _format_value(bound))])
+                    lines.append(f"{self.name}_bucket{labels} {count}")
+                labels = _format_labels(self.label_names, label_values, [('le', '+Inf')])
+                lines.append(f"{self.name}_bucket{labels} {observations}")
+                labels = _format_labels(self.label_names, label_values)
+                lines.append(f"{self.name}_sum{labels} {repr(float(total))}")
+                lines.append(f"{self.name}_count{labels} {observations}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, label_names=()):
+        return self._add(Counter(name, help_text, label_names))
+
+    def gauge(self, name, help_text, label_names=()):
+        return self._add(Gauge(name, help_text, label_names))
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help_text, label_names, buckets))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        return '\n'.join(line for metric in self._metrics for line in metric.render()) + '\n'
+
+
+# --- Request Traces ---
+class Trace:
+    """Stage durations of one request, in the order they finished."""
+
+    def __init__(self):
+        self.stages = []  # (stage, seconds)
+        self._lock = threading.Lock()  # stages may also be added from a plot job thread
+
+    def add(self, stage, seconds):
+        with self._lock: self.stages.append((stage, seconds))
+
+    def server_timing(self):
+        """Server-Timing header value (durations in milliseconds)."""
+        with self._lock:
+            return ', '.join(f"{re.sub(r'[^A-Za-z0-9_-]', '_', stage)};dur={seconds * 1000:.2f}"
+                             for stage, seconds in self.stages)
+
+
+_local = threading.local()
+
+
+def current_trace():
+    return getattr(_local, 'trace', None)
+
+
+def set_current_trace(trace):
+    _local.trace = trace
+
+
+@contextmanager
+def trace_scope(trace):
+    """Makes trace the current thread's trace (e.g. in a plot job rendering for a waiting request)."""
+    previous = current_trace()
+    set_current_trace(trace)
+    try:
+        yield trace
+    finally:
+        set_current_trace(previous)
+
+
+class StageTiming:
+    """Yielded by StageTimer.stage(); holds the duration once the stage has ended."""
+    seconds = None
+
+
+class StageTimer:
+    def __init__(self, registry):
+        self.stage_seconds = registry.histogram('plot_api_stage_seconds', "Time spent per processing stage.",
+                                                ('stage',))
+        self.stage_errors = registry.counter('plot_api_stage_errors_total',
+                                             "Stages that ended with an exception (including validation aborts).",
+                                             ('stage',))
+
+    @contextmanager
+    def stage(self, name):
+        timing = StageTiming()
+        start = time.perf_counter()
+        try:
+            yield timing
+        except Exception:
+            self.stage_errors.inc(stage=name)
+            raise
+        finally:
+            timing.seconds = time.perf_counter() - start
+            self.record(name, timing.seconds)
+
+    def record(self, name, seconds):
+        self.stage_seconds.observe(seconds, stage=name)
+        trace = current_trace()
+        if trace is not None: trace.add(name, seconds)
+
+
+def parse_r_timings(output):
+    """Splits R script output into ([(stage, seconds)], the output without the "@@TIMING" lines)."""
+    timings = []
+    for stage, seconds in R_TIMING_PATTERN.findall(output or ''):
+        try:
+            timings.append((stage, float(seconds)))
+        except ValueError:
+            continue
+    return timings, R_TIMING_LINE.sub('', output or '')
@@ -0,0 +1,161 @@
+from batch_stats import adjust_p_values
+from lazy_imports import lazy_import
+from normality import normality_test
+
+np = lazy_import('numpy')
+stats = lazy_import('scipy.stats')
+
+# --- Multi-Group Comparison ---
+# k-group analysis on integer group codes (factorized once by the caller). Per-group
+# counts, means and variances come from np.bincount over the whole sample, and the
+# values are sorted by (group, value) once so every group is a contiguous slice
+# (medians, normality tests). The omnibus tests (one-way ANOVA, Welch ANOVA,
+# Kruskal-Wallis) and the all-pairs post-hoc tests are then array operations over
+# the k groups and the k(k-1)/2 pairs, with no per-group DataFrame filtering.
+
+MULTI_GROUP_METHODS = ('auto', 'anova', 'welch', 'kruskal')
+METHOD_LABELS = {'anova': '单因素方差分析 (ANOVA)', 'welch': 'Welch 方差分析', 'kruskal': 'Kruskal-Wallis 检验'}
+POSTHOC_LABELS = {'anova': '两两 t 检验，合并方差', 'welch': '两两 Welch t 检验', 'kruskal': "Dunn 检验"}
+
+
+def group_moments(codes, values, k):
+    """Per-group (n, mean, sample variance) in two bincount passes."""
+    n = np.bincount(codes, minlength=k).astype(float)
+    mean = np.bincount(codes, weights=values, minlength=k) / n
+    with np.errstate(divide='ignore', invalid='ignore'):
+        var = np.bincount(codes, weights=(values - mean[codes]) ** 2, minlength=k) / (n - 1)
+    return n, mean, var
+
+
+def sorted_groups(codes, values, k):
+    """The values sorted by (group, value) and the start offset of each group (k + 1 offsets)."""
+    order = np.lexsort((values, codes))
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=k))])
+    return values[order], offsets
+
+
+def group_medians(sorted_values, offsets):
+    lo, hi = offsets[:-1], offsets[1:] - 1
+    return (sorted_values[lo + (hi - lo) // 2] + sorted_values[hi - (hi - lo) // 2]) / 2
+
+
+def one_way_anova(n, mean, var):
+    """(F, df_between, df_within, p, mean square within) from group moments."""
+    k, total = len(n), n.sum()
+    grand_mean = (n * mean).sum() / total
+    ms_between = (n * (mean - grand_mean) ** 2).sum() / (k - 1)
+    ms_within = ((n - 1) * var).sum() / (total - k)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        f = ms_between / ms_within
+    return f, k - 1, total - k, stats.f.sf(f, k - 1, total - k), ms_within
+
+
+def welch_anova(n, mean, var):
+    """(F, df1, df2, p) of Welch's heteroscedastic one-way ANOVA; needs every group variance > 0."""
+    k = len(n)
+    w = n / var
+    weighted_mean = (w * mean).sum() / w.sum()
+    a = (w * (mean - weighted_mean) ** 2).sum() / (k - 1)
+    tmp = ((1 - w / w.sum()) ** 2 / (n - 1)).sum()
+    f = a / (1 + 2 * (k - 2) * tmp / (k ** 2 - 1))
+    df2 = (k ** 2 - 1) / (3 * tmp)
+    return f, k - 1, df2, stats.f.sf(f, k - 1, df2)
+
+
+def kruskal_wallis(codes, values, n):
+    """(H, df, p, mean rank per group, tie term sum(t^3 - t)); H is tie-corrected."""
+    k, total = len(n), len(values)
+    ranks = stats.rankdata(values)
+    mean_rank = np.bincount(codes, weights=ranks, minlength=k) / n
+    _, tie_counts = np.unique(values, return_counts=True)
+    tie_term = float((tie_counts ** 3 - tie_counts).sum())
+    h = 12 / (total * (total + 1)) * (n * mean_rank ** 2).sum() - 3 * (total + 1)
+    correction = 1 - tie_term / (total ** 3 - total)
+    h = h / correction if correction > 0 else np.nan
+    return h, k - 1, stats.chi2.sf(h, k - 1), mean_rank, tie_term
+
+
+def pairwise_tests(method, n, mean, var, ms_within=None, mean_rank=None, tie_term=0.0):
+    """All k(k-1)/2 pairs at once: (i, j, difference, statistic, df or None, two-sided p).
+
+    The difference is in means, or in mean ranks for 'kruskal'."""
+    i, j = np.triu_indices(len(n), 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if method == 'kruskal':
+            # Dunn: difference in mean ranks, with the tie-corrected rank variance
+            total = n.sum()
+            rank_var = total * (total + 1) / 12 - tie_term / (12 * (total - 1))
+            diff = mean_rank[i] - mean_rank[j]
+            z = diff / np.sqrt(rank_var * (1 / n[i] + 1 / n[j]))
+            return i, j, diff, z, None, 2 * stats.norm.sf(np.abs(z))
+        diff = mean[i] - mean[j]
+        if method == 'anova':
+            df = np.full(len(i), n.sum() - len(n))
+            t = diff / np.sqrt(ms_within * (1 / n[i] + 1 / n[j]))
+        else:
+            se1, se2 = var[i] / n[i], var[j] / n[j]
+            df = (se1 + se2) ** 2 / (se1 ** 2 / (n[i] - 1) + se2 ** 2 / (n[j] - 1))
+            t = diff / np.sqrt(se1 + se2)
+        return i, j, diff, t, df, 2 * stats.t.sf(np.abs(t), df)
+
+
+def _finite(value):
+    value = float(value)
+    return value if np.isfinite(value) else None  # JSON has no NaN/inf
+
+
+def multi_group_analysis(codes, values, group_names, method='auto', correction='holm', normality_method='auto'):
+    """Descriptives, normality and Levene per group, the omnibus test and corrected post-hoc pairs.
+
+    method 'auto' picks ANOVA when every group looks normal and the variances are
+    homogeneous, Welch ANOVA when they are normal but not homogeneous, and
+    Kruskal-Wallis otherwise (including when a group has no variance)."""
+    codes, values = np.asarray(codes), np.asarray(values, dtype=float)
+    k = len(group_names)
+    if k < 2: raise ValueError("至少需要 2 个分组")
+    n, mean, var = group_moments(codes, values, k)
+    if n.min() < 2: raise ValueError("每组至少需要 2 个数据点")
+    sorted_values, offsets = sorted_groups(codes, values, k)
+    medians = group_medians(sorted_values, offsets)
+
+    normality = [normality_test(sorted_values[offsets[g]:offsets[g + 1]], normality_method) if n[g] >= 3
+                 else (None, np.nan, np.nan) for g in range(k)]
+    all_normal = all(p > 0.05 for _, _, p in normality)  # NaN (n < 3) counts as not normal
+
+    # Levene (median-centred, as scipy's default): one-way ANOVA on absolute deviations from the group median
+    deviations = np.abs(values - medians[codes])
+    levene_f, _, _, levene_p, _ = one_way_anova(*group_moments(codes, deviations, k))
+    equal_var = bool(levene_p > 0.05)
+
+    if method == 'auto':
+        method = 'kruskal' if not all_normal or not (var > 0).all() else 'anova' if equal_var else 'welch'
+    if method == 'welch' and not (var > 0).all(): raise ValueError("Welch 方差分析要求每组方差大于 0")
+
+    mean_rank, tie_term, ms_within = None, 0.0, None
+    if method == 'anova':
+        statistic, df1, df2, p, ms_within = one_way_anova(n, mean, var)
+    elif method == 'welch':
+        statistic, df1, df2, p = welch_anova(n, mean, var)
+    elif method == 'kruskal':
+        statistic, df1, p, mean_rank, tie_term = kruskal_wallis(codes, values, n)
+        df2 = None
+    else:
+        raise ValueError(f"Unknown method '{method}'. Valid: {', '.join(MULTI_GROUP_METHODS)}")
+
+    i, j, diff, pair_stat, pair_df, pair_p = pairwise_tests(method, n, mean, var, ms_within, mean_rank, tie_term)
+    p_adjusted = adjust_p_values(pair_p, correction)
+    sd = np.sqrt(var)
+    return {
+        "method": method,
+        "correction": correction,
+        "omnibus": {"statistic": _finite(statistic), "df1": _finite(df1), "df2": _finite(df2) if df2 is not None else None,
+                    "p_value": _finite(p)},
+        "levene": {"statistic": _finite(levene_f), "p_value": _finite(levene_p), "equal_var": equal_var},
+        "groups": [{"group": group_names[g], "n": int(n[g]), "mean": _finite(mean[g]), "sd": _finite(sd[g]),
+                    "median": _finite(medians[g]), "normality_test": normality[g][0],
+                    "normality_p": _finite(normality[g][2])} for g in range(k)],
+        "posthoc": [{"group1": group_names[a], "group2": group_names[b], "difference": _finite(diff[m]),
+                     "statistic": _finite(pair_stat[m]), "df": _finite(pair_df[m]) if pair_df is not None else None,
+                     "p_value": _finite(pair_p[m]), "p_adjusted": _finite(p_adjusted[m]),
+                     "significant": bool(p_adjusted[m] < 0.05)} for m, (a, b) in enumerate(zip(i, j))],
+    }
@@ -0,0 +1,98 @@
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+special = lazy_import('scipy.special')
+stats = lazy_import('scipy.stats')
+
+# --- Normality Test Strategies ---
+# Shapiro-Wilk is accurate and cheap for small samples, but scipy only guarantees
+# its p-value up to n = 5000 and its cost grows quickly beyond that. The 'auto'
+# strategy keeps Shapiro-Wilk up to SHAPIRO_MAX_N and switches to the
+# D'Agostino-Pearson omnibus test above it. The other strategies can be
+# requested explicitly; tests that need more data than a sample has fall back to
+# Shapiro-Wilk, and resolve_normality_test() reports what was actually used.
+
+NORMALITY_TESTS = ('auto', 'shapiro', 'dagostino', 'anderson', 'shapiro_subsample')
+NORMALITY_TEST_LABELS = {
+    'shapiro': 'Shapiro-Wilk',
+    'dagostino': "D'Agostino-Pearson",
+    'anderson': 'Anderson-Darling',
+    'shapiro_subsample': 'Shapiro-Wilk 子样本',
+}
+SHAPIRO_MAX_N = 5000
+SUBSAMPLE_SEED = 20240611  # fixed, so the same data always gives the same subsample p-value
+MIN_N = {'dagostino': 20, 'anderson': 8}  # below this the test's approximation is unreliable
+
+
+def resolve_normality_test(method, n):
+    """The concrete test a strategy uses for a sample of size n."""
+    if method not in NORMALITY_TESTS:
+        raise ValueError(f"Unknown normality test '{method}'. Valid: {', '.join(NORMALITY_TESTS)}")
+    if method == 'auto': method = 'shapiro' if n <= SHAPIRO_MAX_N else 'dagostino'
+    if method == 'shapiro_subsample' and n <= SHAPIRO_MAX_N: return 'shapiro'  # nothing to subsample
+    if n < MIN_N.get(method, 0): return 'shapiro'
+    return method
+
+
+def deterministic_subsample(data, size=SHAPIRO_MAX_N):
+    """A seeded subsample of `size` values, kept in the original order."""
+    rng = np.random.default_rng(SUBSAMPLE_SEED)
+    return data[np.sort(rng.choice(len(data), size=size, replace=False))]
+
+
+def anderson_darling_p(data):
+    """Anderson-Darling test for normality with estimated mean and SD.
+
+    scipy.stats.anderson only reports critical values, so the p-value comes from
+    the D'Agostino & Stephens (1986) approximation for the small-sample adjusted A².
+    """
+    n = len(data)
+    z = np.sort((data - data.mean()) / data.std(ddof=1))
+    i = np.arange(1, n + 1)
+    log_cdf = special.log_ndtr(z)
+    log_sf = special.log_ndtr(-z[::-1])
+    a2 = -n - np.sum((2 * i - 1) * (log_cdf + log_sf)) / n
+    a2 *= 1 + 0.75 / n + 2.25 / n ** 2
+    return a2, anderson_darling_pvalue(a2)
+
+
+def anderson_darling_pvalue(a2):
+    """D'Agostino & Stephens (1986) piecewise p-value for the adjusted statistic A*²."""
+    if a2 >= 0.6: p = np.exp(1.2937 - 5.709 * a2 + 0.0186 * a2 ** 2)
+    elif a2 >= 0.34: p = np.exp(0.9177 - 4.279 * a2 - 1.38 * a2 ** 2)
+    elif a2 >= 0.2: p = 1 - np.exp(-8.318 + 42.796 * a2 - 59.938 * a2 ** 2)
+    else: p = 1 - np.exp(-13.436 + 101.14 * a2 - 223.73 * a2 ** 2)
+    return float(min(max(p, 0.0), 1.0))
+
+
+def normality_test(data, method='auto'):
+    """Returns (test used, statistic, p-value) for a 1-D sample."""
+    data = np.asarray(data, dtype=float)
+    test = resolve_normality_test(method, len(data))
+    if test == 'shapiro':
+        statistic, p = stats.shapiro(data)
+    elif test == 'shapiro_subsample':
+        statistic, p = stats.shapiro(deterministic_subsample(data))
+    elif test == 'dagostino':
+        statistic, p = stats.normaltest(data)
+    else:
+        statistic, p = anderson_darling_p(data)
+    return test, float(statistic), float(p)
+
+
+def column_normality_p(values, method='auto'):
+    """Per-column (p-values, tests used) of a (samples x columns) matrix, NaN excluded per column.
+
+    Columns with fewer than 3 values get p = NaN and test None.
+    """
+    n = (~np.isnan(values)).sum(axis=0)
+    p = np.full(values.shape[1], np.nan)
+    tests = np.array([resolve_normality_test(method, k) if k >= 3 else None for k in n], dtype=object)
+    # The vectorized scipy tests handle all columns that share a test in one call
+    for test, fn in (('shapiro', stats.shapiro), ('dagostino', stats.normaltest)):
+        selected = tests == test
+        if selected.any(): p[selected] = fn(values[:, selected], axis=0, nan_policy='omit').pvalue
+    for j in np.flatnonzero((tests == 'anderson') | (tests == 'shapiro_subsample')):
+        column = values[:, j]
+        p[j] = normality_test(column[~np.isnan(column)], tests[j])[2]
+    return p, tests
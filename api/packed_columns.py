@@ -0,0 +1,37 @@
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# --- Packed Column Transport ---
+# Serializes a DataFrame into the typed binary column format read by
+# packed_input.R, so plot data reaches R over a pipe with no temporary CSV and
+# no text parsing of the numeric columns.
+
+R_NA_INTEGER = -2**31  # R's NA_integer_ (the int32 minimum)
+
+
+def pack_columns(df):
+    n_rows, n_cols = df.shape
+    parts = [f"PACKED {n_rows} {n_cols}\n".encode('utf-8')]
+    for name in df.columns:
+        name = str(name)
+        if '\t' in name or '\n' in name: raise ValueError(f"Column name {name!r} cannot be packed")
+        col = df[name]
+        if pd.api.types.is_bool_dtype(col) or pd.api.types.is_integer_dtype(col):
+            values = col.to_numpy(dtype=np.int64)
+            if len(values) and (values.min() <= R_NA_INTEGER or values.max() > np.iinfo(np.int32).max):
+                # Outside R's integer range: send as double instead
+                parts += [f"{name}\tdouble\n".encode('utf-8'), values.astype('<f8').tobytes()]
+            else:
+                parts += [f"{name}\tinteger\n".encode('utf-8'), values.astype('<i4').tobytes()]
+        elif pd.api.types.is_numeric_dtype(col):
+            parts += [f"{name}\tdouble\n".encode('utf-8'), col.to_numpy(dtype='<f8').tobytes()]
+        else:
+            codes, levels = pd.factorize(col)  # missing values get code -1
+            levels = [str(level).replace('\r', ' ').replace('\n', ' ') for level in levels]
+            codes = np.where(codes < 0, R_NA_INTEGER, codes + 1).astype('<i4')
+            parts.append(f"{name}\tcharacter\n{len(levels)}\n".encode('utf-8'))
+            if levels: parts.append(('\n'.join(levels) + '\n').encode('utf-8'))
+            parts.append(codes.tobytes())
+    return b''.join(parts)
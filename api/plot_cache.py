@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import Future
+from contextlib import nullcontext
+
+from lazy_imports import lazy_import
+from plot_storage import STORED, TMP_PREFIX
+from shared_state import file_lock
+
+pd = lazy_import('pandas')
+
+# --- Content-Addressed Plot Cache ---
+# Rendered PDFs are named after a hash of everything that determines their
+# content, so an identical request can reuse the existing file instead of
+# running R again. How long files stay around is decided by PlotStorage.
+# Concurrent identical requests share one render: within a process through a
+# Future, across worker processes through a per-plot lock file in lock_dir.
+
+_script_versions = {}  # script path -> (mtime, content hash)
+
+
+def script_version(script_path):
+    """Content hash of an R script, so editing a script invalidates its cached plots."""
+    try:
+        mtime = os.path.getmtime(script_path)
+    except OSError:
+        return 'missing'
+    cached = _script_versions.get(script_path)
+    if cached is None or cached[0] != mtime:
+        with open(script_path, 'rb') as f:
+            cached = (mtime, hashlib.sha256(f.read()).hexdigest())
+        _script_versions[script_path] = cached
+    return cached[1]
+
+
+def plot_cache_key(plot_type, df, options, script_path):
+    """Canonical hash of (plot type, normalized data, plot options, R script version)."""
+    h = hashlib.sha256()
+    h.update(json.dumps({
+        "plot_type": plot_type,
+        "options": options,
+        "script": script_version(script_path),
+        "columns": [str(c) for c in df.columns],
+        "dtypes": [str(t) for t in df.dtypes],
+    }, sort_keys=True).encode('utf-8'))
+    h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return h.hexdigest()[:32]
+
+
+class PlotCache:
+    def __init__(self, storage, lock_dir=None):
+        self.storage = storage
+        self.lock_dir = lock_dir  # set in multi-process deployments (needs a shared storage index)
+        self.hits = 0
+        self.misses = 0
+        self._in_flight = {}  # filename -> Future shared by concurrent identical requests
+        self._lock = threading.Lock()
+
+    def get_or_render(self, filename, render):
+        """Returns (filename, cache_hit). On a miss, calls render(output_path) exactly once
+        even if several identical requests arrive together; they all share its outcome."""
+        with self._lock:
+            if self.storage.lookup(filename) == STORED:
+                self.hits += 1
+                return filename, True
+            future = self._in_flight.get(filename)
+            leader = future is None
+            if leader:
+                future = self._in_flight[filename] = Future()
+            else:
+                self.hits += 1
+        if not leader:
+            future.result()  # re-raises the leader's error
+            return filename, True
+
+        try:
+            with self._render_lock(filename):
+                if self.lock_dir and self.storage.lookup(filename) == STORED:  # rendered by another process meanwhile
+                    with self._lock: self.hits += 1
+                    future.set_result(filename)
+                    return filename, True
+                with self._lock: self.misses += 1
+                self._render(filename, render)
+            future.set_result(filename)
+            return filename, False
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(filename, None)
+
+    def _render_lock(self, filename):
+        if not self.lock_dir: return nullcontext()
+        return file_lock(os.path.join(self.lock_dir, f"{filename}.lock"))
+
+    def _render(self, filename, render):
+        # Render under a temporary name so a half-written PDF is never served or indexed
+        output_path = os.path.join(self.storage.directory, filename)
+        tmp_path = os.path.join(self.storage.directory,
+                                f"{TMP_PREFIX}{os.getpid()}_{threading.get_ident()}_{filename}")
+        try:
+            render(tmp_path)
+            os.replace(tmp_path, output_path)
+        finally:
+            if os.path.exists(tmp_path): os.remove(tmp_path)
+        self.storage.add(filename)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "in_flight": len(self._in_flight)}
@@ -0,0 +1,172 @@
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+
+# --- Asynchronous Plot Jobs ---
+# Plot requests submitted in async mode are queued here and rendered by a small,
+# fixed number of worker threads, so slow R renders no longer hold Flask request
+# threads. The queue is bounded: when it is full, submit() raises QueueFullError
+# and the route answers 429. Clients poll the job status until it is done.
+# With a JobStore, every job's record is also written to the shared SQLite
+# database, so a status poll answered by another worker process still finds it;
+# the job itself always runs in the process that accepted it.
+
+
+class QueueFullError(Exception):
+    """Raised when the plot job queue has no room for another job."""
+
+
+def job_snapshot(job, queue_position=None):
+    """The job as reported by the status endpoint."""
+    snapshot = {k: v for k, v in job.items() if k not in ('submitted', 'started', 'finished', 'result')}
+    now = time.time()
+    if job["status"] == "queued":
+        snapshot["queue_position"] = queue_position
+        snapshot["waited_seconds"] = round(now - job["submitted"], 2)
+    elif job["status"] == "running":
+        snapshot["elapsed_seconds"] = round(now - job["started"], 2)
+    else:
+        snapshot["elapsed_seconds"] = round(job["finished"] - (job["started"] or job["submitted"]), 2)
+    if job["result"]: snapshot.update(job["result"])
+    return snapshot
+
+
+class JobStore:
+    """Job records in the shared state database (shared_state.StateDatabase), visible to every worker process."""
+
+    def __init__(self, db):
+        self.db = db
+
+    def save(self, job):
+        with self.db.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO plot_jobs (job_id, owner_pid, status, submitted, finished, job) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", (job["job_id"], os.getpid(), job["status"], job["submitted"],
+                                                       job["finished"], json.dumps(job)))
+
+    def load(self, job_id):
+        """Returns (job dict, queue position) or (None, None)."""
+        conn = self.db.connect()
+        row = conn.execute("SELECT owner_pid, job FROM plot_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None: return None, None
+        owner_pid, job = row[0], json.loads(row[1])
+        if job["status"] in ("queued", "running") and not _process_alive(owner_pid):
+            job.update(status="failed", error="处理该绘图任务的进程已退出，请重新提交。", finished=time.time())
+            self.save(job)
+            return job, None
+        queue_position = None
+        if job["status"] == "queued":  # jobs wait in the queue of the process that accepted them
+            queue_position = conn.execute("SELECT COUNT(*) FROM plot_jobs WHERE status = 'queued' AND owner_pid = ? "
+                                          "AND submitted <= ?", (owner_pid, job["submitted"])).fetchone()[0]
+        return job, queue_position
+
+    def counts(self):
+        return dict(self.db.connect().execute("SELECT status, COUNT(*) FROM plot_jobs GROUP BY status").fetchall())
+
+    def prune(self, cutoff):
+        with self.db.transaction() as conn:
+            conn.execute("DELETE FROM plot_jobs WHERE finished IS NOT NULL AND finished < ?", (cutoff,))
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # exists, owned by another user
+    return True
+
+
+class PlotJobQueue:
+    def __init__(self, workers, max_queued, result_ttl=3600, store=None):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl  # seconds a finished job's result stays available
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._jobs = {}  # job_id -> job dict
+        self._order = []  # ids of queued jobs, oldest first (for queue positions)
+        self._lock = threading.Lock()
+        self._finished = threading.Condition(self._lock)  # notified whenever a job finishes
+        self._threads = []
+        self.store = store
+
+    def start(self):
+        with self._lock:
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._run, name=f'plot-job-worker-{len(self._threads)}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, kind, fn):
+        """Queues fn (which returns the job's result dict) and returns the new job id."""
+        self.start()
+        self._prune()
+        job_id = uuid.uuid4().hex
+        job = {"job_id": job_id, "kind": kind, "status": "queued", "submitted": time.time(),
+               "started": None, "finished": None, "result": None, "error": None}
+        with self._lock:
+            try:
+                self._queue.put_nowait((job_id, fn))
+            except queue.Full:
+                raise QueueFullError(f"plot job queue is full ({self.max_queued} jobs)")
+            self._jobs[job_id] = job
+            self._order.append(job_id)
+        if self.store: self.store.save(job)
+        return job_id
+
+    def get(self, job_id):
+        """Returns a snapshot of the job for the status endpoint, or None if unknown/expired."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return job_snapshot(job, self._order.index(job_id) + 1 if job["status"] == "queued" else None)
+        if self.store is None: return None
+        job, queue_position = self.store.load(job_id)  # accepted by another worker process
+        return job_snapshot(job, queue_position) if job else None
+
+    def wait(self, job_id, timeout=None):
+        """Blocks until the job is done or failed (or timeout seconds pass) and returns get(job_id)."""
+        with self._finished:
+            self._finished.wait_for(lambda: self._jobs.get(job_id, {}).get("finished") is not None, timeout)
+        return self.get(job_id)
+
+    def stats(self):
+        if self.store:
+            counts = self.store.counts()  # all worker processes
+        else:
+            with self._lock:
+                statuses = [job["status"] for job in self._jobs.values()]
+            counts = {status: statuses.count(status) for status in set(statuses)}
+        return {"workers": self.workers, "max_queued": self.max_queued,
+                **{status: counts.get(status, 0) for status in ("queued", "running", "done", "failed")}}
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            for job_id in [j for j, job in self._jobs.items() if job["finished"] and job["finished"] < cutoff]:
+                del self._jobs[job_id]
+        if self.store: self.store.prune(cutoff)
+
+    def _run(self):
+        while True:
+            job_id, fn = self._queue.get()
+            with self._lock:
+                job = self._jobs[job_id]
+                self._order.remove(job_id)
+                job["status"] = "running"
+                job["started"] = time.time()
+            if self.store: self.store.save(job)
+            try:
+                result, error = fn(), None
+            except Exception as e:
+                result, error = None, str(e)
+            with self._lock:
+                job["status"] = "failed" if error else "done"
+                job["result"], job["error"] = result, error
+                job["finished"] = time.time()
+                self._finished.notify_all()
+            if self.store: self.store.save(job)
+            self._queue.task_done()
@@ -0,0 +1,236 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# --- Plot Storage Manager ---
+# Owns the lifetime of every PDF in the plot directory. Files are tracked by last
+# access time: anything not served or re-requested within the TTL is removed, and
+# the least recently accessed files are evicted whenever the total size exceeds
+# the byte quota. A background thread re-syncs with the directory and sweeps.
+# SharedPlotStorage keeps the same index in SQLite for multi-process deployments.
+
+TMP_PREFIX = '.tmp_'  # in-progress renders (see PlotCache); cleaned up if left behind
+STORED, EXPIRED, MISSING = 'stored', 'expired', 'missing'  # lookup() results
+
+
+class PlotStorage:
+    def __init__(self, directory, ttl, max_bytes, sweep_interval=60, expired_names_limit=10000, clock=time.time):
+        self.directory = directory
+        self.clock = clock  # wall-clock seconds, compared with file mtimes
+        self.ttl = ttl  # seconds since last access
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self.expired_names_limit = expired_names_limit
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+        self.last_sweep = None
+        self._files = OrderedDict()  # name -> [size, last_access]; least recently accessed first
+        self._total_bytes = 0
+        self._expired = OrderedDict()  # recently removed names, so serve_plot can answer 410 instead of 404
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.sweep()
+
+    # --- Index Maintenance (callers hold self._lock) ---
+    def _track_locked(self, name, size, last_access):
+        previous = self._files.pop(name, None)
+        if previous is not None: self._total_bytes -= previous[0]
+        self._files[name] = [size, last_access]
+        self._total_bytes += size
+        self._expired.pop(name, None)
+
+    def _remove_locked(self, name, expired=True):
+        size, _ = self._files.pop(name)
+        self._total_bytes -= size
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass
+        if expired:
+            self.evicted_files += 1
+            self.evicted_bytes += size
+            self._expired[name] = self.clock()
+            while len(self._expired) > self.expired_names_limit: self._expired.popitem(last=False)
+
+    def _enforce_limits_locked(self, keep=None):
+        now = self.clock()
+        for name in [n for n, (_, accessed) in self._files.items() if now - accessed > self.ttl and n != keep]:
+            self._remove_locked(name)
+        for name in list(self._files):
+            if self._total_bytes <= self.max_bytes: break
+            if name != keep: self._remove_locked(name)  # never evict the plot that is about to be returned
+
+    # --- Public API ---
+    def add(self, name):
+        """Registers a newly written plot file and evicts others if the quota is exceeded."""
+        size = os.path.getsize(os.path.join(self.directory, name))
+        with self._lock:
+            self._track_locked(name, size, self.clock())
+            self._enforce_limits_locked(keep=name)
+
+    def lookup(self, name):
+        """STORED (and marks the file as accessed) if the plot is still stored; EXPIRED if it was
+        removed by the TTL or quota, including right now because its TTL has passed; else MISSING."""
+        with self._lock:
+            entry = self._files.get(name)
+            if entry is None: return EXPIRED if name in self._expired else MISSING
+            if not os.path.exists(os.path.join(self.directory, name)):
+                self._remove_locked(name, expired=False)
+                return MISSING
+            if self.clock() - entry[1] > self.ttl:
+                self._remove_locked(name)
+                return EXPIRED
+            entry[1] = self.clock()
+            self._files.move_to_end(name)
+            return STORED
+
+    def _scan_directory(self, now):
+        """{name: stat} of the stored PDFs; also removes renders left behind by a crash."""
+        on_disk = {}
+        for entry in os.scandir(self.directory):
+            if not entry.is_file(): continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            if entry.name.startswith(TMP_PREFIX):
+                # Leftover from a render that crashed; live renders are far younger than a TTL
+                if now - st.st_mtime > self.ttl:
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
+                continue
+            if entry.name.endswith('.pdf'): on_disk[entry.name] = st
+        return on_disk
+
+    def sweep(self):
+        """Re-syncs the index with the directory, then applies the TTL and byte quota."""
+        now = self.clock()
+        on_disk = self._scan_directory(now)
+
+        with self._lock:
+            for name in [n for n in self._files if n not in on_disk]:
+                self._remove_locked(name, expired=False)
+            for name, st in sorted(on_disk.items(), key=lambda item: item[1].st_mtime):
+                if name not in self._files: self._track_locked(name, st.st_size, st.st_mtime)
+            self._enforce_limits_locked()
+            self.last_sweep = now
+
+    def usage(self):
+        with self._lock:
+            oldest_access = next(iter(self._files.values()))[1] if self._files else None
+            return {
+                "files": len(self._files),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "oldest_access_age_seconds": round(self.clock() - oldest_access, 1) if oldest_access else None,
+                "evicted_files": self.evicted_files,
+                "evicted_bytes": self.evicted_bytes,
+                "last_sweep": self.last_sweep,
+            }
+
+    # --- Background Sweeper ---
+    def _run(self):
+        while not self._stop.wait(self.sweep_interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Warning: plot storage sweep failed: {e}")
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='plot-storage-sweeper', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+class SharedPlotStorage(PlotStorage):
+    """PlotStorage whose index lives in the shared SQLite database (shared_state.py), so every
+    worker process sees the same files, access times, quota and expired names."""
+
+    def __init__(self, directory, ttl, max_bytes, db, sweep_interval=60, expired_names_limit=10000, clock=time.time):
+        self.db = db
+        super().__init__(directory, ttl, max_bytes, sweep_interval, expired_names_limit, clock)
+
+    # --- Index Maintenance (callers hold a write transaction on conn) ---
+    def _remove(self, conn, name, size, expired=True):
+        conn.execute("DELETE FROM plot_files WHERE name = ?", (name,))
+        try:
+            os.remove(os.path.join(self.directory, name))
+        except OSError:
+            pass
+        if expired:
+            self.db.add_counter(conn, 'evicted_files', 1)
+            self.db.add_counter(conn, 'evicted_bytes', size)
+            conn.execute("INSERT OR REPLACE INTO expired_plots (name, removed) VALUES (?, ?)", (name, self.clock()))
+            conn.execute("DELETE FROM expired_plots WHERE name NOT IN "
+                         "(SELECT name FROM expired_plots ORDER BY removed DESC LIMIT ?)", (self.expired_names_limit,))
+
+    def _enforce_limits(self, conn, keep=None):
+        stale = conn.execute("SELECT name, size FROM plot_files WHERE last_access < ? AND name != ?",
+                             (self.clock() - self.ttl, keep or '')).fetchall()
+        for name, size in stale: self._remove(conn, name, size)
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM plot_files").fetchone()[0]
+        if total <= self.max_bytes: return
+        for name, size in conn.execute("SELECT name, size FROM plot_files WHERE name != ? ORDER BY last_access",
+                                       (keep or '',)).fetchall():
+            if total <= self.max_bytes: break
+            self._remove(conn, name, size)  # never evict the plot that is about to be returned
+            total -= size
+
+    # --- Public API ---
+    def add(self, name):
+        size = os.path.getsize(os.path.join(self.directory, name))
+        with self.db.transaction() as conn:
+            conn.execute("INSERT OR REPLACE INTO plot_files (name, size, last_access) VALUES (?, ?, ?)",
+                         (name, size, self.clock()))
+            conn.execute("DELETE FROM expired_plots WHERE name = ?", (name,))
+            self._enforce_limits(conn, keep=name)
+
+    def lookup(self, name):
+        with self.db.transaction() as conn:
+            row = conn.execute("SELECT size, last_access FROM plot_files WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                expired = conn.execute("SELECT 1 FROM expired_plots WHERE name = ?", (name,)).fetchone()
+                return EXPIRED if expired else MISSING
+            if not os.path.exists(os.path.join(self.directory, name)):
+                self._remove(conn, name, row[0], expired=False)
+                return MISSING
+            if self.clock() - row[1] > self.ttl:
+                self._remove(conn, name, row[0])
+                return EXPIRED
+            conn.execute("UPDATE plot_files SET last_access = ? WHERE name = ?", (self.clock(), name))
+            return STORED
+
+    def sweep(self):
+        now = self.clock()
+        on_disk = self._scan_directory(now)
+        with self.db.transaction() as conn:
+            for name, size in conn.execute("SELECT name, size FROM plot_files").fetchall():
+                if name not in on_disk: self._remove(conn, name, size, expired=False)
+            conn.executemany("INSERT OR IGNORE INTO plot_files (name, size, last_access) VALUES (?, ?, ?)",
+                             [(name, st.st_size, st.st_mtime) for name, st in on_disk.items()])
+            self._enforce_limits(conn)
+            self.db.set_counter(conn, 'last_sweep', now)
+
+    def usage(self):
+        conn = self.db.connect()
+        files, total, oldest_access = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), MIN(last_access) FROM plot_files").fetchone()
+        counters = self.db.counters()
+        return {
+            "files": files,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "oldest_access_age_seconds": round(self.clock() - oldest_access, 1) if oldest_access else None,
+            "evicted_files": int(counters.get('evicted_files', 0)),
+            "evicted_bytes": int(counters.get('evicted_bytes', 0)),
+            "last_sweep": counters.get('last_sweep'),
+        }
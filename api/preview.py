@@ -0,0 +1,312 @@
+import math
+from xml.sax.saxutils import escape
+
+from lazy_imports import lazy_import
+from multi_group import sorted_groups
+from survival_engine import kaplan_meier, risk_table
+
+np = lazy_import('numpy')
+stats = lazy_import('scipy.stats')
+
+# --- In-Process Plot Previews ---
+# Small SVG versions of the three R plots (scatter + fit, box/violin/density,
+# Kaplan-Meier curves), drawn straight from the parsed DataFrame in tens of
+# milliseconds so the UI can show something while R renders the full PDF.
+# Everything drawn is bounded: at most PREVIEW_MAX_POINTS data points
+# (a fixed-seed subsample), PREVIEW_CURVE_POINTS vertices per fitted curve,
+# density or survival curve. Fits and KM curves are computed in Python from
+# the full data (the KM curves with the same engine as the survival stats).
+
+PREVIEW_WIDTH = 480
+PREVIEW_HEIGHT = 360
+PREVIEW_MAX_POINTS = 1500
+PREVIEW_CURVE_POINTS = 400
+SUBSAMPLE_SEED = 0
+MARGIN_LEFT, MARGIN_RIGHT, MARGIN_TOP, MARGIN_BOTTOM = 58, 16, 34, 48
+FIT_COLOR, FIT_FILL = '#b22222', '#f08080'  # firebrick / lightcoral, as in correlation_plot.R
+
+
+def group_colors(k):
+    """Evenly spaced hues starting at red, like ggplot2's default discrete palette."""
+    return [f"hsl({(15 + 360 * i / k) % 360:.0f},65%,60%)" for i in range(k)]
+
+
+def nice_ticks(lo, hi, count=5):
+    if not (math.isfinite(lo) and math.isfinite(hi)) or hi <= lo: return [lo]
+    raw_step = (hi - lo) / count
+    magnitude = 10 ** math.floor(math.log10(raw_step))
+    step = next(m * magnitude for m in (1, 2, 2.5, 5, 10) if m * magnitude >= raw_step)
+    first = math.ceil(lo / step - 1e-9) * step
+    return [first + i * step for i in range(int((hi - first) / step + 1e-9) + 1)]
+
+
+def format_tick(value):
+    return f"{value:.6g}" if abs(value) >= 1e-9 else "0"
+
+
+def padded_range(values, pad=0.05):
+    lo, hi = float(np.min(values)), float(np.max(values))
+    if hi == lo: lo, hi = lo - 0.5, hi + 0.5
+    return lo - (hi - lo) * pad, hi + (hi - lo) * pad
+
+
+def subsample_index(n, limit, seed=SUBSAMPLE_SEED):
+    if n <= limit: return np.arange(n)
+    return np.sort(np.random.default_rng(seed).choice(n, limit, replace=False))
+
+
+class SvgPlot:
+    """One panel with linear x/y scales; elements are appended as SVG strings and joined by render()."""
+
+    def __init__(self, x_range, y_range, title, x_label, y_label, subtitle=''):
+        self.x_range, self.y_range = x_range, y_range
+        self.left, self.right = MARGIN_LEFT, PREVIEW_WIDTH - MARGIN_RIGHT
+        self.top, self.bottom = MARGIN_TOP + (12 if subtitle else 0), PREVIEW_HEIGHT - MARGIN_BOTTOM
+        self.title, self.subtitle, self.x_label, self.y_label = title, subtitle, x_label, y_label
+        self.parts = []
+        self.legend_entries = []
+
+    def sx(self, x):
+        lo, hi = self.x_range
+        return self.left + (np.asarray(x, dtype=float) - lo) / (hi - lo) * (self.right - self.left)
+
+    def sy(self, y):
+        lo, hi = self.y_range
+        return self.bottom - (np.asarray(y, dtype=float) - lo) / (hi - lo) * (self.bottom - self.top)
+
+    @staticmethod
+    def _coords(px, py):
+        return ' '.join(f"{a:.1f},{b:.1f}" for a, b in zip(px, py))
+
+    def points(self, x, y, color, size=4, opacity=0.55):
+        # Zero-length segments with round caps: one path element however many points there are
+        d = ''.join(f"M{a:.1f} {b:.1f}h0" for a, b in zip(self.sx(x), self.sy(y)))
+        self.parts.append(f'<path d="{d}" stroke="{color}" stroke-width="{size}" stroke-linecap="round" '
+                          f'stroke-opacity="{opacity}" fill="none"/>')
+
+    def line(self, x, y, color, width=2, opacity=1.0):
+        self.parts.append(f'<polyline points="{self._coords(self.sx(x), self.sy(y))}" fill="none" stroke="{color}" '
+                          f'stroke-width="{width}" stroke-opacity="{opacity}"/>')
+
+    def polygon(self, x, y, fill, stroke='#333', opacity=0.7):
+        self.parts.append(f'<polygon points="{self._coords(self.sx(x), self.sy(y))}" fill="{fill}" '
+                          f'fill-opacity="{opacity}" stroke="{stroke}" stroke-width="0.8"/>')
+
+    def area(self, x, lower, upper, color, opacity=0.2):
+        """Band between two curves over the same x."""
+        self.polygon(np.concatenate([x, x[::-1]]), np.concatenate([upper, lower[::-1]]), color, 'none', opacity)
+
+    def rect(self, x0, x1, y0, y1, fill, stroke='#333', opacity=0.7):
+        px0, px1 = sorted([float(self.sx(x0)), float(self.sx(x1))])
+        py0, py1 = sorted([float(self.sy(y0)), float(self.sy(y1))])
+        self.parts.append(f'<rect x="{px0:.1f}" y="{py0:.1f}" width="{px1 - px0:.1f}" height="{py1 - py0:.1f}" '
+                          f'fill="{fill}" fill-opacity="{opacity}" stroke="{stroke}" stroke-width="1"/>')
+
+    def segment(self, x0, y0, x1, y1, color='#333', width=1):
+        self.parts.append(f'<line x1="{float(self.sx(x0)):.1f}" y1="{float(self.sy(y0)):.1f}" '
+                          f'x2="{float(self.sx(x1)):.1f}" y2="{float(self.sy(y1)):.1f}" stroke="{color}" '
+                          f'stroke-width="{width}"/>')
+
+    def legend(self, names, colors):
+        self.legend_entries = list(zip(names, colors))
+
+    def _axes(self, categories=None):
+        out = [f'<rect x="{self.left}" y="{self.top}" width="{self.right - self.left}" '
+               f'height="{self.bottom - self.top}" fill="#fafafa" stroke="#bbb"/>']
+        for tick in nice_ticks(*self.y_range):
+            y = float(self.sy(tick))
+            out.append(f'<line x1="{self.left}" x2="{self.right}" y1="{y:.1f}" y2="{y:.1f}" stroke="#e4e4e4"/>')
+            out.append(f'<text x="{self.left - 5}" y="{y + 4:.1f}" text-anchor="end">{format_tick(tick)}</text>')
+        if categories is None:
+            for tick in nice_ticks(*self.x_range):
+                x = float(self.sx(tick))
+                out.append(f'<line x1="{x:.1f}" x2="{x:.1f}" y1="{self.top}" y2="{self.bottom}" stroke="#e4e4e4"/>')
+                out.append(f'<text x="{x:.1f}" y="{self.bottom + 15}" text-anchor="middle">{format_tick(tick)}</text>')
+        else:
+            rotate = len(categories) > 6
+            for i, name in enumerate(categories):
+                x = float(self.sx(i + 1))
+                name = str(name)
+                label = escape(name if len(name) <= 14 else name[:13] + '…')
+                if rotate:
+                    out.append(f'<text transform="translate({x:.1f},{self.bottom + 10}) rotate(-40)" '
+                               f'text-anchor="end">{label}</text>')
+                else:
+                    out.append(f'<text x="{x:.1f}" y="{self.bottom + 15}" text-anchor="middle">{label}</text>')
+        mid_x, mid_y = (self.left + self.right) / 2, (self.top + self.bottom) / 2
+        out.append(f'<text x="{mid_x:.1f}" y="{PREVIEW_HEIGHT - 6}" text-anchor="middle">{escape(self.x_label)}</text>')
+        out.append(f'<text transform="translate(13,{mid_y:.1f}) rotate(-90)" text-anchor="middle">'
+                   f'{escape(self.y_label)}</text>')
+        out.append(f'<text x="{PREVIEW_WIDTH / 2:.1f}" y="17" text-anchor="middle" font-size="13" '
+                   f'font-weight="bold">{escape(self.title)}</text>')
+        if self.subtitle:
+            out.append(f'<text x="{PREVIEW_WIDTH / 2:.1f}" y="31" text-anchor="middle">{escape(self.subtitle)}</text>')
+        return out
+
+    def _legend(self):
+        out = []
+        for i, (name, color) in enumerate(self.legend_entries[:12]):
+            y = self.top + 8 + i * 14
+            out.append(f'<rect x="{self.right - 110}" y="{y - 8}" width="10" height="10" fill="{color}"/>')
+            out.append(f'<text x="{self.right - 96}" y="{y + 1}">{escape(str(name)[:16])}</text>')
+        return out
+
+    def render(self, categories=None):
+        # The data layer is a nested <svg> over the panel: it clips like a clipPath but needs no id,
+        # so several previews can sit in one page
+        panel = f'x="{self.left}" y="{self.top}" width="{self.right - self.left}" height="{self.bottom - self.top}"'
+        viewbox = f'{self.left} {self.top} {self.right - self.left} {self.bottom - self.top}'
+        return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{PREVIEW_WIDTH}" height="{PREVIEW_HEIGHT}" '
+                f'viewBox="0 0 {PREVIEW_WIDTH} {PREVIEW_HEIGHT}" font-family="sans-serif" font-size="10" '
+                f'fill="#333">' + ''.join(self._axes(categories))
+                + f'<svg {panel} viewBox="{viewbox}">' + ''.join(self.parts) + '</svg>'
+                + ''.join(self._legend()) + '</svg>')
+
+
+# --- Fits & Densities ---
+def linear_fit(x, y, grid, level=0.95):
+    """Least-squares line on grid with its confidence band for the mean (geom_smooth(method = "lm"))."""
+    n = len(x)
+    x_mean = x.mean()
+    sxx = ((x - x_mean) ** 2).sum()
+    slope = ((x - x_mean) * (y - y.mean())).sum() / sxx
+    intercept = y.mean() - slope * x_mean
+    fit = intercept + slope * grid
+    if n < 3: return fit, None, None
+    residual_sd = math.sqrt(((y - intercept - slope * x) ** 2).sum() / (n - 2))
+    half_width = stats.t.ppf((1 + level) / 2, n - 2) * residual_sd * np.sqrt(1 / n + (grid - x_mean) ** 2 / sxx)
+    return fit, fit - half_width, fit + half_width
+
+
+def local_linear_fit(x, y, grid, span=0.75):
+    """Loess-style smoother: tricube-weighted local lines over the nearest span * n points, on grid."""
+    k = max(int(math.ceil(span * len(x))), 3)
+    distance = np.abs(grid[:, None] - x[None, :])
+    radius = np.partition(distance, k - 1, axis=1)[:, k - 1:k] * 1.000001 + 1e-12
+    w = np.clip(1 - (distance / radius) ** 3, 0, None) ** 3
+    sw, swx, swy = w.sum(axis=1), w @ x, w @ y
+    swxx, swxy = w @ (x * x), w @ (x * y)
+    denominator = sw * swxx - swx ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(np.abs(denominator) > 1e-12, (sw * swxy - swx * swy) / denominator, 0.0)
+    return (swy - slope * swx) / sw + slope * grid
+
+
+def bandwidth_nrd0(values):
+    """R's default density() bandwidth (Silverman's rule of thumb)."""
+    sd = values.std(ddof=1) if len(values) > 1 else 0.0
+    iqr = np.subtract(*np.percentile(values, [75, 25])) / 1.34
+    spread = min(sd, iqr) if iqr > 0 else sd
+    return 0.9 * (spread if spread > 0 else abs(values[0]) or 1.0) * len(values) ** -0.2
+
+
+def kde(values, grid, bandwidth):
+    z = (grid[:, None] - values[None, :]) / bandwidth
+    return np.exp(-0.5 * z ** 2).sum(axis=1) / (len(values) * bandwidth * math.sqrt(2 * math.pi))
+
+
+# --- Previews per Plot Type ---
+def correlation_preview(x, y, method='lm'):
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    plot = SvgPlot(padded_range(x), padded_range(y), "Scatter Plot of X vs Y", "X", "Y",
+                   subtitle=f"Fitting Method: {method}")
+    shown = subsample_index(len(x), PREVIEW_MAX_POINTS)
+    plot.points(x[shown], y[shown], '#333')
+    if method != 'none' and len(x) >= 2 and np.ptp(x) > 0:
+        grid = np.linspace(x.min(), x.max(), 80)
+        if method in ('lm', 'glm'):  # gaussian glm gives the same line as lm
+            fit, lower, upper = linear_fit(x, y, grid)
+            if lower is not None: plot.area(grid, lower, upper, FIT_FILL, opacity=0.3)
+        else:  # loess / gam: smooth on the preview subsample
+            fit = local_linear_fit(x[shown], y[shown], grid)
+        plot.line(grid, fit, FIT_COLOR, width=2)
+    return plot.render()
+
+
+def group_preview(codes, values, group_names, plot_type='boxplot', multi_group=False):
+    """Box, violin or density preview for any number of groups (codes index group_names)."""
+    codes, values = np.asarray(codes), np.asarray(values, dtype=float)
+    k = len(group_names)
+    colors = group_colors(k)
+    sorted_values, offsets = sorted_groups(codes, values, k)
+    slices = [sorted_values[offsets[g]:offsets[g + 1]] for g in range(k)]
+    samples = [s[subsample_index(len(s), max(PREVIEW_MAX_POINTS // k, 50))] for s in slices]
+    bandwidths = [bandwidth_nrd0(s) if len(s) > 1 else 1.0 for s in samples]
+    title = f"Comparison of Value across {k} Groups" if multi_group else "Comparison of Value between Groups"
+    subtitle = f"Plot Type: {plot_type}"
+
+    if plot_type == 'density':
+        lo = min(s[0] - 3 * bw for s, bw in zip(samples, bandwidths))
+        hi = max(s[-1] + 3 * bw for s, bw in zip(samples, bandwidths))
+        grid = np.linspace(lo, hi, PREVIEW_CURVE_POINTS // 2)
+        densities = [kde(s, grid, bw) for s, bw in zip(samples, bandwidths)]
+        plot = SvgPlot((lo, hi), (0, max(float(d.max()) for d in densities) * 1.05), title, "Value", "Density",
+                       subtitle)
+        for density, color in zip(densities, colors):
+            plot.area(grid, np.zeros_like(grid), density, color, opacity=0.35)
+            plot.line(grid, density, color, width=1.5)
+        plot.legend(group_names, colors)
+        return plot.render()
+
+    y_lo, y_hi = padded_range(values)
+    if plot_type == 'violin':
+        y_lo = min(y_lo, min(s[0] - 3 * bw for s, bw in zip(samples, bandwidths)))
+        y_hi = max(y_hi, max(s[-1] + 3 * bw for s, bw in zip(samples, bandwidths)))
+    plot = SvgPlot((0.4, k + 0.6), (y_lo, y_hi), title, "Group", "Value", subtitle)
+    rng = np.random.default_rng(SUBSAMPLE_SEED)
+    for g, (values_g, sample, bw, color) in enumerate(zip(slices, samples, bandwidths, colors)):
+        center = g + 1
+        q1, median, q3 = np.percentile(values_g, [25, 50, 75])
+        if plot_type == 'violin':
+            grid = np.linspace(sample[0] - 3 * bw, sample[-1] + 3 * bw, 60)
+            density = kde(sample, grid, bw)
+            half = density / density.max() * 0.42
+            plot.polygon(np.concatenate([center - half, (center + half)[::-1]]), np.concatenate([grid, grid[::-1]]),
+                         color)
+            plot.rect(center - 0.05, center + 0.05, q1, q3, 'white', opacity=0.6)
+            plot.segment(center - 0.05, median, center + 0.05, median, width=2)
+            continue
+        iqr = q3 - q1
+        low = values_g[np.searchsorted(values_g, q1 - 1.5 * iqr)]
+        high = values_g[np.searchsorted(values_g, q3 + 1.5 * iqr, side='right') - 1]
+        plot.segment(center, low, center, q1)
+        plot.segment(center, q3, center, high)
+        plot.rect(center - 0.35, center + 0.35, q1, q3, color)
+        plot.segment(center - 0.35, median, center + 0.35, median, width=2)
+        plot.points(center + rng.uniform(-0.1, 0.1, len(sample)), sample, '#333', size=3, opacity=0.5)
+    return plot.render(categories=group_names)
+
+
+def survival_preview(time, event, codes, group_names, show_ci=True):
+    """Kaplan-Meier step curves (with log(-log) confidence bands if show_ci) for each group."""
+    time, event = np.asarray(time, dtype=float), np.asarray(event, dtype=float)
+    codes = np.asarray(codes, dtype=np.intp)
+    k = len(group_names)
+    colors = group_colors(k)
+    times, deaths, at_risk = risk_table(time, event, codes, k)
+    survival, lower, upper = kaplan_meier(times, deaths, at_risk)
+    t_max = float(time.max()) if len(time) else 1.0
+    plot = SvgPlot((0, t_max * 1.02 or 1.0), (0, 1.02), "Kaplan-Meier Survival Curve", "Time",
+                   "Survival Probability")
+    last_time = np.zeros(k)
+    np.maximum.at(last_time, codes, time)  # each curve runs to its group's last follow-up time
+    for g, color in enumerate(colors):
+        keep = times <= last_time[g]
+        step_x, curves = step_path(times[keep], [survival[g][keep], lower[g][keep], upper[g][keep]], last_time[g])
+        if show_ci: plot.area(step_x, np.nan_to_num(curves[1], nan=0.0), np.nan_to_num(curves[2], nan=1.0), color)
+        plot.line(step_x, curves[0], color, width=1.8)
+    if k > 1: plot.legend(group_names, colors)
+    return plot.render()
+
+
+def step_path(times, curves, end_time):
+    """Vertices of right-continuous step functions starting at (0, 1), thinned to PREVIEW_CURVE_POINTS steps."""
+    if len(times) > PREVIEW_CURVE_POINTS:
+        keep = np.unique(np.linspace(0, len(times) - 1, PREVIEW_CURVE_POINTS).astype(int))
+        times, curves = times[keep], [c[keep] for c in curves]
+    x = np.concatenate([[0.0], np.repeat(times, 2), [end_time]])
+    paths = []
+    for curve in curves:
+        levels = np.concatenate([[1.0], curve])
+        paths.append(np.repeat(levels, 2)[:len(x)])
+    return x, paths
@@ -0,0 +1,180 @@
+import queue
+import subprocess
+import threading
+import time
+
+# --- Persistent R Worker Pool ---
+# Each worker is a long-lived `Rscript r_worker.R` process that has already loaded
+# the plotting packages and parsed the plot scripts. Jobs are sent over stdin and
+# the worker answers with a done marker on stdout (see r_worker.R for the protocol).
+
+READY_MARKER = '@@RWORKER_READY'
+DONE_MARKER = '@@RWORKER_DONE'
+
+
+class RWorkerStartError(Exception):
+    """Raised when an R worker process cannot be started."""
+
+
+class RWorker:
+    def __init__(self, rscript_executable, worker_script_path, preload_scripts, startup_timeout):
+        cmd = [rscript_executable, worker_script_path] + list(preload_scripts)
+        try:
+            # Binary pipes: each job line is followed by its raw packed-data payload
+            self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                            stderr=subprocess.STDOUT)
+        except OSError as e:
+            raise RWorkerStartError(f"Could not start '{rscript_executable}': {e}")
+        self.jobs_done = 0
+        self._lines = queue.Queue()
+        self._reader = threading.Thread(target=self._read_output, daemon=True)
+        self._reader.start()
+
+        # Block until the packages are loaded, so the first job does not pay for it
+        startup_output = []
+        deadline = time.monotonic() + startup_timeout
+        while True:
+            try:
+                line = self._next_line(deadline)
+            except TimeoutError:
+                self.close(kill=True)  # a hung start-up never reads stdin, so do not wait for it to exit
+                detail = '\n'.join(startup_output[-20:]) or 'no output'
+                raise RWorkerStartError(f"R worker not ready after {startup_timeout}s: {detail}")
+            if line == READY_MARKER: break
+            if line is None:
+                self.close()
+                detail = '\n'.join(startup_output) or 'no output'
+                raise RWorkerStartError(f"R worker did not become ready: {detail}")
+            startup_output.append(line)
+
+    def _read_output(self):
+        # stdout and stderr are merged, so this also drains the scripts' message() output
+        for line in self.process.stdout:
+            self._lines.put(line.decode('utf-8', errors='replace').rstrip('\r\n'))
+        self._lines.put(None)  # EOF: the worker process has exited
+
+    def _next_line(self, deadline):
+        """Returns the next output line, None on worker exit, or raises TimeoutError."""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0: raise TimeoutError
+        try:
+            return self._lines.get(timeout=remaining)
+        except queue.Empty:
+            raise TimeoutError
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def run(self, r_script_path, args_list, timeout, input_data=b''):
+        """Runs one plot script job, with input_data as its stdin payload.
+
+        Returns (exit_status, output); raises TimeoutError or RuntimeError.
+        """
+        fields = ['RUN', str(len(input_data)), r_script_path] + [str(arg) for arg in args_list]
+        if any('\t' in field or '\n' in field for field in fields):
+            raise ValueError("R worker job arguments must not contain tabs or newlines")
+        try:
+            self.process.stdin.write(('\t'.join(fields) + '\n').encode('utf-8'))
+            self.process.stdin.write(input_data)
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError) as e:
+            raise RuntimeError(f"R worker is not accepting jobs: {e}")
+
+        output = []
+        deadline = time.monotonic() + timeout
+        while True:
+            line = self._next_line(deadline)
+            if line is None:
+                raise RuntimeError('\n'.join(output + ["R worker exited unexpectedly."]))
+            if line.startswith(DONE_MARKER):
+                self.jobs_done += 1
+                return int(line[len(DONE_MARKER):].strip() or 1), '\n'.join(output)
+            output.append(line)
+
+    def close(self, kill=False):
+        if kill: self.process.kill()  # a timed-out job may never read stdin again
+        try:
+            self.process.stdin.close()  # the worker exits on EOF
+            self.process.wait(timeout=5)
+        except Exception:
+            self.process.kill()
+            self.process.wait()
+
+
+class RWorkerPool:
+    """Fixed-size pool of warm R workers.
+
+    The pool holds exactly `size` slots. A slot holds an idle worker, or None when
+    its worker has not been started yet or was discarded after a crash or timeout;
+    such slots are (re)spawned on the next job that picks them up.
+    """
+
+    def __init__(self, size, rscript_executable, worker_script_path, preload_scripts,
+                 job_timeout=120, startup_timeout=60, max_jobs_per_worker=200):
+        self.size = size
+        self.rscript_executable = rscript_executable
+        self.worker_script_path = worker_script_path
+        self.preload_scripts = list(preload_scripts)
+        self.job_timeout = job_timeout
+        self.startup_timeout = startup_timeout
+        self.max_jobs_per_worker = max_jobs_per_worker  # recycle workers to bound R memory growth
+        self._slots = queue.Queue()
+        for _ in range(size): self._slots.put(None)
+
+    def _spawn(self):
+        return RWorker(self.rscript_executable, self.worker_script_path, self.preload_scripts,
+                       self.startup_timeout)
+
+    def run(self, r_script_path, args_list, timeout=None, input_data=b''):
+        """Dispatches a job to a warm worker and returns a subprocess.CompletedProcess.
+
+        Raises RWorkerStartError if no worker could be started (e.g. R is not installed),
+        so callers can fall back to the one-shot Rscript path.
+        """
+        timeout = timeout or self.job_timeout
+        cmd = [self.rscript_executable, r_script_path] + list(args_list)
+        try:
+            worker = self._slots.get(timeout=timeout)
+        except queue.Empty:
+            return subprocess.CompletedProcess(cmd, -1, stdout='',
+                                               stderr=f"R 作业排队超时 (>{timeout}s)，所有 R 进程繁忙。")
+
+        try:
+            if worker is None or not worker.is_alive():
+                worker = self._spawn()
+            returncode, output = worker.run(r_script_path, args_list, timeout, input_data)
+            return subprocess.CompletedProcess(cmd, returncode, stdout='', stderr=output)
+        except TimeoutError:
+            print(f"R worker job timed out after {timeout}s, restarting worker: {' '.join(cmd)}")
+            if worker is not None: worker.close(kill=True)
+            worker = None
+            return subprocess.CompletedProcess(cmd, -1, stdout='', stderr=f"R 脚本执行超时 (>{timeout}s)。")
+        except RuntimeError as e:
+            print(f"R worker crashed, restarting worker: {e}")
+            if worker is not None: worker.close()
+            worker = None
+            return subprocess.CompletedProcess(cmd, -1, stdout='', stderr=str(e))
+        except RWorkerStartError:
+            worker = None
+            raise
+        finally:
+            if worker is not None and worker.jobs_done >= self.max_jobs_per_worker:
+                worker.close()
+                worker = None
+            self._slots.put(worker)
+
+    def warm_up(self):
+        """Starts every slot's worker now instead of on first use."""
+        workers = [self._slots.get() for _ in range(self.size)]
+        try:
+            for i, worker in enumerate(workers):
+                if worker is None or not worker.is_alive():
+                    workers[i] = self._spawn()
+        finally:
+            for worker in workers: self._slots.put(worker)
+
+    def close(self):
+        for _ in range(self.size):
+            worker = self._slots.get()
+            if worker is not None: worker.close()
+            self._slots.put(None)
@@ -0,0 +1,164 @@
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+
+# --- Permutation & Bootstrap Inference ---
+# Resampling runs as NumPy operations over whole (resamples x observations)
+# index matrices instead of a Python loop per resample. The resamples are split
+# into chunks of at most RESAMPLE_CHUNK_ELEMENTS matrix cells, which bounds
+# memory. Each chunk draws from its own generator spawned from one SeedSequence,
+# so a given seed (and chunk size) gives the same result whatever the number of
+# threads. Chunks can run on a shared thread pool; NumPy releases the GIL in the
+# heavy parts.
+# Each chunk computes both the permutation statistics and the bootstrap
+# replicates. Once time_limit has passed no further chunk is started, and the
+# result covers the chunks that completed in order (reported as time_limited).
+
+DEFAULT_RESAMPLES = 10000
+MAX_RESAMPLES = int(os.environ.get('RESAMPLE_MAX_RESAMPLES', '200000'))
+DEFAULT_TIME_LIMIT = 10.0  # seconds
+MAX_TIME_LIMIT = float(os.environ.get('RESAMPLE_MAX_TIME_LIMIT', '30'))  # server-side cap on time_limit
+RESAMPLE_CHUNK_ELEMENTS = int(os.environ.get('RESAMPLE_CHUNK_ELEMENTS', str(1 << 19)))
+RESAMPLE_WORKERS = int(os.environ.get('RESAMPLE_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """The thread pool shared by all resampling requests (None when RESAMPLE_WORKERS <= 1)."""
+    global _executor
+    if RESAMPLE_WORKERS <= 1: return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(RESAMPLE_WORKERS, thread_name_prefix='resampling')
+        return _executor
+
+
+def run_chunks(chunk_fn, n_resamples, n_obs, seed, time_limit):
+    """Calls chunk_fn(rng, size) for consecutive chunks of the resamples and returns
+    (results of the chunks completed in order, resamples they cover, seed used)."""
+    chunk_size = max(1, RESAMPLE_CHUNK_ELEMENTS // max(n_obs, 1))
+    sizes = [min(chunk_size, n_resamples - start) for start in range(0, n_resamples, chunk_size)]
+    if seed is None: seed = secrets.randbits(32)  # reported back, so the run can be repeated
+    seed_seq = np.random.SeedSequence(seed)
+    child_seeds = seed_seq.spawn(len(sizes))
+    deadline = time.monotonic() + time_limit
+
+    def run(i):
+        if time.monotonic() > deadline: return None
+        return chunk_fn(np.random.default_rng(child_seeds[i]), sizes[i])
+
+    executor = get_executor()
+    if executor is None or len(sizes) == 1:
+        results = []
+        for i in range(len(sizes)):
+            result = run(i)
+            if result is None: break
+            results.append(result)
+    else:
+        results = []
+        for result in [future.result() for future in [executor.submit(run, i) for i in range(len(sizes))]]:
+            if result is None: break  # keep the completed prefix, so the result only depends on the seed
+            results.append(result)
+    return results, sum(sizes[:len(results)]), seed
+
+
+def _permutation_p(exceed_count, n_done):
+    # Counting the observed arrangement keeps the Monte Carlo p-value valid (never 0)
+    return (exceed_count + 1) / (n_done + 1)
+
+
+def _percentile_interval(replicates, confidence_level):
+    alpha = 1 - confidence_level
+    replicates = replicates[np.isfinite(replicates)]
+    if len(replicates) == 0: return [None, None]
+    low, high = np.quantile(replicates, [alpha / 2, 1 - alpha / 2])
+    return [float(low), float(high)]
+
+
+def _result(statistic, observed, counts, replicates, n_resamples, n_done, seed, time_limit, confidence_level,
+            started):
+    return {
+        "statistic": statistic,
+        "observed": float(observed),
+        "permutation_p": _permutation_p(sum(counts), n_done) if n_done else None,
+        "bootstrap_ci": _percentile_interval(np.concatenate(replicates), confidence_level) if n_done else [None, None],
+        "confidence_level": confidence_level,
+        "n_resamples": n_resamples,
+        "n_completed": n_done,
+        "time_limited": n_done < n_resamples,
+        "time_limit": time_limit,
+        "seed": seed,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def two_group_resampling(group1, group2, n_resamples=DEFAULT_RESAMPLES, seed=None, time_limit=DEFAULT_TIME_LIMIT,
+                         confidence_level=0.95):
+    """Permutation test (two-sided) and percentile bootstrap CI for the difference in means."""
+    started = time.perf_counter()
+    group1, group2 = np.asarray(group1, dtype=float), np.asarray(group2, dtype=float)
+    n1, n2 = len(group1), len(group2)
+    if n1 < 2 or n2 < 2: raise ValueError("每组至少需要 2 个数据点才能进行重抽样")
+    pooled = np.concatenate([group1, group2])
+    total = pooled.sum()
+    observed = group1.mean() - group2.mean()
+    threshold = abs(observed) * (1 - 1e-12)  # ties with the observed statistic count as at least as extreme
+
+    def chunk(rng, size):
+        # Permutation: the first n1 positions of each shuffled row form group 1
+        order = rng.permuted(np.tile(np.arange(n1 + n2), (size, 1)), axis=1)[:, :n1]
+        sum1 = pooled[order].sum(axis=1)
+        diffs = sum1 / n1 - (total - sum1) / n2
+        exceed = int(np.count_nonzero(np.abs(diffs) >= threshold))
+        # Bootstrap: resample each group with replacement
+        boot = (group1[rng.integers(0, n1, (size, n1))].mean(axis=1)
+                - group2[rng.integers(0, n2, (size, n2))].mean(axis=1))
+        return exceed, boot
+
+    results, n_done, seed = run_chunks(chunk, n_resamples, n1 + n2, seed, time_limit)
+    return _result('mean_difference', observed, [r[0] for r in results], [r[1] for r in results], n_resamples,
+                   n_done, seed, time_limit, confidence_level, started)
+
+
+def _row_pearson(x, y):
+    """Pearson r of each row pair of two (rows x n) matrices; NaN for constant rows."""
+    x = x - x.mean(axis=1, keepdims=True)
+    y = y - y.mean(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.einsum('ij,ij->i', x, y) / np.sqrt(np.einsum('ij,ij->i', x, x) * np.einsum('ij,ij->i', y, y))
+
+
+def correlation_resampling(x, y, n_resamples=DEFAULT_RESAMPLES, seed=None, time_limit=DEFAULT_TIME_LIMIT,
+                           confidence_level=0.95):
+    """Permutation test (two-sided) and percentile bootstrap CI (resampling pairs) for Pearson's r."""
+    started = time.perf_counter()
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    n = len(x)
+    if n < 3: raise ValueError("至少需要 3 对数据才能进行重抽样")
+    x_std, y_std = x - x.mean(), y - y.mean()
+    x_norm, y_norm = np.sqrt(x_std @ x_std), np.sqrt(y_std @ y_std)
+    if x_norm == 0 or y_norm == 0: raise ValueError("X 或 Y 为常数，无法计算相关系数")
+    x_std /= x_norm
+    y_std /= y_norm
+    observed = x_std @ y_std
+    threshold = abs(observed) * (1 - 1e-12)
+
+    def chunk(rng, size):
+        # Permutation: shuffling Y against X leaves both standardized, so r is a dot product
+        order = rng.permuted(np.tile(np.arange(n), (size, 1)), axis=1)
+        exceed = int(np.count_nonzero(np.abs(y_std[order] @ x_std) >= threshold))
+        # Bootstrap: resample (x, y) pairs with replacement
+        rows = rng.integers(0, n, (size, n))
+        return exceed, _row_pearson(x[rows], y[rows])
+
+    results, n_done, seed = run_chunks(chunk, n_resamples, n, seed, time_limit)
+    return _result('pearson_r', observed, [r[0] for r in results], [r[1] for r in results], n_resamples,
+                   n_done, seed, time_limit, confidence_level, started)
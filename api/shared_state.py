@@ -0,0 +1,143 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl  # POSIX only; the multi-process mode is not available without it
+except ImportError:
+    fcntl = None
+
+# --- Shared State for Multi-Process Deployments ---
+# When several worker processes serve the app (see gunicorn.conf.py), the plot
+# index, the plot job records and the R process budget must be the same in all
+# of them. They are kept on the local disk: a SQLite database in WAL mode (one
+# connection per process and thread) and flock()ed lock files, which the
+# kernel releases automatically if a process dies while holding them.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS plot_files (name TEXT PRIMARY KEY, size INTEGER NOT NULL, last_access REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS plot_files_last_access ON plot_files (last_access);
+CREATE TABLE IF NOT EXISTS expired_plots (name TEXT PRIMARY KEY, removed REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS plot_jobs (job_id TEXT PRIMARY KEY, owner_pid INTEGER NOT NULL, status TEXT NOT NULL,
+                                      submitted REAL NOT NULL, finished REAL, job TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS plot_jobs_status ON plot_jobs (status, submitted);
+"""
+
+
+def require_fcntl():
+    if fcntl is None: raise RuntimeError("Shared multi-process state needs fcntl (POSIX); use APP_SHARED_STATE=memory")
+
+
+class StateDatabase:
+    def __init__(self, path, busy_timeout=30):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self.connect().executescript(SCHEMA)
+
+    def connect(self):
+        """This thread's connection; a forked process opens its own instead of reusing the parent's."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Write transaction; BEGIN IMMEDIATE takes the write lock up front, so read-then-write is atomic."""
+        conn = self.connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def add_counter(self, conn, name, amount):
+        conn.execute("INSERT INTO counters (name, value) VALUES (?, ?) "
+                     "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value", (name, amount))
+
+    def set_counter(self, conn, name, value):
+        conn.execute("INSERT OR REPLACE INTO counters (name, value) VALUES (?, ?)", (name, value))
+
+    def counters(self):
+        return dict(self.connect().execute("SELECT name, value FROM counters").fetchall())
+
+
+def _open_locked(path, blocking):
+    """Opens and flock()s path; returns the fd, or None if it is locked and not blocking.
+
+    A lock file may be unlinked by its holder on release, so after locking we
+    check that the path still names the file we locked; if not, we retry on the
+    new file."""
+    while True:
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        try:
+            if os.fstat(fd).st_ino == os.stat(path).st_ino: return fd
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+
+
+@contextmanager
+def file_lock(path):
+    """Exclusive lock on path across processes and threads; the lock file is removed on release."""
+    require_fcntl()
+    fd = _open_locked(path, blocking=True)
+    try:
+        yield
+    finally:
+        os.unlink(path)  # still holding the lock, so nobody is using this file
+        os.close(fd)
+
+
+class SlotLimiter:
+    """At most `slots` holders at a time across every process sharing `directory` (one lock file per slot)."""
+
+    def __init__(self, directory, slots, poll_interval=0.05):
+        require_fcntl()
+        self.directory = directory
+        self.slots = slots
+        self.poll_interval = poll_interval
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, slot):
+        return os.path.join(self.directory, f"slot_{slot}.lock")
+
+    def acquire(self, timeout):
+        """Returns a token for release(); raises TimeoutError if no slot frees up within timeout seconds."""
+        deadline = time.monotonic() + timeout
+        first = os.getpid() % self.slots  # processes start probing at different slots
+        while True:
+            for i in range(self.slots):
+                slot = (first + i) % self.slots
+                fd = _open_locked(self._path(slot), blocking=False)
+                if fd is not None: return fd
+            if time.monotonic() >= deadline: raise TimeoutError
+            time.sleep(self.poll_interval)
+
+    def release(self, token):
+        os.close(token)  # closing the descriptor drops the flock; slot files are kept
+
+    def in_use(self):
+        """Number of slots currently held by any process."""
+        held = 0
+        for slot in range(self.slots):
+            fd = _open_locked(self._path(slot), blocking=False)
+            if fd is None:
+                held += 1
+            else:
+                os.close(fd)
+        return held
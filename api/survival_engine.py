@@ -0,0 +1,107 @@
+from lazy_imports import lazy_import
+
+np = lazy_import('numpy')
+special = lazy_import('scipy.special')
+stats = lazy_import('scipy.stats')
+
+# --- Vectorized Kaplan-Meier / Log-Rank Engine ---
+# All groups are handled in one pass: the data is reduced once to a (groups x
+# distinct event times) table of deaths and at-risk counts, from which the KM curves,
+# Greenwood log(-log) confidence bands, medians and the k-group log-rank test
+# are computed with array operations. Matches lifelines' KaplanMeierFitter and
+# multivariate_logrank_test.
+
+
+def risk_table(time, event, codes, n_groups):
+    """Returns (event_times, deaths, at_risk): distinct event times and (n_groups, len(event_times)) counts.
+
+    Only times with at least one event matter for the KM curves and the log-rank
+    test, so censoring-only times are never materialized.
+    """
+    observed = event > 0
+    event_times, event_idx = np.unique(time[observed], return_inverse=True)
+    n_times = len(event_times)
+    deaths = np.bincount(codes[observed] * n_times + event_idx,
+                         minlength=n_groups * n_times).reshape(n_groups, n_times).astype(float)
+
+    # At risk at t = group members with time >= t; one sort by (group, time) serves every group
+    order = np.lexsort((time, codes))
+    sorted_time = time[order]
+    bounds = np.searchsorted(codes[order], np.arange(n_groups + 1))
+    at_risk = np.empty((n_groups, n_times))
+    for g in range(n_groups):
+        group_times = sorted_time[bounds[g]:bounds[g + 1]]
+        at_risk[g] = len(group_times) - np.searchsorted(group_times, event_times, side='left')
+    return event_times, deaths, at_risk
+
+
+def kaplan_meier(times, deaths, at_risk, alpha=0.05):
+    """KM survival and its (lower, upper) confidence bands for every group row."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        hazard = np.where(at_risk > 0, deaths / at_risk, 0.0)
+        survival = np.cumprod(1.0 - hazard, axis=1)
+        greenwood = np.where(at_risk > deaths, deaths / (at_risk * (at_risk - deaths)), 0.0)
+        greenwood = np.where((at_risk == deaths) & (deaths > 0), np.inf, greenwood).cumsum(axis=1)
+
+        # Exponential Greenwood (log(-log)) bands, as in lifelines
+        z = special.ndtri(1 - alpha / 2)
+        log_s = np.log(survival)
+        spread = z * np.sqrt(greenwood) / log_s
+        upper = np.exp(-np.exp(np.log(-log_s) + spread))
+        lower = np.exp(-np.exp(np.log(-log_s) - spread))
+    # Before the first death the curve is exactly 1; after a total wipe-out it is exactly 0
+    upper = np.where(survival >= 1.0, 1.0, np.where(survival <= 0.0, 0.0, upper))
+    lower = np.where(survival >= 1.0, 1.0, np.where(survival <= 0.0, 0.0, lower))
+    return survival, lower, upper
+
+
+def first_time_at_or_below(times, curves, q=0.5):
+    """First time each curve drops to q or below (NaN if it never does, i.e. 'not reached')."""
+    if curves.shape[1] == 0: return np.full(curves.shape[0], np.nan)  # no events: no curve ever drops
+    below = curves <= q + 1e-12  # a curve landing exactly on q must not be missed due to rounding
+    reached = below.any(axis=1)
+    return np.where(reached, times[below.argmax(axis=1)], np.nan)
+
+
+def logrank_test(deaths, at_risk):
+    """k-group log-rank test. Returns (chi_square, degrees_of_freedom, p_value), or None if there are no events."""
+    n_groups = deaths.shape[0]
+    d_total = deaths.sum(axis=0)
+    n_total = at_risk.sum(axis=0)
+    live = n_total > 0
+    deaths, at_risk, d_total, n_total = deaths[:, live], at_risk[:, live], d_total[live], n_total[live]
+
+    expected = at_risk * (d_total / n_total)
+    observed_minus_expected = (deaths - expected).sum(axis=1)
+
+    # Hypergeometric covariance: V = sum_t w_t (n_t diag(n_gt) - n_gt n_ht^T)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        w = np.where(n_total > 1, d_total * (n_total - d_total) / (n_total ** 2 * (n_total - 1)), 0.0)
+    weighted = at_risk * w
+    variance = np.diag((weighted * n_total).sum(axis=1)) - weighted @ at_risk.T
+
+    # One group is redundant (the O-E sum to zero), so drop the last one
+    dof = n_groups - 1
+    if deaths.shape[1] == 0: return None  # no events at all: nothing to compare
+    z = observed_minus_expected[:dof]
+    chi_square = float(z @ np.linalg.pinv(variance[:dof, :dof]) @ z)  # pinv, like lifelines, for degenerate designs
+    return chi_square, dof, float(stats.chi2.sf(chi_square, dof))
+
+
+def survival_summary(time, event, codes, n_groups, alpha=0.05):
+    """Per-group N, events, median survival (with CI) and, for 2+ groups, the log-rank test."""
+    time = np.asarray(time, dtype=float)
+    event = np.asarray(event, dtype=float)
+    codes = np.asarray(codes, dtype=np.intp)
+    times, deaths, at_risk = risk_table(time, event, codes, n_groups)
+    survival, lower, upper = kaplan_meier(times, deaths, at_risk, alpha)
+
+    summary = {
+        "n": np.bincount(codes, minlength=n_groups),
+        "events": np.bincount(codes, weights=event, minlength=n_groups).astype(int),
+        "median": first_time_at_or_below(times, survival),
+        "median_lower": first_time_at_or_below(times, lower),
+        "median_upper": first_time_at_or_below(times, upper),
+        "logrank": logrank_test(deaths, at_risk) if n_groups > 1 else None,
+    }
+    return summary
@@ -0,0 +1,203 @@
+import csv
+import io
+import os
+
+from lazy_imports import lazy_import, optional_lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+pq = optional_lazy_import('pyarrow.parquet')  # optional: only needed for Parquet uploads
+
+# --- Streaming Table Uploads ---
+# Reads an uploaded CSV, NDJSON or Parquet file chunk by chunk straight into typed
+# NumPy columns, so large cohort files never become a JSON list of lists. Each
+# chunk is type-checked and validated as it arrives (errors name the offending
+# record); group labels are dictionary-encoded across chunks. The result is a
+# DataFrame with the same columns the JSON routes build, so the stats and plot
+# functions run on it unchanged.
+
+UPLOAD_FORMATS = ('csv', 'ndjson', 'parquet')
+FORMAT_EXTENSIONS = {'.csv': 'csv', '.tsv': 'csv', '.txt': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson',
+                     '.parquet': 'parquet', '.pq': 'parquet'}
+UPLOAD_CHUNK_ROWS = int(os.environ.get('UPLOAD_CHUNK_ROWS', '200000'))
+UPLOAD_MAX_ROWS = int(os.environ.get('UPLOAD_MAX_ROWS', '20000000'))
+
+# Column kinds: number (finite float), time (finite float >= 0), status (0/1),
+# label (non-empty group label) and group (group label, missing -> '').
+# Columns in OPTIONAL_COLUMNS may be absent from the file.
+UPLOAD_SCHEMAS = {
+    'correlation': {'X': 'number', 'Y': 'number'},
+    'two_group': {'Group': 'label', 'Value': 'number'},
+    'multi_group': {'Group': 'label', 'Value': 'number'},
+    'survival': {'Time': 'time', 'Status': 'status', 'Group': 'group'},
+}
+OPTIONAL_COLUMNS = {'survival': {'Group'}}  # no group column: one overall curve
+
+
+class UploadError(ValueError):
+    """The upload cannot be read or fails validation; the message is safe to show to the user."""
+
+
+def detect_format(filename, requested=None):
+    upload_format = requested or FORMAT_EXTENSIONS.get(os.path.splitext(filename or '')[1].lower())
+    if upload_format not in UPLOAD_FORMATS:
+        raise UploadError(f"无法识别上传文件格式，请通过 'format' 指定: {', '.join(UPLOAD_FORMATS)}")
+    return upload_format
+
+
+def resolve_columns(available, analysis_type, column_map):
+    """Canonical column -> column in the file (None for absent optional columns)."""
+    schema = UPLOAD_SCHEMAS[analysis_type]
+    unknown = set(column_map) - set(schema)
+    if unknown:
+        raise UploadError(f"column_map 包含未知列: {', '.join(sorted(unknown))}（可用: {', '.join(schema)}）")
+    by_lower = {str(name).strip().lower(): name for name in available}
+    resolved = {}
+    for name in schema:
+        if name in column_map:
+            if column_map[name] not in available:
+                raise UploadError(f"column_map 指定的列 '{column_map[name]}' 不在文件中"
+                                  f"（文件列: {', '.join(map(str, available))}）")
+            resolved[name] = column_map[name]
+        elif name.lower() in by_lower:
+            resolved[name] = by_lower[name.lower()]
+        elif name in OPTIONAL_COLUMNS.get(analysis_type, ()):
+            resolved[name] = None
+        else:
+            raise UploadError(f"上传文件缺少列 '{name}'（文件列: {', '.join(map(str, available))}），"
+                              f"可通过 column_map 指定")
+    return resolved
+
+
+class ColumnBuilder:
+    """Accumulates one typed column across chunks, validating each chunk as it arrives."""
+
+    def __init__(self, name, kind):
+        self.name = name
+        self.kind = kind
+        self.parts = []
+        self.levels = {}  # group label -> code, for label/group columns
+
+    def _fail(self, message, offset, positions):
+        raise UploadError(f"第 {offset + int(positions[0]) + 1} 条记录: {self.name} {message}")
+
+    def add(self, values, offset):
+        """values: the chunk's column (pandas Series); offset: records before this chunk."""
+        if self.kind in ('label', 'group'):
+            missing = values.isna().to_numpy()
+            labels = values.astype(str).str.strip().to_numpy(dtype=object)
+            labels[missing] = ''
+            if self.kind == 'label' and (labels == '').any():
+                self._fail("缺少分组名称", offset, np.flatnonzero(labels == ''))
+            codes, uniques = pd.factorize(labels)
+            # Chunk-local codes -> codes in the order labels were first seen in the whole file
+            mapping = np.array([self.levels.setdefault(label, len(self.levels)) for label in uniques],
+                               dtype=np.int32)
+            self.parts.append(mapping[codes])
+            return
+
+        numbers = pd.to_numeric(values, errors='coerce').to_numpy(dtype=float)
+        invalid = ~np.isfinite(numbers)
+        if invalid.any():
+            position = np.flatnonzero(invalid)[:1]
+            raw = values.iloc[int(position[0])]
+            self._fail("缺失" if pd.isna(raw) else f"不是有效数字: {raw!r}", offset, position)
+        if self.kind == 'time' and (numbers < 0).any():
+            self._fail("不能为负数", offset, np.flatnonzero(numbers < 0))
+        if self.kind == 'status':
+            not_binary = ~np.isin(numbers, (0, 1))
+            if not_binary.any(): self._fail("必须为 0 或 1", offset, np.flatnonzero(not_binary))
+            numbers = numbers.astype(np.int8)
+        self.parts.append(numbers)
+
+    def finish(self):
+        if self.kind in ('label', 'group'):
+            codes = np.concatenate(self.parts) if self.parts else np.zeros(0, dtype=np.int32)
+            return pd.Categorical.from_codes(codes, categories=list(self.levels))
+        if not self.parts: return np.zeros(0, dtype=np.int8 if self.kind == 'status' else float)
+        return np.concatenate(self.parts)
+
+
+# --- Chunk Readers (each yields DataFrames holding the file's columns) ---
+def _csv_header(stream):
+    start = stream.tell()
+    first_line = stream.readline().decode('utf-8-sig', errors='replace')
+    stream.seek(start)
+    if not first_line.strip(): raise UploadError("上传文件为空。")
+    delimiter = '\t' if first_line.count('\t') > first_line.count(',') else ','
+    # Same parsing as _csv_chunks, so the names match its usecols
+    return next(csv.reader([first_line], delimiter=delimiter, skipinitialspace=True), []), delimiter
+
+
+def _csv_chunks(stream, columns, text_columns, delimiter):
+    reader = pd.read_csv(stream, sep=delimiter, usecols=columns, dtype={c: str for c in text_columns},
+                         encoding='utf-8-sig', chunksize=UPLOAD_CHUNK_ROWS, skipinitialspace=True)
+    with reader:
+        yield from reader
+
+
+def _ndjson_chunks(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    for chunk in pd.read_json(text, lines=True, chunksize=UPLOAD_CHUNK_ROWS, dtype=False):
+        # Array lines ([time, status, group]) come back with positional column names
+        chunk.columns = [str(c) for c in chunk.columns]
+        yield chunk
+
+
+def _parquet_chunks(parquet_file, columns):
+    for batch in parquet_file.iter_batches(batch_size=UPLOAD_CHUNK_ROWS, columns=columns):
+        yield batch.to_pandas()
+
+
+def read_upload(file_storage, analysis_type, upload_format=None, column_map=None):
+    """Parses an uploaded table (werkzeug FileStorage) into the DataFrame the analysis expects."""
+    schema = UPLOAD_SCHEMAS[analysis_type]
+    column_map = column_map or {}
+    upload_format = detect_format(file_storage.filename, upload_format)
+    stream = file_storage.stream
+    chunks = None
+
+    try:
+        if upload_format == 'csv':
+            available, delimiter = _csv_header(stream)
+            resolved = resolve_columns(available, analysis_type, column_map)
+            text_columns = [resolved[name] for name, kind in schema.items()
+                            if kind in ('label', 'group') and resolved[name]]
+            chunks = _csv_chunks(stream, [c for c in resolved.values() if c], text_columns, delimiter)
+        elif upload_format == 'parquet':
+            if pq is None: raise UploadError("服务器未安装 pyarrow，无法读取 Parquet 文件；请改用 CSV 或 NDJSON。")
+            parquet_file = pq.ParquetFile(stream)
+            available = parquet_file.schema_arrow.names
+            resolved = resolve_columns(available, analysis_type, column_map)
+            chunks = _parquet_chunks(parquet_file, [c for c in resolved.values() if c])
+        else:
+            chunks = _ndjson_chunks(stream)
+            resolved = None  # known once the first chunk shows the keys
+
+        builders = {name: ColumnBuilder(name, kind) for name, kind in schema.items()}
+        n_rows = 0
+        for chunk in chunks:
+            if resolved is None:
+                available = list(chunk.columns)
+                positional = not column_map and all(c.isdigit() for c in available)
+                if positional: column_map = {name: str(i) for i, name in enumerate(schema) if str(i) in available}
+                resolved = resolve_columns(available, analysis_type, column_map)
+            for name, builder in builders.items():
+                if resolved[name] is not None: builder.add(chunk[resolved[name]], n_rows)
+            n_rows += len(chunk)
+            if n_rows > UPLOAD_MAX_ROWS: raise UploadError(f"上传文件超过 {UPLOAD_MAX_ROWS} 行上限。")
+    except UploadError:
+        raise
+    except (ValueError, KeyError, TypeError, UnicodeDecodeError, OSError) as e:
+        raise UploadError(f"无法解析上传的 {upload_format} 文件: {e}")
+    finally:
+        if chunks is not None: chunks.close()  # stop reading now, while the upload stream is still open
+
+    if resolved is None: raise UploadError("上传文件为空。")
+    columns = {}
+    for name, builder in builders.items():
+        if resolved[name] is None:
+            columns[name] = pd.Categorical.from_codes(np.zeros(n_rows, dtype=np.int32), categories=[''])
+        else:
+            columns[name] = builder.finish()
+    return pd.DataFrame(columns)
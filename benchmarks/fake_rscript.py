@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""Stand-in for Rscript, used by the benchmarks when R is not installed.
+
+Speaks both ways the app talks to R:
+    fake_rscript.py <plot_script.R> --output out.pdf ...   one-shot render (payload on stdin)
+    fake_rscript.py r_worker.R <plot_script.R> ...         the worker pool protocol (see r_worker.R)
+
+Each "render" reads its whole input and writes a small valid PDF to --output.
+FAKE_R_STARTUP_SECONDS and FAKE_R_RENDER_SECONDS add simulated R startup
+(package loading) and per-plot render time; both default to 0, so by default
+the numbers measure only the Python side of the pipeline.
+"""
+import os
+import sys
+import time
+
+READY_MARKER = '@@RWORKER_READY'
+DONE_MARKER = '@@RWORKER_DONE'
+STARTUP_SECONDS = float(os.environ.get('FAKE_R_STARTUP_SECONDS', '0'))
+RENDER_SECONDS = float(os.environ.get('FAKE_R_RENDER_SECONDS', '0'))
+
+FAKE_PDF = (b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+            b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+            b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 200 200]>>endobj\n"
+            b"trailer<</Root 1 0 R>>\n%%EOF\n")
+
+
+def render(args, payload):
+    """Pretends to run a plot script; returns its exit status."""
+    if '--output' not in args: return 1
+    if '--input' in args:  # CSV transport: read the file like read_csv would
+        with open(args[args.index('--input') + 1], 'rb') as f: f.read()
+    time.sleep(RENDER_SECONDS)
+    with open(args[args.index('--output') + 1], 'wb') as f: f.write(FAKE_PDF)
+    print(f"@@TIMING render_pdf {RENDER_SECONDS:.6f}", file=sys.stderr, flush=True)  # like the real scripts
+    print(f"fake render: {len(payload)} payload bytes", flush=True)
+    return 0
+
+
+def serve_worker():
+    stdin = sys.stdin.buffer
+    print(READY_MARKER, flush=True)
+    while True:
+        line = stdin.readline()
+        if not line: return
+        fields = line.decode('utf-8').rstrip('\n').split('\t')
+        if fields[0] != 'RUN': sys.exit(2)
+        payload = stdin.read(int(fields[1]))
+        print(f"{DONE_MARKER} {render(fields[3:], payload)}", flush=True)
+
+
+if __name__ == '__main__':
+    time.sleep(STARTUP_SECONDS)
+    if len(sys.argv) > 1 and os.path.basename(sys.argv[1]) == 'r_worker.R':
+        serve_worker()
+    elif len(sys.argv) > 1 and sys.argv[1] == '-e':
+        sys.exit(0)  # Rscript -e <expr>: only the process start-up is of interest
+    else:
+        sys.exit(render(sys.argv[2:], sys.stdin.buffer.read()))
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""Benchmarks the stats, plot and combined routes at realistic data sizes.
+
+Requests go through the Flask test client, so the numbers cover JSON parsing,
+validation, statistics and the R round trip, but not the network or WSGI server.
+If Rscript is not on PATH (or --fake-r is given), benchmarks/fake_rscript.py
+stands in for it; the results record which one was used.
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --sizes 50,1000,100000,1000000 --concurrency 1,8
+    python benchmarks/run_benchmarks.py --endpoints survival_stats,two_group_plot --compare old.json
+
+For every endpoint x rows x concurrency it records p50/p95/mean/max latency,
+throughput, the peak Python allocation of one request (tracemalloc) and the
+process / R child max RSS, and writes them to a JSON file (default
+benchmarks/results/<timestamp>.json). With --compare, p50 latencies are checked
+against an earlier results file and the run exits with status 1 on regressions.
+"""
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+API_DIR = os.path.join(REPO_DIR, 'api')
+FAKE_RSCRIPT = os.path.join(BENCH_DIR, 'fake_rscript.py')
+
+# name -> (route, dataset)
+ENDPOINTS = {
+    'correlation_stats': ('/generate_stats', 'correlation'),
+    'correlation_plot': ('/generate_plot', 'correlation'),
+    'two_group_stats': ('/generate_two_group_stats', 'two_group'),
+    'two_group_plot': ('/generate_two_group_plot', 'two_group'),
+    'survival_stats': ('/generate_survival_stats', 'survival'),
+    'survival_plot': ('/generate_survival_plot', 'survival'),
+    'analyze_correlation': ('/analyze/correlation', 'correlation'),
+    'analyze_two_group': ('/analyze/two_group', 'two_group'),
+    'analyze_survival': ('/analyze/survival', 'survival'),
+}
+DEFAULT_ENDPOINTS = [name for name in ENDPOINTS if not name.startswith('analyze_')]
+
+
+# --- Synthetic Data ---
+def make_rows(dataset, n_rows, seed):
+    """Rows in the app's table_data format, rounded like values typed or pasted into the UI."""
+    rng = np.random.default_rng(seed)
+    if dataset == 'correlation':
+        x = rng.normal(50, 10, n_rows)
+        y = 0.6 * x + rng.normal(0, 8, n_rows)
+        return np.round(np.column_stack([x, y]), 3).tolist()
+    if dataset == 'two_group':
+        groups = np.where(np.arange(n_rows) < n_rows // 2, 'Control', 'Treatment')
+        values = np.round(np.where(groups == 'Control', rng.normal(10, 2, n_rows), rng.normal(11, 2.5, n_rows)), 3)
+        return [[g, v] for g, v in zip(groups.tolist(), values.tolist())]
+    if dataset == 'survival':
+        group_idx = rng.integers(0, 3, n_rows)
+        event_time = rng.exponential(np.array([12.0, 18.0, 24.0])[group_idx])
+        censor_time = rng.exponential(30.0, n_rows)
+        time_ = np.round(np.minimum(event_time, censor_time), 2)
+        status = (event_time <= censor_time).astype(int)
+        return [[t, s, f"Arm{g + 1}"] for t, s, g in zip(time_.tolist(), status.tolist(), group_idx.tolist())]
+    raise ValueError(f"Unknown dataset '{dataset}'")
+
+
+class RequestBodies:
+    """Pre-encoded JSON bodies. Variant i only changes the first row, so the large
+    part is encoded once while every request still gets a distinct plot cache key."""
+
+    def __init__(self, dataset, rows, options):
+        self.dataset = dataset
+        self.first_row = rows[0]
+        self.rest = json.dumps(rows[1:])[1:-1]
+        self.options = json.dumps(options)[1:-1]
+
+    def body(self, i):
+        first_row = list(self.first_row)
+        first_row[0 if self.dataset != 'two_group' else 1] += i * 1e-6
+        rows = json.dumps(first_row) + (', ' + self.rest if self.rest else '')
+        return f'{{"table_data": [{rows}]{", " + self.options if self.options else ""}}}'
+
+
+# --- Measurement ---
+def max_rss_bytes(who):
+    rss = resource.getrusage(who).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024  # bytes on macOS, KiB elsewhere
+
+
+def run_scenario(flask_app, route, bodies, n_requests, concurrency, unique):
+    latencies = []
+    status_counts = {}
+    lock = threading.Lock()
+    counter = itertools.count()
+
+    def client_thread():
+        client = flask_app.test_client()
+        while True:
+            i = next(counter)
+            if i >= n_requests: return
+            body = bodies.body(i if unique else 0)
+            start = time.perf_counter()
+            response = client.post(route, data=body, content_type='application/json')
+            response.get_data()  # drain streamed responses
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                status_counts[response.status_code] = status_counts.get(response.status_code, 0) + 1
+
+    threads = [threading.Thread(target=client_thread) for _ in range(concurrency)]
+    wall_start = time.perf_counter()
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    wall = time.perf_counter() - wall_start
+
+    # One more request under tracemalloc for the Python-side peak allocation per request
+    client = flask_app.test_client()
+    tracemalloc.start()
+    client.post(route, data=bodies.body(n_requests if unique else 0), content_type='application/json').get_data()
+    peak_alloc = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    p50, p95 = np.percentile(latencies, [50, 95])
+    return {
+        "requests": n_requests,
+        "status_counts": {str(code): count for code, count in sorted(status_counts.items())},
+        "errors": sum(count for code, count in status_counts.items() if code >= 400),
+        "latency_p50": round(float(p50), 6), "latency_p95": round(float(p95), 6),
+        "latency_mean": round(float(np.mean(latencies)), 6), "latency_max": round(float(np.max(latencies)), 6),
+        "throughput_rps": round(n_requests / wall, 3),
+        "peak_python_alloc_bytes": peak_alloc,
+        "process_max_rss_bytes": max_rss_bytes(resource.RUSAGE_SELF),
+        "children_max_rss_bytes": max_rss_bytes(resource.RUSAGE_CHILDREN),
+    }
+
+
+def measure_r_startup(app_module, repeats):
+    """Bare Rscript process start vs. a pool worker's start-up (package loading + script parsing)."""
+    from r_pool import RWorker
+
+    process_start = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([app_module.RSCRIPT_EXECUTABLE, '-e', 'invisible(0)'], stdin=subprocess.DEVNULL,
+                       capture_output=True, check=False)
+        process_start.append(time.perf_counter() - start)
+
+    worker_ready = []
+    preload = [app_module.CORRELATION_R_SCRIPT_PATH, app_module.TWO_GROUP_R_SCRIPT_PATH,
+               app_module.SURVIVAL_R_SCRIPT_PATH]
+    for _ in range(repeats):
+        start = time.perf_counter()
+        try:
+            worker = RWorker(app_module.RSCRIPT_EXECUTABLE, app_module.R_WORKER_SCRIPT_PATH, preload, 120)
+        except Exception as e:
+            print(f"R worker start-up could not be measured: {e}")
+            break
+        worker_ready.append(time.perf_counter() - start)
+        worker.close()
+
+    def summary(values):
+        return {"median": round(float(np.median(values)), 6), "runs": len(values)} if values else None
+
+    return {"process_start_seconds": summary(process_start), "worker_ready_seconds": summary(worker_ready)}
+
+
+# --- Setup & Reporting ---
+def load_app(args, work_dir):
+    """Imports the Flask app with benchmark settings; its plots go to the temp work dir, not the source tree."""
+    os.environ['R_POOL_SIZE'] = str(args.pool_size)
+    os.environ['R_INPUT_TRANSPORT'] = args.transport
+    os.environ['PLOT_DIR'] = os.path.join(work_dir, 'temp_plots')
+    os.environ.setdefault('PLOT_JOB_WORKERS', str(max(args.pool_size, 1)))
+    os.environ.setdefault('PLOT_JOB_QUEUE_SIZE', str(max(args.concurrency) * 4))
+    os.chdir(work_dir)
+    sys.path.insert(0, API_DIR)
+    import app as app_module
+
+    # The R scripts live at the repository root; use them there if the app does not find them
+    for attr in ('CORRELATION_R_SCRIPT_PATH', 'TWO_GROUP_R_SCRIPT_PATH', 'SURVIVAL_R_SCRIPT_PATH',
+                 'R_WORKER_SCRIPT_PATH'):
+        path = getattr(app_module, attr)
+        root_path = os.path.join(REPO_DIR, os.path.basename(path))
+        if not os.path.exists(path) and os.path.exists(root_path): setattr(app_module, attr, root_path)
+    app_module.RSCRIPT_EXECUTABLE = args.rscript
+    return app_module
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    """Prints p50 ratios against a baseline run; returns the number of regressions."""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(r["endpoint"], r["rows"], r["concurrency"]): r for r in json.load(f)["results"]}
+    regressions = 0
+    print(f"\nComparison with {baseline_path} (p50, regression if > {threshold:g}x):")
+    for result in results:
+        old = baseline.get((result["endpoint"], result["rows"], result["concurrency"]))
+        if not old or not old["latency_p50"]: continue
+        ratio = result["latency_p50"] / old["latency_p50"]
+        flag = "REGRESSION" if ratio > threshold else ""
+        regressions += bool(flag)
+        print(f"  {result['endpoint']:<22} rows={result['rows']:<8} c={result['concurrency']:<3} "
+              f"{old['latency_p50'] * 1000:9.1f} ms -> {result['latency_p50'] * 1000:9.1f} ms  x{ratio:5.2f} {flag}")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    int_list = lambda text: [int(v) for v in text.split(',') if v]
+    parser.add_argument('--sizes', type=int_list, default=[50, 1000, 10000, 100000], help="rows per dataset")
+    parser.add_argument('--concurrency', type=int_list, default=[1, 4], help="concurrent clients")
+    parser.add_argument('--endpoints', default=','.join(DEFAULT_ENDPOINTS),
+                        help=f"comma-separated, from: {', '.join(ENDPOINTS)}")
+    parser.add_argument('--requests', type=int, default=20, help="requests per scenario (fewer for big datasets)")
+    parser.add_argument('--row-budget', type=int, default=2_000_000,
+                        help="caps requests per scenario at row_budget / rows (but at least 3)")
+    parser.add_argument('--cached', action='store_true', help="repeat identical requests (plot cache hits)")
+    parser.add_argument('--pool-size', type=int, default=2, help="R worker pool size, 0 = one Rscript per plot")
+    parser.add_argument('--transport', choices=['packed', 'csv'], default='packed')
+    parser.add_argument('--rscript', default=None, help="Rscript executable (default: Rscript on PATH, else the fake)")
+    parser.add_argument('--fake-r', action='store_true', help="always use benchmarks/fake_rscript.py")
+    parser.add_argument('--startup-repeats', type=int, default=3, help="R start-up measurements (0 to skip)")
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--output', default=None, help="results JSON path")
+    parser.add_argument('--compare', default=None, help="earlier results JSON to compare p50 latency against")
+    parser.add_argument('--regression-threshold', type=float, default=1.2)
+    parser.add_argument('--verbose', action='store_true', help="show the app's own output")
+    args = parser.parse_args()
+
+    args.endpoints = [name for name in args.endpoints.split(',') if name]
+    unknown = [name for name in args.endpoints if name not in ENDPOINTS]
+    if unknown: parser.error(f"unknown endpoints: {', '.join(unknown)}")
+    if args.rscript is None:
+        args.rscript = FAKE_RSCRIPT if args.fake_r or not shutil.which('Rscript') else shutil.which('Rscript')
+    timestamp = time.strftime('%Y%m%d-%H%M%S')
+    args.output = os.path.abspath(args.output or os.path.join(BENCH_DIR, 'results', f'{timestamp}.json'))
+    if args.compare: args.compare = os.path.abspath(args.compare)
+    return args
+
+
+def main():
+    args = parse_args()
+    work_dir = tempfile.mkdtemp(prefix='plot_bench_')
+    app_output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, 'w'))
+    results = []
+    try:
+        with app_output:
+            app_module = load_app(args, work_dir)
+            r_startup = measure_r_startup(app_module, args.startup_repeats) if args.startup_repeats else None
+        print(f"Rscript: {args.rscript}   pool size: {args.pool_size}   transport: {args.transport}")
+        if r_startup: print(f"R start-up: {json.dumps(r_startup)}")
+        print(f"{'endpoint':<22} {'rows':>8} {'conc':>4} {'reqs':>4} {'p50 ms':>10} {'p95 ms':>10} "
+              f"{'req/s':>8} {'peak alloc MB':>13} {'errors':>6}")
+
+        datasets = sorted({ENDPOINTS[name][1] for name in args.endpoints})
+        for n_rows in args.sizes:
+            rows = {dataset: make_rows(dataset, n_rows, args.seed) for dataset in datasets}
+            for name in args.endpoints:
+                route, dataset = ENDPOINTS[name]
+                bodies = RequestBodies(dataset, rows[dataset], {})
+                n_requests = max(3, min(args.requests, args.row_budget // n_rows))
+                for concurrency in args.concurrency:
+                    with app_output:
+                        result = run_scenario(app_module.app, route, bodies, n_requests, concurrency,
+                                              unique=not args.cached)
+                    result = {"endpoint": name, "route": route, "rows": n_rows, "concurrency": concurrency,
+                              "request_bytes": len(bodies.body(0).encode('utf-8')), **result}
+                    results.append(result)
+                    print(f"{name:<22} {n_rows:>8} {concurrency:>4} {n_requests:>4} "
+                          f"{result['latency_p50'] * 1000:>10.1f} {result['latency_p95'] * 1000:>10.1f} "
+                          f"{result['throughput_rps']:>8.2f} {result['peak_python_alloc_bytes'] / 2 ** 20:>13.1f} "
+                          f"{result['errors']:>6}")
+            del rows
+    finally:
+        os.chdir(REPO_DIR)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'), "git_commit": git_commit(),
+            "python": platform.python_version(), "platform": platform.platform(),
+            "numpy": np.__version__, "pandas": pd.__version__,
+            "rscript": args.rscript, "fake_r": os.path.abspath(args.rscript) == FAKE_RSCRIPT,
+            "pool_size": args.pool_size, "transport": args.transport, "cached": args.cached, "seed": args.seed,
+        },
+        "r_startup": r_startup,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f: json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare and compare(results, args.compare, args.regression_threshold): sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
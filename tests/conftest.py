@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+API_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api')
+sys.path.insert(0, API_DIR)  # the api modules import each other by plain name
+
+# Single process, no background warm-up and no R workers: the tests never start R
+os.environ.setdefault('APP_WARM_UP', 'off')
+os.environ.setdefault('R_POOL_SIZE', '0')
+os.environ.setdefault('APP_SHARED_STATE', 'memory')
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """The Flask app, run from a scratch directory (its static/ and plot paths are relative to it)."""
+    previous = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp('app'))
+    os.environ.setdefault('PLOT_DIR', os.path.join(os.getcwd(), 'temp_plots'))
+    import app
+    yield app
+    os.chdir(previous)
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
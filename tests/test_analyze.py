@@ -0,0 +1,39 @@
+import json
+import os
+import re
+
+import pytest
+
+INDEX_HTML = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates', 'index.html')
+CORRELATION_TABLE = [[x, 2 * x + (x % 3)] for x in range(12)]
+
+
+def page_endpoints():
+    with open(INDEX_HTML, encoding='utf-8') as f:
+        return re.findall(r'data-endpoint="([^"]+)"', f.read())
+
+
+def test_page_submits_each_form_once_to_the_combined_route(app_module):
+    endpoints = page_endpoints()
+    assert endpoints and all(endpoint.startswith('/analyze/') for endpoint in endpoints)
+    assert {endpoint.rsplit('/', 1)[1] for endpoint in endpoints} <= set(app_module.ANALYSES)
+
+
+@pytest.mark.parametrize('job, plot_part', [
+    ({"status": "done", "pdf_url": "/plots/Correlation_plot_x.pdf", "cached": False},
+     {"pdf_url": "/plots/Correlation_plot_x.pdf", "cached": False}),
+    ({"status": "failed", "error": "no R"}, {"plot_error": "no R"}),
+])
+def test_streamed_response_carries_stats_then_plot(client, app_module, monkeypatch, job, plot_part):
+    monkeypatch.setattr(app_module.plot_jobs, 'submit', lambda prefix, render: 'job')
+    monkeypatch.setattr(app_module.plot_jobs, 'wait', lambda job_id: job)
+    monkeypatch.setattr(app_module.os.path, 'exists', lambda path: True)
+    response = client.post('/analyze/correlation', json={
+        "table_data": CORRELATION_TABLE, "plot_method": "lm", "stream": True, "preview": True})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    assert response.mimetype == 'application/x-ndjson'
+    stats_line, plot_line = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert stats_line["type"] == "stats"
+    assert "相关性分析" in stats_line["stats_text"]
+    assert stats_line["preview_svg"].startswith('<svg')
+    assert plot_line == {"type": "plot", **plot_part}
@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+from scipy import stats
+
+from batch_stats import adjust_p_values, batch_correlation, batch_two_group
+from normality import SHAPIRO_MAX_N, column_normality_p
+
+
+def two_group_matrices(seed=0, n1=25, n2=30):
+    """Columns with equal and with clearly unequal spreads, and a few missing values."""
+    rng = np.random.default_rng(seed)
+    scales2 = np.array([1.0, 1.1, 4.0, 0.25])
+    values1 = rng.normal(0.0, 1.0, (n1, 4))
+    values2 = rng.normal(0.6, 1.0, (n2, 4)) * scales2
+    values1[[2, 7], 1] = np.nan
+    values2[[0, 5, 9], 2] = np.nan
+    return values1, values2
+
+
+def present(column):
+    return column[~np.isnan(column)]
+
+
+def test_levene_matches_scipy():
+    values1, values2 = two_group_matrices()
+    result = batch_two_group(values1, values2)
+    for j in range(values1.shape[1]):
+        expected = stats.levene(present(values1[:, j]), present(values2[:, j]))  # center='median'
+        assert result["levene_stat"][j] == pytest.approx(expected.statistic, rel=1e-9)
+        assert result["levene_p"][j] == pytest.approx(expected.pvalue, rel=1e-9)
+
+
+def test_student_or_welch_t_test_matches_scipy():
+    values1, values2 = two_group_matrices()
+    result = batch_two_group(values1, values2)
+    assert set(result["t_test"]) == {'Student', 'Welch'}  # both branches are exercised
+    for j in range(values1.shape[1]):
+        equal_var = result["t_test"][j] == 'Student'
+        assert equal_var == (result["levene_p"][j] > 0.05)
+        expected = stats.ttest_ind(present(values1[:, j]), present(values2[:, j]), equal_var=equal_var)
+        assert result["t_stat"][j] == pytest.approx(expected.statistic, rel=1e-9)
+        assert result["p_value"][j] == pytest.approx(expected.pvalue, rel=1e-9)
+        assert result["t_df"][j] == pytest.approx(expected.df, rel=1e-9)
+
+
+def test_moments_exclude_missing_values():
+    values1, values2 = two_group_matrices()
+    result = batch_two_group(values1, values2)
+    column = present(values2[:, 2])
+    assert result["n2"][2] == len(column)
+    assert result["mean2"][2] == pytest.approx(column.mean())
+    assert result["sd2"][2] == pytest.approx(column.std(ddof=1))
+
+
+@pytest.mark.parametrize('method, test, reference', [
+    ('auto', 'shapiro', stats.shapiro),
+    ('shapiro', 'shapiro', stats.shapiro),
+    ('dagostino', 'dagostino', stats.normaltest),
+])
+def test_column_normality_dispatch_matches_scipy(method, test, reference):
+    values1, _ = two_group_matrices()
+    p, tests = column_normality_p(values1, method)
+    assert list(tests) == [test] * values1.shape[1]
+    for j in range(values1.shape[1]):
+        assert p[j] == pytest.approx(reference(present(values1[:, j])).pvalue, rel=1e-9)
+
+
+def test_column_normality_switches_test_by_column_size():
+    rng = np.random.default_rng(1)
+    values = rng.normal(size=(SHAPIRO_MAX_N + 100, 3))
+    values[10:, 1] = np.nan  # 10 values: Shapiro-Wilk, even for 'dagostino' (needs >= 20)
+    values[2:, 2] = np.nan  # 2 values: no test
+    p, tests = column_normality_p(values, 'auto')
+    assert list(tests) == ['dagostino', 'shapiro', None]
+    assert p[0] == pytest.approx(stats.normaltest(values[:, 0]).pvalue, rel=1e-9)
+    assert p[1] == pytest.approx(stats.shapiro(values[:10, 1]).pvalue, rel=1e-9)
+    assert np.isnan(p[2])
+    assert list(column_normality_p(values[:20], 'dagostino')[1]) == ['dagostino', 'shapiro', None]
+
+
+def test_correlation_matches_scipy_pearsonr():
+    rng = np.random.default_rng(2)
+    x = rng.normal(size=40)
+    values = np.column_stack([x + rng.normal(scale=s, size=40) for s in (0.3, 1.0, 5.0)])
+    x[3] = np.nan
+    values[[1, 8, 20], 1] = np.nan  # pairwise-complete rows differ per column
+    result = batch_correlation(x, values)
+    for j in range(values.shape[1]):
+        keep = ~np.isnan(x) & ~np.isnan(values[:, j])
+        expected = stats.pearsonr(x[keep], values[keep, j])
+        assert result["n"][j] == keep.sum()
+        assert result["r"][j] == pytest.approx(expected.statistic, rel=1e-9)
+        assert result["p_value"][j] == pytest.approx(expected.pvalue, rel=1e-9)
+
+
+P_VALUES = [0.01, 0.04, 0.03, 0.005, np.nan]
+
+
+@pytest.mark.parametrize('method, expected', [
+    # Hand-computed, as R's p.adjust gives them
+    ('holm', [0.03, 0.06, 0.06, 0.02, np.nan]),
+    ('bh', [0.02, 0.04, 0.04, 0.02, np.nan]),
+    ('bonferroni', [0.04, 0.16, 0.12, 0.02, np.nan]),
+    ('none', P_VALUES),
+])
+def test_adjust_p_values(method, expected):
+    np.testing.assert_allclose(adjust_p_values(P_VALUES, method), expected, rtol=1e-12)
+
+
+@pytest.mark.parametrize('method', ['holm', 'bh'])
+def test_adjusted_p_values_are_monotone_and_bounded(method):
+    p = np.random.default_rng(3).uniform(0, 0.2, 50)
+    adjusted = adjust_p_values(p, method)
+    order = np.argsort(p)
+    assert np.all(np.diff(adjusted[order]) >= 0)
+    assert np.all((adjusted >= p) & (adjusted <= 1))
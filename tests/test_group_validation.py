@@ -0,0 +1,36 @@
+import io
+import json
+
+import pytest
+
+VALID = [['a', 1.0], ['a', 2.0], ['a', 2.5], ['b', 3.0], ['b', 4.5], ['b', 4.0]]
+
+
+def error_message(response):
+    assert response.status_code == 400, response.get_data(as_text=True)
+    return response.get_data(as_text=True)
+
+
+@pytest.mark.parametrize('endpoint', ['/generate_two_group_stats', '/generate_multi_group_stats'])
+@pytest.mark.parametrize('label', [None, '', '  '])
+def test_missing_group_label_is_rejected_not_dropped(client, endpoint, label):
+    table = VALID + [[label, 5.0]]
+    assert "第 7 行: Group 缺少分组名称" in error_message(client.post(endpoint, json={"table_data": table}))
+
+
+def test_missing_group_label_in_upload_is_rejected(client):
+    csv = "Group,Value\na,1\na,2\nb,3\n,4\nb,5\n"
+    response = client.post('/generate_two_group_stats', content_type='multipart/form-data', data={
+        "file": (io.BytesIO(csv.encode()), 'groups.csv'), "options": json.dumps({}),
+    })
+    assert "第 4 条记录: Group 缺少分组名称" in error_message(response)
+
+
+def test_missing_two_group_value_is_rejected(client):
+    table = VALID + [['b', None]]
+    response = client.post('/generate_two_group_stats', json={"table_data": table})
+    assert "第 7 行: 数值 (Value) 缺失或不是有效数字" in error_message(response)
+
+
+def test_complete_two_group_table_is_accepted(client):
+    assert client.post('/generate_two_group_stats', json={"table_data": VALID}).status_code == 200
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+from scipy import stats
+
+from multi_group import multi_group_analysis
+
+GROUPS = ['a', 'b', 'c']
+
+
+def sample_groups(seed=0, sizes=(12, 15, 9), shifts=(0.0, 0.8, 1.5)):
+    rng = np.random.default_rng(seed)
+    values = [rng.normal(shift, 1.0 + i * 0.3, size) for i, (size, shift) in enumerate(zip(sizes, shifts))]
+    codes = np.concatenate([np.full(len(v), g) for g, v in enumerate(values)])
+    return codes, np.concatenate(values), values
+
+
+@pytest.mark.parametrize('method, reference', [('anova', stats.f_oneway), ('kruskal', stats.kruskal)])
+def test_omnibus_matches_scipy(method, reference):
+    codes, values, groups = sample_groups()
+    result = multi_group_analysis(codes, values, GROUPS, method=method)
+    expected = reference(*groups)
+    assert result["omnibus"]["statistic"] == pytest.approx(expected.statistic, rel=1e-9)
+    assert result["omnibus"]["p_value"] == pytest.approx(expected.pvalue, rel=1e-9)
+
+
+def test_kruskal_tie_correction_matches_scipy():
+    codes, values, groups = sample_groups()
+    rounded = np.round(values)  # many ties
+    result = multi_group_analysis(codes, rounded, GROUPS, method='kruskal')
+    expected = stats.kruskal(*[np.round(g) for g in groups])
+    assert result["omnibus"]["statistic"] == pytest.approx(expected.statistic, rel=1e-9)
+    assert result["omnibus"]["p_value"] == pytest.approx(expected.pvalue, rel=1e-9)
+
+
+def test_levene_matches_scipy():
+    codes, values, groups = sample_groups()
+    result = multi_group_analysis(codes, values, GROUPS)
+    expected = stats.levene(*groups)  # center='median'
+    assert result["levene"]["statistic"] == pytest.approx(expected.statistic, rel=1e-9)
+    assert result["levene"]["p_value"] == pytest.approx(expected.pvalue, rel=1e-9)
+
+
+def test_welch_anova_with_two_groups_matches_welch_t_test():
+    codes, values, groups = sample_groups(sizes=(12, 15), shifts=(0.0, 0.8))
+    result = multi_group_analysis(codes, values, GROUPS[:2], method='welch')
+    expected = stats.ttest_ind(*groups, equal_var=False)
+    assert result["omnibus"]["statistic"] == pytest.approx(expected.statistic ** 2, rel=1e-9)
+    assert result["omnibus"]["p_value"] == pytest.approx(expected.pvalue, rel=1e-9)
+
+
+def test_pooled_posthoc_pairs_use_the_anova_error_term():
+    codes, values, groups = sample_groups()
+    result = multi_group_analysis(codes, values, GROUPS, method='anova', correction='none')
+    pair = result["posthoc"][0]  # a vs b
+    df = len(values) - len(groups)
+    ms_within = sum((len(g) - 1) * g.var(ddof=1) for g in groups) / df
+    t = (groups[0].mean() - groups[1].mean()) / np.sqrt(ms_within * (1 / len(groups[0]) + 1 / len(groups[1])))
+    assert (pair["group1"], pair["group2"]) == ('a', 'b')
+    assert pair["statistic"] == pytest.approx(t, rel=1e-9)
+    assert pair["p_value"] == pytest.approx(2 * stats.t.sf(abs(t), df), rel=1e-9)
+
+
+# Valid inputs whose statistics are undefined (zero variance) must still produce a report
+@pytest.mark.parametrize('table, options', [
+    ([["a", 1], ["a", 2], ["b", 3], ["b", 5], ["c", 1], ["c", 9]], {}),  # Levene within-group variance is 0
+    ([["a", 1], ["a", 1], ["b", 2], ["b", 2]], {}),  # constant groups
+    ([["a", 1], ["a", 1], ["b", 2], ["b", 2]], {"method": "anova"}),
+    ([["a", 1], ["a", 1], ["b", 1], ["b", 1]], {"method": "kruskal"}),  # all values tied
+])
+def test_undefined_statistics_are_reported_as_na(client, table, options):
+    response = client.post('/generate_multi_group_stats', json={"table_data": table, **options})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    result = response.get_json()
+    assert "NA" in result["stats_text"]
+    assert "结论" in result["stats_text"]
+
+
+def test_undefined_statistics_in_combined_route(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module.plot_jobs, 'submit', lambda prefix, render: 'job')
+    monkeypatch.setattr(app_module.plot_jobs, 'wait', lambda job_id: {"status": "failed", "error": "no R"})
+    monkeypatch.setattr(app_module.os.path, 'exists', lambda path: True)
+    response = client.post('/analyze/multi_group', json={"table_data": [["a", 1], ["a", 1], ["b", 2], ["b", 2]]})
+    result = response.get_json()
+    assert "stats_error" not in result
+    assert "NA" in result["stats_text"]
+
+
+def test_missing_values_are_rejected(client):
+    response = client.post('/generate_multi_group_stats',
+                           json={"table_data": [["a", 1], ["a", None], ["a", 2], ["b", 3], ["b", 5]]})
+    assert response.status_code == 400
+    assert "第 2 行" in response.get_data(as_text=True)
@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+from scipy import stats
+
+from normality import (MIN_N, SHAPIRO_MAX_N, anderson_darling_p, anderson_darling_pvalue, deterministic_subsample,
+                       normality_test, resolve_normality_test)
+
+BELOW = 1e-9  # just below a break, where the previous piece still applies
+
+
+@pytest.mark.parametrize('a2, expected', [
+    # Values of the D'Agostino & Stephens (1986) pieces on both sides of each break
+    (0.2 - BELOW, 0.884352),
+    (0.2, 0.884250),
+    (0.34 - BELOW, 0.501520),
+    (0.34, 0.498233),
+    (0.6 - BELOW, 0.116893),
+    (0.6, 0.119432),
+    # Stephens' critical values of A*² for the 10%, 5%, 2.5% and 1% levels (the fit is within 2%)
+    (0.631, 0.10),
+    (0.752, 0.05),
+    (0.873, 0.025),
+    (1.035, 0.01),
+])
+def test_anderson_darling_pvalue_pieces(a2, expected):
+    assert anderson_darling_pvalue(a2) == pytest.approx(expected, rel=2e-2 if a2 > 0.6 else 1e-5)
+
+
+def test_anderson_darling_pvalue_stays_a_probability():
+    assert anderson_darling_pvalue(0.0) == pytest.approx(1.0, abs=1e-5)
+    assert 0 <= anderson_darling_pvalue(50.0) < 1e-100
+    grid = np.linspace(0, 3, 301)
+    p = np.array([anderson_darling_pvalue(a2) for a2 in grid])
+    assert np.all((p >= 0) & (p <= 1))
+    assert np.all(np.diff(p) < 0.01)  # decreasing, up to the small jumps at the breaks
+
+
+@pytest.mark.parametrize('n', [8, 50, 400])
+def test_anderson_darling_statistic_is_the_adjusted_a2(n):
+    data = np.random.default_rng(n).gamma(4.0, size=n)
+    a2, p = anderson_darling_p(data)
+    cdf = stats.norm.cdf(np.sort((data - data.mean()) / data.std(ddof=1)))
+    i = np.arange(1, n + 1)
+    unadjusted = -n - np.mean((2 * i - 1) * (np.log(cdf) + np.log(1 - cdf[::-1])))
+    assert a2 == pytest.approx(unadjusted * (1 + 0.75 / n + 2.25 / n ** 2), rel=1e-9)
+    assert p == anderson_darling_pvalue(a2)
+
+
+@pytest.mark.parametrize('method, n, expected', [
+    ('auto', 3, 'shapiro'),
+    ('auto', SHAPIRO_MAX_N, 'shapiro'),
+    ('auto', SHAPIRO_MAX_N + 1, 'dagostino'),
+    ('dagostino', MIN_N['dagostino'] - 1, 'shapiro'),
+    ('dagostino', MIN_N['dagostino'], 'dagostino'),
+    ('anderson', MIN_N['anderson'] - 1, 'shapiro'),
+    ('anderson', MIN_N['anderson'], 'anderson'),
+    ('shapiro_subsample', SHAPIRO_MAX_N, 'shapiro'),
+    ('shapiro_subsample', SHAPIRO_MAX_N + 1, 'shapiro_subsample'),
+])
+def test_strategy_resolves_by_sample_size(method, n, expected):
+    assert resolve_normality_test(method, n) == expected
+
+
+def test_unknown_strategy_is_rejected():
+    with pytest.raises(ValueError, match="Unknown normality test"):
+        resolve_normality_test('lilliefors', 100)
+
+
+@pytest.mark.parametrize('method, n, reference', [
+    ('auto', 30, lambda data: stats.shapiro(data)),
+    ('auto', SHAPIRO_MAX_N + 500, lambda data: stats.normaltest(data)),
+    ('dagostino', 30, lambda data: stats.normaltest(data)),
+    ('shapiro_subsample', SHAPIRO_MAX_N + 500, lambda data: stats.shapiro(deterministic_subsample(data))),
+    ('anderson', 30, lambda data: anderson_darling_p(data)),
+])
+def test_normality_test_dispatches_to_the_resolved_test(method, n, reference):
+    data = np.random.default_rng(n).normal(size=n)
+    test, statistic, p = normality_test(data, method)
+    assert test == resolve_normality_test(method, n)
+    expected_statistic, expected_p = reference(data)
+    assert statistic == pytest.approx(expected_statistic, rel=1e-12)
+    assert p == pytest.approx(expected_p, rel=1e-12)
+
+
+def test_subsample_is_deterministic():
+    data = np.random.default_rng(0).normal(size=SHAPIRO_MAX_N + 10)
+    assert normality_test(data, 'shapiro_subsample') == normality_test(data.copy(), 'shapiro_subsample')
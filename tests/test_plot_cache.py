@@ -0,0 +1,103 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+from plot_cache import PlotCache, plot_cache_key
+from plot_storage import PlotStorage, SharedPlotStorage
+from shared_state import StateDatabase
+
+
+@pytest.fixture
+def script(tmp_path):
+    path = tmp_path / 'plot.R'
+    path.write_text('plot()\n')
+    return str(path)
+
+
+@pytest.fixture
+def storage(tmp_path):
+    directory = tmp_path / 'plots'
+    directory.mkdir()
+    return PlotStorage(str(directory), ttl=3600, max_bytes=10 ** 6)
+
+
+class CountingRenderer:
+    """Stub for the R render: writes a small PDF after a delay and counts its calls."""
+
+    def __init__(self, delay=0.2, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, output_path):
+        with self._lock: self.calls += 1
+        time.sleep(self.delay)
+        if self.error: raise self.error
+        with open(output_path, 'wb') as f: f.write(b'%PDF-1.4 stub')
+
+
+def test_key_depends_on_everything_that_changes_the_plot(script):
+    df = pd.DataFrame({"X": [1.0, 2.0, 3.0], "Y": [2.0, 4.0, 5.0]})
+    key = plot_cache_key('Correlation_plot', df, ['--method', 'lm'], script)
+    assert key == plot_cache_key('Correlation_plot', df.copy(), ['--method', 'lm'], script)
+    assert key != plot_cache_key('Correlation_plot', df.assign(Y=[2.0, 4.0, 5.5]), ['--method', 'lm'], script)
+    assert key != plot_cache_key('Correlation_plot', df, ['--method', 'loess'], script)
+    assert key != plot_cache_key('TwoGroup_plot', df, ['--method', 'lm'], script)
+    assert key != plot_cache_key('Correlation_plot', df[['Y', 'X']], ['--method', 'lm'], script)
+    with open(script, 'a') as f: f.write('# edited\n')
+    os.utime(script, (time.time() + 5, time.time() + 5))  # a new mtime invalidates the script hash
+    assert key != plot_cache_key('Correlation_plot', df, ['--method', 'lm'], script)
+
+
+def test_identical_concurrent_requests_render_once(storage):
+    cache = PlotCache(storage)
+    render = CountingRenderer()
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: cache.get_or_render('Plot_abc.pdf', render), range(8)))
+    assert render.calls == 1
+    assert sorted(hit for _, hit in results) == [False] + [True] * 7
+    assert cache.stats() == {"hits": 7, "misses": 1, "in_flight": 0}
+    assert cache.get_or_render('Plot_abc.pdf', render) == ('Plot_abc.pdf', True)  # later: a plain hit
+    assert render.calls == 1
+
+
+def test_different_plots_render_independently(storage):
+    cache = PlotCache(storage)
+    render = CountingRenderer(delay=0.05)
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(lambda i: cache.get_or_render(f'Plot_{i % 2}.pdf', render), range(4)))
+    assert render.calls == 2
+
+
+def test_render_error_reaches_every_waiter_and_is_not_cached(storage):
+    cache = PlotCache(storage)
+    failing = CountingRenderer(error=RuntimeError("R failed"))
+    with ThreadPoolExecutor(4) as pool:
+        futures = [pool.submit(cache.get_or_render, 'Plot_bad.pdf', failing) for _ in range(4)]
+        for future in futures:
+            with pytest.raises(RuntimeError, match="R failed"): future.result()
+    assert failing.calls == 1
+    assert not any(name.endswith('.pdf') for name in os.listdir(storage.directory))
+    working = CountingRenderer(delay=0)
+    assert cache.get_or_render('Plot_bad.pdf', working) == ('Plot_bad.pdf', False)  # retried, not cached
+    assert working.calls == 1
+
+
+def test_caches_in_different_processes_share_one_render(tmp_path):
+    # Two PlotCache objects over one SQLite index and lock directory stand in for two worker processes
+    directory = tmp_path / 'plots'
+    directory.mkdir()
+    (tmp_path / 'locks').mkdir()
+    db_path = str(tmp_path / 'state.sqlite3')
+    caches = [PlotCache(SharedPlotStorage(str(directory), 3600, 10 ** 6, StateDatabase(db_path)),
+                        lock_dir=str(tmp_path / 'locks')) for _ in range(2)]
+    render = CountingRenderer()
+    with ThreadPoolExecutor(6) as pool:
+        results = list(pool.map(lambda i: caches[i % 2].get_or_render('Plot_shared.pdf', render), range(6)))
+    assert render.calls == 1
+    assert sum(not hit for _, hit in results) == 1
@@ -0,0 +1,146 @@
+import os
+
+import pytest
+
+from plot_storage import EXPIRED, MISSING, STORED, TMP_PREFIX, PlotStorage, SharedPlotStorage
+from shared_state import StateDatabase
+
+TTL = 100.0
+
+
+class FakeClock:
+    def __init__(self, start=1_000_000.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_storage(request, tmp_path, clock):
+    """Builds a PlotStorage (in-process index) or SharedPlotStorage (SQLite index) over tmp_path/plots."""
+    directory = tmp_path / 'plots'
+    directory.mkdir()
+
+    def make(max_bytes=10_000, ttl=TTL):
+        if request.param == 'memory': return PlotStorage(str(directory), ttl, max_bytes, clock=clock)
+        return SharedPlotStorage(str(directory), ttl, max_bytes, StateDatabase(str(tmp_path / 'state.sqlite3')),
+                                 clock=clock)
+    return make
+
+
+def write_plot(storage, name, size=100, mtime=None):
+    path = os.path.join(storage.directory, name)
+    with open(path, 'wb') as f: f.write(b'x' * size)
+    if mtime is not None: os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_lookup_of_plot_past_ttl_before_the_sweep_is_expired(make_storage, clock):
+    storage = make_storage()
+    path = write_plot(storage, 'a.pdf')
+    storage.add('a.pdf')
+    clock.advance(TTL + 1)  # the sweeper has not run yet
+    assert storage.lookup('a.pdf') == EXPIRED
+    assert not os.path.exists(path)
+    assert storage.lookup('a.pdf') == EXPIRED  # and stays expired
+    assert storage.lookup('never-rendered.pdf') == MISSING
+
+
+def test_serve_plot_answers_410_on_first_access_after_ttl(client, app_module, monkeypatch):
+    storage = app_module.plot_storage
+    clock = FakeClock(storage.clock())
+    monkeypatch.setattr(storage, 'clock', clock)
+    write_plot(storage, 'Expired_plot_0.pdf')
+    storage.add('Expired_plot_0.pdf')
+    assert client.get('/plots/Expired_plot_0.pdf').status_code == 200
+    clock.advance(storage.ttl + 1)
+    assert client.get('/plots/Expired_plot_0.pdf').status_code == 410
+    assert client.get('/plots/Unknown_plot_0.pdf').status_code == 404
+
+
+def test_sweep_removes_plots_not_accessed_within_ttl(make_storage, clock):
+    storage = make_storage()
+    for name in ('old.pdf', 'recent.pdf'):
+        write_plot(storage, name)
+        storage.add(name)
+    clock.advance(TTL * 0.6)
+    assert storage.lookup('recent.pdf') == STORED  # an access restarts its TTL
+    clock.advance(TTL * 0.6)
+    storage.sweep()
+    assert not os.path.exists(os.path.join(storage.directory, 'old.pdf'))
+    assert storage.lookup('old.pdf') == EXPIRED
+    assert storage.lookup('recent.pdf') == STORED
+    usage = storage.usage()
+    assert (usage["files"], usage["bytes"], usage["evicted_files"], usage["evicted_bytes"]) == (1, 100, 1, 100)
+
+
+def test_quota_evicts_least_recently_accessed_first(make_storage, clock):
+    storage = make_storage(max_bytes=300)
+    for name in ('a.pdf', 'b.pdf', 'c.pdf'):
+        write_plot(storage, name)
+        storage.add(name)
+        clock.advance(1)
+    assert storage.lookup('a.pdf') == STORED  # a is now the most recently used
+    clock.advance(1)
+    write_plot(storage, 'd.pdf', size=150)
+    storage.add('d.pdf')  # 450 bytes: b, then c, have to go
+    assert [storage.lookup(n) for n in ('a.pdf', 'b.pdf', 'c.pdf', 'd.pdf')] == [STORED, EXPIRED, EXPIRED, STORED]
+    assert storage.usage()["bytes"] == 250
+
+
+def test_quota_never_evicts_the_plot_being_added(make_storage):
+    storage = make_storage(max_bytes=100)
+    write_plot(storage, 'small.pdf', size=50)
+    storage.add('small.pdf')
+    write_plot(storage, 'big.pdf', size=500)
+    storage.add('big.pdf')
+    assert storage.lookup('big.pdf') == STORED
+    assert storage.lookup('small.pdf') == EXPIRED
+
+
+def test_sweep_syncs_index_with_directory(make_storage, clock):
+    storage = make_storage()
+    write_plot(storage, 'tracked.pdf')
+    storage.add('tracked.pdf')
+    write_plot(storage, 'external.pdf', mtime=clock() - 10)  # e.g. left by a previous run
+    stale_tmp = write_plot(storage, TMP_PREFIX + 'crashed.pdf', mtime=clock() - TTL - 1)
+    fresh_tmp = write_plot(storage, TMP_PREFIX + 'rendering.pdf', mtime=clock())
+    os.remove(os.path.join(storage.directory, 'tracked.pdf'))
+    storage.sweep()
+    assert storage.lookup('external.pdf') == STORED
+    assert storage.lookup('tracked.pdf') == MISSING  # deleted by hand, not expired
+    assert not os.path.exists(stale_tmp) and os.path.exists(fresh_tmp)
+    assert storage.usage()["files"] == 1
+
+
+def test_startup_sweep_ages_existing_files_by_mtime(make_storage, clock):
+    directory = make_storage().directory
+    old = os.path.join(directory, 'old.pdf')
+    with open(old, 'wb') as f: f.write(b'x')
+    os.utime(old, (clock() - TTL - 1, clock() - TTL - 1))
+    make_storage()  # a restarted process sweeps on construction
+    assert not os.path.exists(old)
+
+
+def test_shared_index_is_seen_by_every_process(tmp_path, clock):
+    directory = tmp_path / 'plots'
+    directory.mkdir()
+    db_path = str(tmp_path / 'state.sqlite3')
+    worker_a = SharedPlotStorage(str(directory), TTL, 10_000, StateDatabase(db_path), clock=clock)
+    worker_b = SharedPlotStorage(str(directory), TTL, 10_000, StateDatabase(db_path), clock=clock)
+    write_plot(worker_a, 'a.pdf')
+    worker_a.add('a.pdf')
+    assert worker_b.lookup('a.pdf') == STORED
+    clock.advance(TTL + 1)
+    worker_a.sweep()
+    assert worker_b.lookup('a.pdf') == EXPIRED  # the expired name is shared too
+    assert worker_b.usage()["evicted_files"] == 1
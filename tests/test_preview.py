@@ -0,0 +1,39 @@
+import io
+import json
+import xml.dom.minidom
+
+import pytest
+
+SURVIVAL_CSV = "Time,Status,Group\n5,1,A\n8,0,A\n3,1,B\n9,1,B\n4,1,\n7,0,\n"
+
+
+def post_preview(client, endpoint, table_data, **options):
+    response = client.post(endpoint, json={"table_data": table_data, "preview": True, "pdf": False, **options})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    svg = response.get_json()["preview_svg"]
+    xml.dom.minidom.parseString(svg)  # well-formed
+    return svg
+
+
+@pytest.mark.filterwarnings('error')  # Series.replace on a categorical is deprecated in pandas
+def test_survival_preview_from_upload(client):
+    response = client.post('/generate_survival_plot', content_type='multipart/form-data', data={
+        "file": (io.BytesIO(SURVIVAL_CSV.encode()), 'survival.csv'),
+        "options": json.dumps({"preview": True, "pdf": False, "plot_options": {"show_ci": True}}),
+    })
+    assert response.status_code == 200, response.get_data(as_text=True)
+    svg = response.get_json()["preview_svg"]
+    xml.dom.minidom.parseString(svg)
+    assert "Overall" in svg  # rows without a group, as in survival_plot.R
+
+
+def test_group_labels_are_escaped_and_sorted_like_r(client):
+    table = [[g, v] for g in ('b<x>', 'a&y') for v in (1.0, 2.0, 3.5)]
+    svg = post_preview(client, '/generate_two_group_plot', table)
+    assert svg.index('a&amp;y') < svg.index('b&lt;x&gt;')
+
+
+def test_correlation_preview_methods(client):
+    table = [[x, 2 * x + (x % 3)] for x in range(20)]
+    for method in ('lm', 'glm', 'loess', 'gam', 'none'):
+        assert f"Fitting Method: {method}" in post_preview(client, '/generate_plot', table, plot_method=method)
@@ -0,0 +1,40 @@
+import os
+import stat
+import sys
+
+import pytest
+
+from r_pool import RWorker, RWorkerPool, RWorkerStartError
+
+
+@pytest.fixture
+def hanging_rscript(tmp_path):
+    """A stand-in Rscript that prints some start-up output and then never becomes ready."""
+    path = tmp_path / 'Rscript'
+    path.write_text(f"#!{sys.executable}\nimport os, time\n"
+                    f"open({str(tmp_path / 'pid')!r}, 'w').write(str(os.getpid()))\n"
+                    "print('Loading packages', flush=True)\ntime.sleep(60)\n")
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    return str(path)
+
+
+def test_start_timeout_kills_the_worker(hanging_rscript, tmp_path):
+    with pytest.raises(RWorkerStartError, match='Loading packages'):
+        RWorker(hanging_rscript, 'r_worker.R', [], startup_timeout=0.5)
+    with pytest.raises(ProcessLookupError):  # killed and reaped, not leaked
+        os.kill(int((tmp_path / 'pid').read_text()), 0)
+
+
+def test_pool_run_reports_start_timeout_for_fallback(hanging_rscript):
+    pool = RWorkerPool(1, hanging_rscript, 'r_worker.R', [], startup_timeout=0.5)
+    with pytest.raises(RWorkerStartError):
+        pool.run('plot.R', ['--output', os.devnull], timeout=5)
+    with pytest.raises(RWorkerStartError):  # the slot was handed back, so the pool is still usable
+        pool.run('plot.R', ['--output', os.devnull], timeout=5)
+
+
+def test_pool_warm_up_reports_start_timeout(hanging_rscript):
+    pool = RWorkerPool(2, hanging_rscript, 'r_worker.R', [], startup_timeout=0.5)
+    with pytest.raises(RWorkerStartError):
+        pool.warm_up()
+    pool.close()
@@ -0,0 +1,123 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import resampling
+from resampling import correlation_resampling, two_group_resampling
+
+RESAMPLING = {"n_resamples": 200, "seed": 1}
+
+
+@pytest.mark.filterwarnings('ignore')  # scipy warns about the constant input itself
+@pytest.mark.parametrize('endpoint, table', [
+    ('/generate_stats', [[1.0, y] for y in range(8)]),  # constant X
+    ('/generate_stats', [[x, 2.0] for x in range(8)]),  # constant Y
+])
+def test_unusable_resampling_keeps_the_classical_output(client, endpoint, table):
+    response = client.post(endpoint, json={"table_data": table, "resampling": RESAMPLING})
+    assert response.status_code == 200, response.get_data(as_text=True)
+    result = response.get_json()
+    assert result["resampling"] == {"error": "X 或 Y 为常数，无法计算相关系数"}
+    assert "相关系数 r =" in result["stats_text"]
+    assert result["stats_text"].endswith("重抽样分析不可用: X 或 Y 为常数，无法计算相关系数")
+
+
+def test_resampling_lines_follow_the_classical_output(client):
+    table = [[x, 2 * x + (x % 3)] for x in range(12)]
+    result = client.post('/generate_stats', json={"table_data": table, "resampling": RESAMPLING}).get_json()
+    assert result["resampling"]["n_completed"] == 200
+    assert "置换检验 (Pearson r，200 次置换)" in result["stats_text"]
+
+
+@pytest.fixture
+def small_chunks(monkeypatch):
+    """Chunks of 50 resamples of 20 observations, so even short runs span several chunks."""
+    monkeypatch.setattr(resampling, 'RESAMPLE_CHUNK_ELEMENTS', 50 * 20)
+
+
+def normal_groups(seed, n=20, shift=0.5):
+    rng = np.random.default_rng(seed)
+    return rng.normal(0.0, 1.0, n), rng.normal(shift, 1.0, n)
+
+
+def summary(result):
+    return result["permutation_p"], result["bootstrap_ci"], result["n_completed"]
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_seed_fixes_the_result_whatever_the_number_of_workers(monkeypatch, small_chunks, workers):
+    group1, group2 = normal_groups(0)
+    serial = summary(two_group_resampling(group1, group2, n_resamples=500, seed=7))
+    monkeypatch.setattr(resampling, 'RESAMPLE_WORKERS', workers)
+    monkeypatch.setattr(resampling, '_executor', None)
+    assert summary(two_group_resampling(group1, group2, n_resamples=500, seed=7)) == serial
+    assert summary(two_group_resampling(group1, group2, n_resamples=500, seed=8)) != serial
+
+
+def test_seed_is_reported_so_an_unseeded_run_can_be_repeated():
+    x, y = normal_groups(1)
+    first = correlation_resampling(x, y, n_resamples=300)
+    assert summary(correlation_resampling(x, y, n_resamples=300, seed=first["seed"])) == summary(first)
+
+
+def test_p_value_counts_the_observed_arrangement():
+    # Perfectly separated groups: no shuffle is as extreme, so p = 1 / (n + 1), never 0
+    result = two_group_resampling(np.arange(10.0), np.arange(10.0) + 100, n_resamples=999, seed=0)
+    assert result["permutation_p"] == pytest.approx(1 / 1000)
+    x = np.arange(12.0)
+    assert correlation_resampling(x, x, n_resamples=999, seed=0)["permutation_p"] == pytest.approx(1 / 1000)
+    # Identical groups: every shuffle ties with the observed difference of 0
+    assert two_group_resampling([1.0, 2.0, 3.0], [1.0, 2.0, 3.0], n_resamples=99, seed=0)["permutation_p"] == 1.0
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_p_value_is_in_range_and_close_to_the_exact_permutation_p(seed):
+    group1, group2 = normal_groups(seed, n=5, shift=1.0)
+    result = two_group_resampling(group1, group2, n_resamples=4000, seed=seed)
+    assert 1 / 4001 <= result["permutation_p"] <= 1
+    pooled, observed = np.concatenate([group1, group2]), abs(group1.mean() - group2.mean())
+    splits = [np.array(s) for s in itertools.combinations(range(10), 5)]
+    diffs = np.array([pooled[s].mean() - np.delete(pooled, s).mean() for s in splits])
+    exact = np.mean(np.abs(diffs) >= observed * (1 - 1e-12))
+    assert result["permutation_p"] == pytest.approx(exact, abs=0.03)
+
+
+def test_bootstrap_ci_covers_the_true_mean_difference():
+    covered = 0
+    for seed in range(100):
+        group1, group2 = normal_groups(seed, n=40, shift=0.5)
+        low, high = two_group_resampling(group1, group2, n_resamples=1000, seed=seed)["bootstrap_ci"]
+        covered += low <= -0.5 <= high
+    assert 88 <= covered <= 99  # nominal 95%; the percentile interval is slightly narrow at n = 40
+
+
+def test_bootstrap_ci_covers_the_true_correlation():
+    covered = 0
+    cov = [[1.0, 0.5], [0.5, 1.0]]
+    for seed in range(100):
+        x, y = np.random.default_rng(seed).multivariate_normal([0, 0], cov, 60).T
+        low, high = correlation_resampling(x, y, n_resamples=1000, seed=seed)["bootstrap_ci"]
+        covered += low <= 0.5 <= high
+    assert 88 <= covered <= 99
+
+
+def test_time_limit_keeps_the_chunks_completed_in_time(monkeypatch, small_chunks):
+    monkeypatch.setattr(resampling, 'RESAMPLE_WORKERS', 1)
+    clock = itertools.count()  # each reading is one second later than the previous one
+    monkeypatch.setattr(resampling.time, 'monotonic', lambda: next(clock))
+    group1, group2 = normal_groups(3, n=10)
+    result = two_group_resampling(group1, group2, n_resamples=500, seed=5, time_limit=2.5)
+    assert result["time_limited"]
+    assert result["n_completed"] == 100  # two chunks of 50 started before the deadline
+    assert 0 < result["permutation_p"] <= 1
+    untimed = two_group_resampling(group1, group2, n_resamples=100, seed=5)
+    assert summary(result) == summary(untimed)  # the completed prefix does not depend on the limit
+
+
+def test_nothing_completed_in_time_reports_no_result(monkeypatch):
+    clock = itertools.count(step=100)
+    monkeypatch.setattr(resampling.time, 'monotonic', lambda: next(clock))
+    result = correlation_resampling(*normal_groups(4), n_resamples=200, seed=1, time_limit=1)
+    assert (result["n_completed"], result["permutation_p"], result["bootstrap_ci"]) == (0, None, [None, None])
+    assert result["time_limited"]
@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from survival_engine import kaplan_meier, risk_table, survival_summary
+
+try:
+    import lifelines
+    from lifelines.statistics import multivariate_logrank_test
+    from lifelines.utils import median_survival_times
+except ImportError:
+    lifelines = None
+
+requires_lifelines = pytest.mark.skipif(lifelines is None, reason="lifelines is not installed")
+
+
+def survival_data(seed=0, n=(40, 55, 30), scales=(8.0, 12.0, 20.0), censor_rate=0.3):
+    rng = np.random.default_rng(seed)
+    codes = np.concatenate([np.full(size, g) for g, size in enumerate(n)])
+    time = np.round(rng.exponential(np.array(scales)[codes]), 1)  # rounding gives tied times
+    event = (rng.random(len(codes)) > censor_rate).astype(float)
+    return time, event, codes
+
+
+def fit_lifelines(time, event):
+    return lifelines.KaplanMeierFitter().fit(time, event, alpha=0.05)
+
+
+@requires_lifelines
+def test_kaplan_meier_curves_and_bands_match_lifelines():
+    time, event, codes = survival_data()
+    times, deaths, at_risk = risk_table(time, event, codes, 3)
+    survival, lower, upper = kaplan_meier(times, deaths, at_risk)
+    for g in range(3):
+        kmf = fit_lifelines(time[codes == g], event[codes == g])
+        group_times = times[times <= time[codes == g].max()]
+        expected = kmf.survival_function_at_times(group_times).to_numpy()
+        np.testing.assert_allclose(survival[g, :len(group_times)], expected, rtol=1e-10)
+        # The engine's columns are the event times of all groups; the lifelines band steps at this group's times
+        band = kmf.confidence_interval_.reindex(group_times, method='ffill')
+        np.testing.assert_allclose(lower[g, :len(group_times)], band.iloc[:, 0].to_numpy(), rtol=1e-8)
+        np.testing.assert_allclose(upper[g, :len(group_times)], band.iloc[:, 1].to_numpy(), rtol=1e-8)
+
+
+@requires_lifelines
+@pytest.mark.parametrize('seed, censor_rate', [(0, 0.3), (1, 0.6), (2, 0.0)])
+def test_medians_and_logrank_match_lifelines(seed, censor_rate):
+    time, event, codes = survival_data(seed, censor_rate=censor_rate)
+    summary = survival_summary(time, event, codes, 3)
+    for g in range(3):
+        kmf = fit_lifelines(time[codes == g], event[codes == g])
+        expected_lower, expected_upper = median_survival_times(kmf.confidence_interval_).iloc[0]
+        for value, expected in [(summary["median"][g], kmf.median_survival_time_),
+                                (summary["median_lower"][g], expected_lower),
+                                (summary["median_upper"][g], expected_upper)]:
+            if np.isinf(expected):  # lifelines: inf when not reached; the engine: NaN
+                assert np.isnan(value)
+            else:
+                assert value == pytest.approx(expected)
+
+    chi_square, dof, p_value = summary["logrank"]
+    expected = multivariate_logrank_test(time, codes, event)
+    assert dof == expected.degrees_of_freedom
+    assert chi_square == pytest.approx(expected.test_statistic, rel=1e-9)
+    assert p_value == pytest.approx(expected.p_value, rel=1e-9)
+
+
+@requires_lifelines
+def test_two_group_logrank_matches_lifelines():
+    time, event, codes = survival_data(n=(25, 30), scales=(8.0, 11.0))
+    chi_square, dof, p_value = survival_summary(time, event, codes, 2)["logrank"]
+    expected = multivariate_logrank_test(time, codes, event)
+    assert chi_square == pytest.approx(expected.test_statistic, rel=1e-9)
+    assert p_value == pytest.approx(expected.p_value, rel=1e-9)
+
+
+def test_all_censored_medians_are_not_reached_and_logrank_reports_no_events():
+    time = np.array([3.0, 5.0, 8.0, 2.0, 9.0, 4.0])
+    codes = np.array([0, 0, 0, 1, 1, 1])
+    summary = survival_summary(time, np.zeros(6), codes, 2)
+    assert np.isnan(summary["median"]).all()
+    assert np.isnan(summary["median_lower"]).all() and np.isnan(summary["median_upper"]).all()
+    assert summary["logrank"] is None
+    assert list(summary["events"]) == [0, 0]
+
+
+@pytest.mark.parametrize('groups', [['A', 'A', 'B', 'B', 'B'], ['', '', '', '', '']])
+def test_all_censored_survival_routes(client, groups):
+    table = [[t, 0, g] for t, g in zip([3, 5, 8, 2, 9], groups)]
+    stats = client.post('/generate_survival_stats', json={"table_data": table})
+    assert stats.status_code == 200, stats.get_data(as_text=True)
+    text = stats.get_json()["stats_text"]
+    assert "未达到" in text  # median not reached
+    preview = client.post('/generate_survival_plot', json={"table_data": table, "preview": True, "pdf": False})
+    assert "preview_svg" in preview.get_json()
+
+
+def test_failed_logrank_still_describes_every_group(client, app_module, monkeypatch):
+    def failing_summary(*args, **kwargs): raise np.linalg.LinAlgError("singular matrix")
+
+    monkeypatch.setattr(app_module, 'survival_summary', failing_summary)
+    table = [[3, 1, 'A'], [5, 0, 'A'], [8, 1, 'B'], [2, 1, 'B'], [9, 0, 'B']]
+    text = client.post('/generate_survival_stats', json={"table_data": table}).get_json()["stats_text"]
+    assert "Log-rank 检验失败: singular matrix" in text
+    assert "样本量 N = 2" in text and "样本量 N = 3" in text
+    assert "事件数 Events = 1" in text and "事件数 Events = 2" in text
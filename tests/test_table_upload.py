@@ -0,0 +1,109 @@
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from werkzeug.datastructures import FileStorage
+
+import table_upload
+from table_upload import UploadError, read_upload
+
+GROUPS = ['B', 'A', 'B', 'C', 'A', 'A', 'C', 'B', 'C', 'A']  # C first appears in the second chunk of 3
+VALUES = [1.5, 2.0, 3.25, 4.0, 5.5, 6.0, 7.0, 8.5, 9.0, 10.0]
+
+
+@pytest.fixture(params=[1, 3, 4, 1000], ids=lambda rows: f'chunk{rows}')
+def chunk_rows(request, monkeypatch):
+    """Small chunks, so records and group labels are spread over several chunks."""
+    monkeypatch.setattr(table_upload, 'UPLOAD_CHUNK_ROWS', request.param)
+    return request.param
+
+
+def upload(content, filename):
+    return FileStorage(stream=io.BytesIO(content.encode()), filename=filename)
+
+
+def csv_text(rows, header=('Group', 'Value')):
+    return "\n".join([",".join(header)] + [",".join(map(str, row)) for row in rows]) + "\n"
+
+
+def ndjson_text(rows, keys=('Group', 'Value')):
+    return "".join(json.dumps(dict(zip(keys, row))) + "\n" for row in rows)
+
+
+@pytest.mark.parametrize('make_text, filename', [(csv_text, 'groups.csv'), (ndjson_text, 'groups.ndjson')])
+def test_label_codes_are_consistent_across_chunks(chunk_rows, make_text, filename):
+    df = read_upload(upload(make_text(zip(GROUPS, VALUES)), filename), 'multi_group')
+    assert list(df['Group'].cat.categories) == ['B', 'A', 'C']  # order of first appearance in the file
+    assert list(df['Group']) == GROUPS
+    np.testing.assert_array_equal(df['Value'].to_numpy(), VALUES)
+
+
+def test_chunked_read_matches_a_single_chunk(monkeypatch):
+    text = csv_text(zip(GROUPS, VALUES))
+    whole = read_upload(upload(text, 'groups.csv'), 'two_group')
+    monkeypatch.setattr(table_upload, 'UPLOAD_CHUNK_ROWS', 2)
+    pd.testing.assert_frame_equal(read_upload(upload(text, 'groups.csv'), 'two_group'), whole)
+
+
+@pytest.mark.parametrize('make_text, filename', [(csv_text, 'groups.csv'), (ndjson_text, 'groups.ndjson')])
+@pytest.mark.parametrize('row, bad, message', [
+    (7, ['A', 'abc'], "第 8 条记录: Value 不是有效数字: 'abc'"),
+    (4, ['', 1.0], "第 5 条记录: Group 缺少分组名称"),
+    (9, ['C', None], "第 10 条记录: Value 缺失"),
+])
+def test_errors_name_the_record_in_the_whole_file(chunk_rows, make_text, filename, row, bad, message):
+    rows = [list(r) for r in zip(GROUPS, VALUES)]
+    rows[row] = bad
+    if make_text is csv_text: rows[row] = ['' if v is None else v for v in bad]
+    with pytest.raises(UploadError) as error:
+        read_upload(upload(make_text(rows), filename), 'two_group')
+    assert str(error.value) == message
+
+
+def test_survival_records_are_validated_per_chunk(chunk_rows):
+    rows = [[5, 1, 'A'], [8, 0, 'A'], [3, 1, 'B'], [9, 2, 'B'], [4, 1, '']]
+    with pytest.raises(UploadError, match="第 4 条记录: Status 必须为 0 或 1"):
+        read_upload(upload(csv_text(rows, ('Time', 'Status', 'Group')), 'survival.csv'), 'survival')
+    rows[3][1] = 1
+    df = read_upload(upload(csv_text(rows, ('Time', 'Status', 'Group')), 'survival.csv'), 'survival')
+    assert list(df['Group']) == ['A', 'A', 'B', 'B', '']  # a missing group is kept as ''
+    assert df['Status'].dtype == np.int8
+
+
+def test_column_map_selects_the_file_columns(chunk_rows):
+    text = csv_text([(v, g, 0) for g, v in zip(GROUPS, VALUES)], header=('measure', 'arm', 'unused'))
+    df = read_upload(upload(text, 'groups.csv'), 'two_group', column_map={'Group': 'arm', 'Value': 'measure'})
+    assert list(df.columns) == ['Group', 'Value']
+    assert list(df['Group']) == GROUPS
+    np.testing.assert_array_equal(df['Value'].to_numpy(), VALUES)
+
+
+def test_column_names_match_case_insensitively_and_ignore_leading_spaces():
+    df = read_upload(upload(csv_text(zip(GROUPS, VALUES), header=('group', ' VALUE')), 'groups.csv'), 'two_group')
+    assert list(df['Group']) == GROUPS
+
+
+@pytest.mark.parametrize('column_map, message', [
+    ({'Grp': 'arm'}, "column_map 包含未知列: Grp"),
+    ({'Group': 'nope'}, "column_map 指定的列 'nope' 不在文件中"),
+    ({'Group': 'arm'}, "上传文件缺少列 'Value'"),
+])
+def test_column_map_errors(column_map, message):
+    text = csv_text(zip(GROUPS, VALUES), header=('arm', 'measure'))
+    with pytest.raises(UploadError, match=message):
+        read_upload(upload(text, 'groups.csv'), 'two_group', column_map=column_map)
+
+
+def test_ndjson_array_lines_are_positional(chunk_rows):
+    text = "".join(json.dumps(row) + "\n" for row in zip(GROUPS, VALUES))
+    df = read_upload(upload(text, 'groups.jsonl'), 'two_group')
+    assert list(df['Group']) == GROUPS
+
+
+def test_row_limit_is_checked_while_reading(monkeypatch):
+    monkeypatch.setattr(table_upload, 'UPLOAD_CHUNK_ROWS', 3)
+    monkeypatch.setattr(table_upload, 'UPLOAD_MAX_ROWS', 5)
+    with pytest.raises(UploadError, match="超过 5 行上限"):
+        read_upload(upload(csv_text(zip(GROUPS, VALUES)), 'groups.csv'), 'two_group')
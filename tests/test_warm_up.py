@@ -0,0 +1,23 @@
+import pytest
+
+
+@pytest.fixture
+def not_ready(app_module):
+    app_module._warm_up_done.clear()
+    yield app_module
+    app_module._warm_up_done.set()  # the test app runs with APP_WARM_UP=off, which is ready at once
+
+
+def test_preload_does_not_mark_the_worker_ready(client, not_ready):
+    not_ready.warm_up(r_workers=False)  # what gunicorn's master runs before forking
+    response = client.get('/ready')
+    assert response.status_code == 503
+    assert response.get_json()["ready"] is False
+
+
+def test_full_warm_up_marks_ready(client, not_ready):
+    not_ready.warm_up(r_workers=False)
+    not_ready.warm_up()  # start_worker() in the forked worker
+    response = client.get('/ready')
+    assert response.status_code == 200
+    assert response.get_json()["ready"] is True